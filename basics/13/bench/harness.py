@@ -0,0 +1,365 @@
+"""
+In-process benchmark of the whole request path: synthetic CGI environs go through
+server.run_cgi() -> access_manager.handle_request() -> router -> controllers -> stores,
+exactly like a warm server worker, without sockets.
+
+    python bench/harness.py                                  # all scenarios, JSON to stdout
+    python bench/harness.py --store sqlite --sizes 10,10000 --out bench/baseline.json
+    python bench/harness.py --only "discount|user" --compare bench/baseline.json
+
+Scenarios:
+  user      GET /user in every mode, POST /user/batch
+  discount  valid / expired / nested / tampered / malformed / missing tokens,
+            with a warm and a cold token cache
+  order@N   order CRUD, list/filter/sort pages, stats, changes and POST /discount/quote
+            on a store of N rows
+            (--sizes, default 10,10000,1000000), every size in its own temporary database
+
+Every scenario runs --warmup seconds untimed, then at least --min-runs and for at
+least --seconds; the result is ops/sec and p50/p95/p99 latency (microseconds) plus
+the status codes seen. --compare prints the change against a saved result and
+exits with 1 when a scenario lost more than --threshold percent of its ops/sec.
+All data (orders, keys, revocations, response cache) lives in a temporary directory.
+"""
+import io
+import os
+import re
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = "/python-api/basics/13"
+STATUSES = ("new", "paid", "shipped", "cancelled")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="In-process benchmark of the API request path.")
+    ap.add_argument("--store", default="json", choices=("json", "wal", "sqlite"), help="order store backend")
+    ap.add_argument("--sizes", default="10,10000,1000000", help="order counts for the order scenarios")
+    ap.add_argument("--seconds", type=float, default=1.0, help="measured time per scenario")
+    ap.add_argument("--warmup", type=float, default=0.2, help="untimed time per scenario")
+    ap.add_argument("--min-runs", type=int, default=5, help="measured runs per scenario at least")
+    ap.add_argument("--max-runs", type=int, default=100000, help="measured runs per scenario at most")
+    ap.add_argument("--only", help="regex: run only the scenarios whose name matches")
+    ap.add_argument("--no-response-cache", action="store_true", help="ORDER_RESPONSE_CACHE_SIZE=0")
+    ap.add_argument("--out", help="write the JSON result here instead of stdout")
+    ap.add_argument("--compare", help="JSON result of an earlier run to compare with")
+    ap.add_argument("--threshold", type=float, default=10.0, help="ops/sec drop (%%) reported as a regression")
+    return ap.parse_args(argv)
+
+
+# =========================
+# ENVIRONMENT
+# =========================
+def configure(args, workdir: str):
+    """Points every data file at workdir; must run before config is imported."""
+    os.environ.update({
+        "ORDER_STORE": args.store,
+        "ORDER_DB_PATH": os.path.join(workdir, "db.json"),
+        "ORDER_WAL_PATH": os.path.join(workdir, "db.wal"),
+        "ORDER_SQLITE_PATH": os.path.join(workdir, "db.sqlite3"),
+        "ORDER_RESPONSE_CACHE_DIR": os.path.join(workdir, "cache"),
+        "JWT_KEYS_PATH": os.path.join(workdir, "jwt_keys.json"),
+        "JWT_REVOKED_PATH": os.path.join(workdir, "revoked.sqlite3"),
+        "DEV_MODE": "1",
+    })
+    if args.no_response_cache:
+        os.environ["ORDER_RESPONSE_CACHE_SIZE"] = "0"
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+
+
+def seed_orders(config, store: str, directory: str, size: int):
+    """Writes `size` orders for the backend and points config at them."""
+    os.makedirs(directory, exist_ok=True)
+    config.DB_PATH = os.path.join(directory, "db.json")
+    config.WAL_PATH = os.path.join(directory, "db.wal")
+    config.SQLITE_PATH = os.path.join(directory, "db.sqlite3")
+
+    orders = [{"id": i, "title": f"Order {i}", "price": (i * 7919) % 20000 / 100,
+               "status": STATUSES[i % len(STATUSES)], "version": i} for i in range(1, size + 1)]
+    if store == "sqlite":
+        from stores.sqlite_store import SqliteOrderStore
+        SqliteOrderStore(config.SQLITE_PATH).import_orders(orders)
+    else:
+        # json: the db.json layout; wal: the snapshot (takes "version" as its seq)
+        with open(config.DB_PATH, "w", encoding="utf-8") as f:
+            json.dump({"version": size, "deleted_floor": 0, "orders": orders, "deleted": []}, f)
+
+    # the next requests open the new database
+    import stores
+    import response_cache
+    stores._order_store = None
+    response_cache._response_cache = None
+
+
+# =========================
+# REQUESTS
+# =========================
+class Scenario:
+    """
+    One request, replayed: method + path (+ query, headers, JSON body).
+    prepare() runs untimed before every request and may return changes to the
+    request (e.g. {"path": ...} of an order it has just created).
+    """
+
+    def __init__(self, name, method, path, query="", headers=None, body=None, expect=(200,), prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers or {}
+        self.body = body
+        self.expect = expect
+        self.prepare = prepare
+
+    def request(self):
+        spec = {"path": self.path, "query": self.query, "body": self.body}
+        if self.prepare is not None:
+            spec.update(self.prepare() or {})
+        body = b"" if spec["body"] is None else json.dumps(spec["body"]).encode("utf-8")
+        query = spec["query"]
+        environ = {
+            "REQUEST_METHOD": self.method,
+            "REQUEST_URI": PREFIX + spec["path"] + ("?" + query if query else ""),
+            "QUERY_STRING": "htctrl=1&" + query if query else "htctrl=1",
+            "CONTENT_LENGTH": str(len(body)) if body else "",
+        }
+        for name, value in self.headers.items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ, body
+
+
+def call(server, method, path, query="", headers=None, body=None):
+    """One request outside the measurement -> (status code, parsed JSON body or None)."""
+    environ, raw = Scenario("", method, path, query, headers, body).request()
+    status, _headers, out, segment = server.run_cgi(environ, io.BytesIO(raw))
+    if segment:
+        os.close(segment[0])
+    try:
+        return int(status.split()[0]), json.loads(out)
+    except ValueError:
+        return int(status.split()[0]), None
+
+
+def user_scenarios():
+    modes = ("", "expired", "nested", "nested_expired", "bad_sub", "bad_iss",
+             "no_name_email", "bad_email", "email_only", "name_only")
+    scenarios = [Scenario(f"user: GET mode={m or 'default'}", "GET", "/user", f"mode={m}" if m else "")
+                 for m in modes]
+    scenarios.append(Scenario("user: POST batch 100", "POST", "/user/batch", body={"count": 100}))
+    return scenarios
+
+
+def discount_scenarios(server):
+    from controllers import discount_controller
+
+    def token(mode=""):
+        return call(server, "GET", "/user", f"mode={mode}" if mode else "")[1]["data"]["token"]
+
+    def cold_cache():
+        cache = discount_controller._verified_tokens
+        cache.clear(cache.generation)
+
+    valid = token()
+    tampered = valid[:-4] + ("AAAA" if not valid.endswith("AAAA") else "BBBB")
+    tokens = [
+        ("valid", valid, (200,)),
+        ("expired", token("expired"), (403,)),
+        ("nested", token("nested"), (200,)),
+        ("nested expired", token("nested_expired"), (403,)),
+        ("bad sub", token("bad_sub"), (403,)),
+        ("tampered", tampered, (403,)),
+        ("invalid symbol", valid + "$", (403,)),
+        ("two parts", valid.rsplit(".", 1)[0], (403,)),
+    ]
+    scenarios = []
+    for label, tok, expect in tokens:
+        auth = {"Authorization": f"Bearer {tok}"}
+        scenarios.append(Scenario(f"discount: {label}", "GET", "/discount", headers=auth, expect=expect))
+        scenarios.append(Scenario(f"discount: {label} (cold token cache)", "GET", "/discount", headers=auth,
+                                  expect=expect, prepare=cold_cache))
+    scenarios.append(Scenario("discount: no Authorization", "GET", "/discount", expect=(403,)))
+    return scenarios, valid
+
+
+def order_scenarios(server, size: int, token: str):
+    import stores
+    tag = f"order@{size}"
+    mid = max(1, size // 2)
+    auth = {"Authorization": f"Bearer {token}"}
+
+    def created():
+        # a fresh order for DELETE, outside the measurement
+        return {"path": f"/order/{stores.get_order_store().create({'title': 'tmp', 'price': 1})['id']}"}
+
+    def since():
+        return {"query": f"since={max(0, stores.get_order_store().version() - 10)}"}
+
+    return [
+        Scenario(f"{tag}: GET /order/{{id}}", "GET", f"/order/{mid}"),
+        Scenario(f"{tag}: GET /order?id=", "GET", "/order", f"id={mid}"),
+        Scenario(f"{tag}: GET /order/{{id}} missing", "GET", f"/order/{size + 10 ** 9}", expect=(404,)),
+        Scenario(f"{tag}: GET /order limit=20", "GET", "/order", "limit=20"),
+        Scenario(f"{tag}: GET /order status+sort=price", "GET", "/order", "status=paid&sort=-price&limit=20"),
+        Scenario(f"{tag}: GET /order min/max price", "GET", "/order", "min_price=10&max_price=20&limit=20"),
+        Scenario(f"{tag}: GET /order/stats", "GET", "/order/stats"),
+        Scenario(f"{tag}: GET /order/changes", "GET", "/order/changes", prepare=since),
+        Scenario(f"{tag}: POST /order", "POST", "/order", body={"title": "Bench", "price": 42.5},
+                 expect=(200, 201)),
+        Scenario(f"{tag}: PATCH /order/{{id}}", "PATCH", f"/order/{mid}", body={"status": "paid"}),
+        Scenario(f"{tag}: PUT /order/{{id}}", "PUT", f"/order/{mid}",
+                 body={"title": "Replaced", "price": 10, "status": "new"}),
+        Scenario(f"{tag}: DELETE /order/{{id}}", "DELETE", "/order/{id}", prepare=created),
+        Scenario(f"{tag}: POST /order/batch 10", "POST", "/order/batch",
+                 body={"operations": [{"op": "patch", "id": mid, "fields": {"price": p}} for p in range(10)]}),
+        Scenario(f"{tag}: POST /discount/quote 10", "POST", "/discount/quote", headers=auth,
+                 body={"ids": [max(1, size * k // 10) for k in range(10)]}),
+    ]
+
+
+# =========================
+# MEASUREMENT
+# =========================
+def fmt_ops(value) -> str:
+    # slow scenarios (a rewrite of a 1M-row db.json) are well below 1 op/s
+    return "-" if not value else f"{value:,.0f}" if value >= 100 else f"{value:.2f}"
+
+
+def percentile(sorted_values, p: float):
+    # nearest rank
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def measure(server, scenario: Scenario, args) -> dict:
+    statuses = Counter()
+
+    def run_once():
+        environ, body = scenario.request()
+        start = time.perf_counter_ns()
+        status, _headers, _body, segment = server.run_cgi(environ, io.BytesIO(body))
+        elapsed = time.perf_counter_ns() - start
+        if segment:
+            os.close(segment[0])
+        return int(status.split()[0]) if status else 200, elapsed
+
+    deadline = time.perf_counter() + args.warmup
+    while time.perf_counter() < deadline:
+        run_once()
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < args.max_runs and (len(timings) < args.min_runs or time.perf_counter() - started < args.seconds):
+        status, elapsed = run_once()
+        statuses[status] += 1
+        timings.append(elapsed)
+
+    timings.sort()
+    total = sum(timings) / 1e9
+    unexpected = sum(n for code, n in statuses.items() if code not in scenario.expect)
+    return {
+        "runs": len(timings),
+        "ops_per_sec": round(len(timings) / total, 1) if total else None,
+        "p50_us": round(percentile(timings, 50) / 1000, 1),
+        "p95_us": round(percentile(timings, 95) / 1000, 1),
+        "p99_us": round(percentile(timings, 99) / 1000, 1),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "unexpected": unexpected,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Prints the change per scenario; -> names of the regressed scenarios."""
+    old = baseline.get("results", {})
+    regressed = []
+    print(f"\n{'scenario':<52}{'ops/s before':>14}{'after':>12}{'change':>9}{'p99 before':>12}{'after':>10}",
+          file=sys.stderr)
+    for name, new in results.items():
+        before = old.get(name)
+        if not before or not before.get("ops_per_sec") or not new.get("ops_per_sec"):
+            print(f"{name:<52}{'-':>14}{fmt_ops(new.get('ops_per_sec')):>12}", file=sys.stderr)
+            continue
+        change = (new["ops_per_sec"] / before["ops_per_sec"] - 1) * 100
+        flag = ""
+        if change < -threshold:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<52}{fmt_ops(before['ops_per_sec']):>14}{fmt_ops(new['ops_per_sec']):>12}{change:>+8.1f}%"
+              f"{before['p99_us']:>12}{new['p99_us']:>10}{flag}", file=sys.stderr)
+    return regressed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    only = re.compile(args.only) if args.only else None
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    workdir = tempfile.mkdtemp(prefix="python-api-13-bench-")
+    configure(args, workdir)
+
+    import config
+    import server  # server mode: warm process, state kept between requests
+
+    server.warm_up()
+    results = {}
+    try:
+        def run(scenarios):
+            for scenario in scenarios:
+                if only and not only.search(scenario.name):
+                    continue
+                result = results[scenario.name] = measure(server, scenario, args)
+                note = f"  ({result['unexpected']} unexpected status)" if result["unexpected"] else ""
+                print(f"{scenario.name:<52}{fmt_ops(result['ops_per_sec']):>12} ops/s"
+                      f"  p50 {result['p50_us']:>9} us  p99 {result['p99_us']:>9} us{note}", file=sys.stderr)
+
+        seed_orders(config, args.store, os.path.join(workdir, "small"), 10)
+        run(user_scenarios())
+        discount, token = discount_scenarios(server)
+        run(discount)
+        for size in sizes:
+            tag = f"order@{size}"
+            if only and not any(only.search(s.name) for s in order_scenarios(server, size, token)):
+                continue
+            started = time.perf_counter()
+            seed_orders(config, args.store, os.path.join(workdir, str(size)), size)
+            print(f"-- {tag}: seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            run(order_scenarios(server, size, token))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": args.store,
+            "sizes": sizes,
+            "response_cache": not args.no_response_cache,
+            "seconds": args.seconds,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} scenario(s) slower than -{args.threshold}%", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
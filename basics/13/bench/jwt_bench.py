@@ -0,0 +1,145 @@
+"""
+JWT encode/verify throughput: jwt_codec vs the previous per-controller code.
+
+    python bench/jwt_bench.py [--seconds 1.0]
+
+"legacy" is the code UserController._jwt_encode / DiscountController._validate_token
+used before jwt_codec (copied below as the baseline); both sides produce the same tokens.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import hmac
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jwt_codec import codec, SECRET, NESTED_HEADER_SEGMENT, JwtError  # noqa: E402
+
+
+# =========================
+# BASELINE (before jwt_codec)
+# =========================
+def legacy_b64url_encode(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode("ascii").rstrip("=")
+
+
+def legacy_b64url_decode_to_text(s: str):
+    try:
+        pad = "=" * ((4 - (len(s) % 4)) % 4)
+        raw = base64.urlsafe_b64decode((s + pad).encode("ascii"))
+        return raw.decode("utf-8")
+    except Exception:
+        return None
+
+
+def legacy_sign(h64: str, p64: str) -> str:
+    signing_input = f"{h64}.{p64}".encode("ascii")
+    return legacy_b64url_encode(hmac.new(SECRET, signing_input, hashlib.sha256).digest())
+
+
+def legacy_encode(header: dict, payload):
+    h = legacy_b64url_encode(json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    if isinstance(payload, dict):
+        p_bytes = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    else:
+        p_bytes = str(payload).encode("utf-8")
+    p = legacy_b64url_encode(p_bytes)
+    return f"{h}.{p}.{legacy_sign(h, p)}"
+
+
+def legacy_verify(token: str):
+    allowed = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_."
+    for ch in token:
+        if ch not in allowed:
+            raise JwtError(f"token has invalid base64url symbol '{ch}'")
+    parts = token.split(".")
+    if len(parts) != 3:
+        raise JwtError("token format invalid (expected 3 parts: header.payload.signature)")
+    h64, p64, s64 = parts
+    header_json = legacy_b64url_decode_to_text(h64)
+    if header_json is None:
+        raise JwtError("header part is not valid base64url")
+    try:
+        header = json.loads(header_json)
+    except Exception:
+        raise JwtError("header JSON invalid")
+    if header.get("alg") != "HS256":
+        raise JwtError("unsupported alg (expected HS256)")
+    if not hmac.compare_digest(legacy_sign(h64, p64), s64):
+        raise JwtError("signature invalid")
+    return header, h64, p64
+
+
+# =========================
+# BENCH
+# =========================
+HEADER = {"alg": "HS256", "typ": "JWT"}
+PAYLOAD = {
+    "sub": "8f14e45f-ceea-467f-a0e6-3bd5b1c6a3e2",
+    "iss": "Server-KN-P-221",
+    "aud": "KN-P-221",
+    "iat": 1760000000,
+    "exp": 1760003600,
+    "name": "Test User",
+    "email": "test.user@example.com",
+}
+
+
+def ops_per_sec(fn, seconds: float) -> float:
+    n, batch = 0, 1000
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        n += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return n / elapsed
+
+
+def bad_signature(token: str) -> str:
+    return token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--seconds", type=float, default=1.0, help="time per case")
+    args = ap.parse_args()
+
+    token = codec.encode(PAYLOAD)
+    nested = codec.encode(token, NESTED_HEADER_SEGMENT)
+    assert token == legacy_encode(HEADER, PAYLOAD)
+    assert legacy_verify(token) == codec.verify(token)
+    forged = bad_signature(token)
+
+    def rejects(verify, t):
+        def run():
+            try:
+                verify(t)
+            except JwtError:
+                return
+            raise AssertionError("accepted a forged token")
+        return run
+
+    cases = [
+        ("encode", lambda: legacy_encode(HEADER, PAYLOAD), lambda: codec.encode(PAYLOAD)),
+        ("encode nested", lambda: legacy_encode({**HEADER, "cty": "JWT"}, token),
+         lambda: codec.encode(token, NESTED_HEADER_SEGMENT)),
+        ("verify", lambda: legacy_verify(token), lambda: codec.verify(token)),
+        ("verify nested (outer)", lambda: legacy_verify(nested), lambda: codec.verify(nested)),
+        ("verify bad signature", rejects(legacy_verify, forged), rejects(codec.verify, forged)),
+    ]
+
+    print(f"{'case':<24}{'legacy ops/s':>14}{'codec ops/s':>14}{'speedup':>10}")
+    for name, legacy, new in cases:
+        a = ops_per_sec(legacy, args.seconds)
+        b = ops_per_sec(new, args.seconds)
+        print(f"{name:<24}{a:>14,.0f}{b:>14,.0f}{b / a:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+HTTP load generator for a running server.py: replays the usertest/ordertest scenario
+matrix (static/js/site.js TESTS: token modes, Authorization variants, flipLastChar
+tampering, nested and claim cases; order CRUD) from many concurrent keep-alive
+connections and reports throughput, status codes and latency histograms.
+
+    python server.py --workers 4 --quiet &
+    python bench/loadgen.py --concurrency 4 --duration 10
+    python bench/loadgen.py --only "discount|order" --concurrency 8 --conn-requests 50 --json out.json
+
+Every connection runs one request at a time and picks a random scenario (--seed).
+server.py workers are single-threaded and stay with a keep-alive connection until it
+goes idle, so with more connections than workers use --conn-requests to make each
+connection reconnect after N requests and let the others in.
+Exit code 1 when a response had an unexpected status or a request failed.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+from collections import Counter, defaultdict, deque
+
+# upper bounds of the histogram buckets, milliseconds
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent keep-alive load generator (usertest/ordertest matrix).")
+    ap.add_argument("--url", default="http://127.0.0.1:8013/python-api/basics/13", help="API base URL")
+    ap.add_argument("--concurrency", type=int, default=4, help="parallel connections")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    ap.add_argument("--conn-requests", type=int, default=0, help="reconnect after this many requests (0: never)")
+    ap.add_argument("--timeout", type=float, default=10.0, help="per request, seconds")
+    ap.add_argument("--only", help="regex: replay only the scenarios whose name matches")
+    ap.add_argument("--seed", type=int, default=13, help="random seed of the scenario choice")
+    ap.add_argument("--json", help="also write the report as JSON to this file")
+    return ap.parse_args(argv)
+
+
+# =========================
+# HTTP/1.1 CLIENT
+# =========================
+class Connection:
+    """One keep-alive connection: request() -> (status, body); reconnects when the server closed it."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = self.writer = None
+        self.requests = 0  # on the current socket
+
+    async def request(self, method: str, target: str, headers: dict = None, body: bytes = b""):
+        reused = self.writer is not None
+        if not reused:
+            await self._connect()
+        try:
+            return await asyncio.wait_for(self._exchange(method, target, headers or {}, body), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError) as ex:
+            self.close()
+            if not reused:
+                raise
+            # the server dropped an idle keep-alive connection: once more on a new one
+            await self._connect()
+            try:
+                return await asyncio.wait_for(self._exchange(method, target, headers or {}, body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                raise ex
+        except BaseException:
+            self.close()
+            raise
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        self.requests = 0
+
+    async def _exchange(self, method, target, headers, body):
+        head = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        if body or method in ("POST", "PUT", "PATCH"):
+            head.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by the server")
+        status = int(line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b"".join(parts)
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif status in (204, 304) or method == "HEAD":
+            data = b""
+        else:
+            data = await self.reader.read()
+            response_headers["connection"] = "close"
+
+        self.requests += 1
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+# =========================
+# SCENARIOS
+# =========================
+def flip_last_char(token: str) -> str:
+    # same as flipLastChar() in site.js
+    if not token or len(token) < 2:
+        return token
+    return token[:-1] + ("b" if token[-1] == "a" else "a")
+
+
+class Scenario:
+    """
+    build(state) -> (method, path, headers, body dict or None); expect: acceptable statuses.
+    ready(state): whether it can run now (DELETE needs an order created by POST);
+    done(state, status, data): bookkeeping after the response.
+    """
+
+    def __init__(self, name, expect, build, ready=None, done=None):
+        self.name = name
+        self.expect = expect
+        self.build = build
+        self.ready = ready
+        self.done = done
+
+
+def scenario_matrix(tokens: dict, order_id: int) -> list:
+    def get(path, headers=None):
+        return lambda state: ("GET", path, headers or {}, None)
+
+    def bearer(token, scheme="Bearer"):
+        return {"Authorization": f"{scheme} {token}"}
+
+    token = tokens[""]
+    matrix = [Scenario("user: GET /user", (200,), get("/user"))]
+    for mode in ("expired", "nested", "nested_expired", "bad_sub", "bad_iss",
+                 "no_name_email", "bad_email", "email_only", "name_only"):
+        matrix.append(Scenario(f"user: GET /user?mode={mode}", (200,), get(f"/user?mode={mode}")))
+
+    # site.js TESTS, same names and expected codes
+    discount = [
+        ("discount OK (normal token)", 200, bearer(token)),
+        ("missing Authorization header", 403, {}),
+        ("wrong scheme (Token ...)", 403, bearer(token, "Token")),
+        ("short token (2 parts)", 403, bearer(".".join(token.split(".")[:2]))),
+        ("bad base64 symbols", 403, bearer(token + "!")),
+        ("bad signature", 403, bearer(flip_last_char(token))),
+        ("expired token", 403, bearer(tokens["expired"])),
+        ("nested token OK", 200, bearer(tokens["nested"])),
+        ("nested token expired", 403, bearer(tokens["nested_expired"])),
+        ("claim bad_sub", 403, bearer(tokens["bad_sub"])),
+        ("claim bad_iss", 403, bearer(tokens["bad_iss"])),
+        ("claim no_name_email", 403, bearer(tokens["no_name_email"])),
+        ("claim bad_email", 403, bearer(tokens["bad_email"])),
+        ("claim email_only", 200, bearer(tokens["email_only"])),
+        ("claim name_only", 200, bearer(tokens["name_only"])),
+    ]
+    for name, code, headers in discount:
+        matrix.append(Scenario(f"discount: {name}", (code,), get("/discount", headers)))
+
+    # ordertest: GET / POST / PUT / PATCH / DELETE order
+    def created(state, status, data):
+        if status in (200, 201):
+            state["created"].append(json.loads(data)["data"]["created"]["id"])
+
+    matrix += [
+        Scenario("order: GET list", (200,), get("/order?limit=20")),
+        Scenario("order: GET by id", (200,), get(f"/order/{order_id}")),
+        Scenario("order: POST", (200, 201),
+                 lambda state: ("POST", "/order", {}, {"title": "Load test", "price": random.randint(1, 500)}),
+                 done=created),
+        Scenario("order: PUT", (200,),
+                 lambda state: ("PUT", f"/order/{order_id}", {}, {"title": "Replaced", "price": 10, "status": "new"})),
+        Scenario("order: PATCH", (200,),
+                 lambda state: ("PATCH", f"/order/{order_id}", {}, {"status": random.choice(("new", "paid"))})),
+        Scenario("order: DELETE", (200, 204),
+                 lambda state: ("DELETE", f"/order/{state['created'].popleft()}", {}, None),
+                 ready=lambda state: bool(state["created"])),
+    ]
+    return matrix
+
+
+async def prepare(conn: Connection, base: str):
+    """Tokens of every /user mode and one order to read/update -> (tokens, order_id)."""
+    tokens = {}
+    for mode in ("", "expired", "nested", "nested_expired", "bad_sub", "bad_iss",
+                 "no_name_email", "bad_email", "email_only", "name_only"):
+        status, data = await conn.request("GET", f"{base}/user" + (f"?mode={mode}" if mode else ""))
+        if status != 200:
+            raise RuntimeError(f"GET /user?mode={mode}: HTTP {status}")
+        tokens[mode] = json.loads(data)["data"]["token"]
+    body = json.dumps({"title": "Load test target", "price": 100}).encode("utf-8")
+    status, data = await conn.request("POST", f"{base}/order", {"Content-Type": "application/json"}, body)
+    if status not in (200, 201):
+        raise RuntimeError(f"POST /order: HTTP {status}")
+    return tokens, json.loads(data)["data"]["created"]["id"]
+
+
+# =========================
+# LOAD
+# =========================
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # scenario -> [seconds]
+        self.statuses = Counter()
+        self.unexpected = Counter()         # scenario -> count
+        self.errors = Counter()             # exception type -> count
+
+    def record(self, scenario: Scenario, status: int, elapsed: float):
+        self.latencies[scenario.name].append(elapsed)
+        self.statuses[status] += 1
+        if status not in scenario.expect:
+            self.unexpected[scenario.name] += 1
+
+
+async def client(conn: Connection, base: str, matrix: list, state: dict, stats: Stats, deadline: float,
+                 rng: random.Random, conn_requests: int):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        scenario = rng.choice(matrix)
+        if scenario.ready is not None and not scenario.ready(state):
+            continue
+        method, path, headers, body = scenario.build(state)
+        raw = b""
+        if body is not None:
+            raw = json.dumps(body).encode("utf-8")
+            headers = {**headers, "Content-Type": "application/json"}
+        start = time.perf_counter()
+        try:
+            status, data = await conn.request(method, base + path, headers, raw)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as ex:
+            stats.errors[type(ex).__name__] += 1
+            continue
+        stats.record(scenario, status, time.perf_counter() - start)
+        if scenario.done is not None:
+            scenario.done(state, status, data)
+        if conn_requests and conn.requests >= conn_requests:
+            conn.close()
+    conn.close()
+
+
+def percentile(sorted_values, p: float):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def histogram(latencies) -> list:
+    """[(upper bound in ms or None for the rest, count)]."""
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for seconds in latencies:
+        ms = seconds * 1000
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        counts[i] += 1
+    return list(zip(BUCKETS_MS + (None,), counts))
+
+
+def summary(latencies) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p90_ms": round(percentile(values, 90) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+def report(stats: Stats, elapsed: float, args) -> dict:
+    everything = [x for values in stats.latencies.values() for x in values]
+    total = len(everything)
+    return {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "statuses": {str(code): n for code, n in sorted(stats.statuses.items())},
+        "unexpected": dict(stats.unexpected),
+        "errors": dict(stats.errors),
+        "error_rate": round((sum(stats.unexpected.values()) + sum(stats.errors.values())) /
+                            max(1, total + sum(stats.errors.values())), 4),
+        "latency": summary(everything) if everything else None,
+        "histogram_ms": [{"le": le, "count": n} for le, n in histogram(everything)],
+        "scenarios": {name: summary(values) for name, values in sorted(stats.latencies.items())},
+    }
+
+
+def print_report(result: dict):
+    print(f"\n{result['requests']} requests in {result['duration_s']} s, {result['concurrency']} connections: "
+          f"{result['throughput_rps']} req/s")
+    print("status codes: " + ", ".join(f"{code} x{n}" for code, n in result["statuses"].items()))
+    if result["errors"]:
+        print("failed requests: " + ", ".join(f"{name} x{n}" for name, n in result["errors"].items()))
+    for name, n in sorted(result["unexpected"].items()):
+        print(f"unexpected status: {name} x{n}")
+    print(f"error rate: {result['error_rate'] * 100:.2f}%")
+
+    if result["latency"]:
+        lat = result["latency"]
+        print(f"\nlatency ms: p50 {lat['p50_ms']}  p90 {lat['p90_ms']}  p99 {lat['p99_ms']}  max {lat['max_ms']}")
+        peak = max(b["count"] for b in result["histogram_ms"]) or 1
+        for bucket in result["histogram_ms"]:
+            label = f"<= {bucket['le']:g} ms" if bucket["le"] is not None else f"> {BUCKETS_MS[-1]:g} ms"
+            print(f"  {label:>12} {bucket['count']:>8}  {'#' * round(40 * bucket['count'] / peak)}")
+
+    print(f"\n{'scenario':<52}{'count':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for name, s in result["scenarios"].items():
+        print(f"{name:<52}{s['count']:>8}{s['p50_ms']:>9}{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+
+
+async def run(args) -> dict:
+    url = urlsplit(args.url)
+    host, port, base = url.hostname or "127.0.0.1", url.port or 80, url.path.rstrip("/")
+
+    setup = Connection(host, port, args.timeout)
+    try:
+        tokens, order_id = await prepare(setup, base)
+    except (OSError, asyncio.TimeoutError, RuntimeError) as ex:
+        raise SystemExit(f"{args.url}: {ex or type(ex).__name__}")
+    setup.close()
+
+    matrix = scenario_matrix(tokens, order_id)
+    if args.only:
+        pattern = __import__("re").compile(args.only)
+        matrix = [s for s in matrix if pattern.search(s.name)]
+        if not matrix:
+            raise SystemExit(f"no scenario matches {args.only!r}")
+    # DELETE alone would never be ready
+    if all(s.ready is not None for s in matrix):
+        raise SystemExit("DELETE needs POST in the same run (orders to delete)")
+
+    state = {"created": deque()}
+    stats = Stats()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        client(Connection(host, port, args.timeout), base, matrix, state, stats, deadline,
+               random.Random(args.seed + i), args.conn_requests)
+        for i in range(args.concurrency)
+    ))
+    return report(stats, loop.time() - started, args)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["unexpected"] or result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Cold start of the CGI entry point: where the milliseconds of one `python access_manager.py`
+go, route by route (Apache starts a new interpreter for every hit).
+
+    python bench/startup.py                              # every route, 7 runs each
+    python bench/startup.py --only discount --tree       # -X importtime tree of the app's imports
+    python bench/startup.py --budget-ms 40               # exit 1 when a route needs more
+    python bench/startup.py --budget-ratio 2             # ... more than 2 bare interpreter start-ups
+
+total       wall-clock time of the process
+interpreter `python -c pass`, run between the route's processes: not ours to optimize
+imports     modules the route imports on top of the bare interpreter (-X importtime,
+            cumulative time of the top-level imports; slightly inflated by the tracing itself)
+request     the rest: routing, the controller, the response
+Every figure is the best of --runs: noise (other processes, cold disk cache) only adds
+time. The budget applies to total - interpreter, the part this code controls; --budget-ratio
+states it in bare interpreter start-ups, so one gate fits fast and slow machines.
+
+The app is byte-compiled first (--no-compile to skip), like after the first hit of a
+deploy: with PYTHONDONTWRITEBYTECODE set, every changed module would be compiled from
+source on every request. With PYTHONPYCACHEPREFIX set, all byte-code (the app's and the
+standard library's) goes to that directory instead of __pycache__ next to the sources.
+Orders, keys, revocations and the response cache live in a temporary directory: a run
+neither reads nor leaves anything in the app's own files.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import compileall
+import subprocess
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = "/python-api/basics/13"
+
+# name, method, path, query, headers; {token}: minted by GET /user, {id}: the first order in db.json
+ROUTES = [
+    ("GET /user", "GET", "/user", "", {}),
+    ("GET /user?mode=nested", "GET", "/user", "mode=nested", {}),
+    ("GET /discount", "GET", "/discount", "", {"HTTP_AUTHORIZATION": "Bearer {token}"}),
+    ("GET /discount (no token)", "GET", "/discount", "", {}),
+    ("GET /order?limit=20", "GET", "/order", "limit=20", {}),
+    ("GET /order/{id}", "GET", "/order/{id}", "", {}),
+    ("GET /order/stats", "GET", "/order/stats", "", {}),
+    ("GET /usertest", "GET", "/usertest", "", {}),
+    ("GET /static/css/site.css", "GET", "/static/css/site.css", "", {}),
+    ("unknown route (404)", "GET", "/nothing", "", {}),
+]
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start breakdown of the CGI entry point.")
+    ap.add_argument("--runs", type=int, default=7, help="processes per route and measurement")
+    ap.add_argument("--only", help="regex: measure only the routes whose name matches")
+    ap.add_argument("--top", type=int, default=6, help="top-level imports listed per route")
+    ap.add_argument("--tree", action="store_true", help="print the -X importtime tree of the app's imports")
+    ap.add_argument("--min-ms", type=float, default=0.3, help="--tree: hide imports cheaper than this (cumulative)")
+    ap.add_argument("--budget-ms", type=float, help="max total - interpreter per route; exit 1 when exceeded")
+    ap.add_argument("--budget-ratio", type=float,
+                    help="max (total - interpreter) / interpreter per route; exit 1 when exceeded")
+    ap.add_argument("--no-compile", action="store_true", help="do not byte-compile the app first")
+    ap.add_argument("--json", help="also write the result as JSON to this file")
+    return ap.parse_args(argv)
+
+
+# =========================
+# PROCESSES
+# =========================
+def app_env(workdir: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("ORDER_", "JWT_"))}
+    env.update({
+        "ORDER_DB_PATH": os.path.join(workdir, "db.json"),
+        "ORDER_WAL_PATH": os.path.join(workdir, "db.wal"),
+        "ORDER_SQLITE_PATH": os.path.join(workdir, "db.sqlite3"),
+        "JWT_KEYS_PATH": os.path.join(workdir, "jwt_keys.json"),
+        "JWT_REVOKED_PATH": os.path.join(workdir, "revoked.sqlite3"),
+        "ORDER_RESPONSE_CACHE_DIR": os.path.join(workdir, "cache"),
+    })
+    return env
+
+
+def cgi_env(env: dict, method: str, path: str, query: str, headers: dict) -> dict:
+    return {
+        **env,
+        **headers,
+        "REQUEST_METHOD": method,
+        "REQUEST_URI": PREFIX + path + ("?" + query if query else ""),
+        "QUERY_STRING": "htctrl=1" + ("&" + query if query else ""),
+    }
+
+
+def run(command: list, env: dict, importtime: bool = False):
+    """-> (seconds, stdout, stderr) of one process."""
+    if importtime:
+        command = [command[0], "-X", "importtime"] + command[1:]
+    start = time.perf_counter()
+    done = subprocess.run(command, env=env, cwd=BASE_DIR, capture_output=True)
+    return time.perf_counter() - start, done.stdout, done.stderr.decode("utf-8", "replace")
+
+
+def parse_importtime(stderr: str) -> list:
+    """-X importtime output -> [(depth, name, self ms, cumulative ms)] in its order (children first)."""
+    entries = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            entries.append((len(m.group(3)) // 2, m.group(4), int(m.group(1)) / 1000, int(m.group(2)) / 1000))
+    return entries
+
+
+def mint_token(env: dict) -> str:
+    _, out, err = run([sys.executable, "access_manager.py"], cgi_env(env, "GET", "/user", "", {}))
+    try:
+        return json.loads(out.split(b"\n\n", 1)[1])["data"]["token"]
+    except (IndexError, ValueError, KeyError, TypeError):
+        raise SystemExit(f"GET /user did not return a token:\n{out[:500]!r}\n{err[-500:]}")
+
+
+# =========================
+# MEASURE
+# =========================
+INTERPRETER = [sys.executable, "-c", "pass"]
+
+
+def interpreter_imports() -> set:
+    # whatever the bare interpreter imports (site, encodings, ...) is not the app's
+    return {name for _, name, _, _ in parse_importtime(run(INTERPRETER, dict(os.environ), importtime=True)[2])}
+
+
+def measure_route(env: dict, runs: int, preloaded: set):
+    command = [sys.executable, "access_manager.py"]
+    interpreter, walls, import_totals, by_module, trees = [], [], [], {}, []
+    status = None
+    for _ in range(runs):
+        interpreter.append(run(INTERPRETER, dict(os.environ))[0] * 1000)
+        seconds, out, _ = run(command, env)
+        walls.append(seconds * 1000)
+        status = status or (out.split(b"\n", 1)[0].decode("latin-1") if out.startswith(b"Status:") else "Status: 200")
+
+        entries = parse_importtime(run(command, env, importtime=True)[2])
+        top = [(name, cumulative) for depth, name, _, cumulative in entries if depth == 0 and name not in preloaded]
+        import_totals.append(sum(ms for _, ms in top))
+        for name, ms in top:
+            by_module.setdefault(name, []).append(ms)
+        trees.append(entries)
+    best = min(range(runs), key=lambda i: import_totals[i])
+    return {
+        "status": status.split(":", 1)[1].strip(),
+        "interpreter_ms": min(interpreter),
+        "total_ms": min(walls),
+        "imports_ms": import_totals[best],
+        "modules": {name: min(v) for name, v in by_module.items()},
+        "tree": trees[best],
+    }
+
+
+def print_tree(entries: list, preloaded: set, min_ms: float):
+    """Like -X importtime (a module after the ones it imported), without the interpreter's own imports."""
+    block = []
+    for depth, name, self_ms, cumulative in entries:
+        block.append((depth, name, self_ms, cumulative))
+        if depth == 0:
+            if name not in preloaded:
+                for d, n, s, c in block:
+                    if c >= min_ms:
+                        print(f"      {s:>7.2f} | {c:>7.2f} | {'  ' * d}{n}")
+            block = []
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    only = re.compile(args.only) if args.only else None
+    if not args.no_compile:
+        compileall.compile_dir(BASE_DIR, quiet=1, rx=re.compile(r"[\\/](bench|\.git)[\\/]"))
+
+    workdir = tempfile.mkdtemp(prefix="python-api-13-startup-")
+    try:
+        shutil.copy(os.path.join(BASE_DIR, "db.json"), os.path.join(workdir, "db.json"))
+        env = app_env(workdir)
+        token = mint_token(env)
+        with open(os.path.join(workdir, "db.json"), "r", encoding="utf-8") as f:
+            order_id = next((o["id"] for o in json.load(f).get("orders", [])), 1)
+        preloaded = interpreter_imports()
+        print(f"best of {args.runs} processes per route (ms)\n")
+
+        results, over = {}, []
+        for name, method, path, query, headers in ROUTES:
+            if only and not only.search(name):
+                continue
+            headers = {k: v.format(token=token) for k, v in headers.items()}
+            path = path.replace("{id}", str(order_id))
+            r = measure_route(cgi_env(env, method, path, query, headers), args.runs, preloaded)
+            own = r["total_ms"] - r["interpreter_ms"]
+            request_ms = max(0.0, own - r["imports_ms"])
+            verdict = ""
+            limits = [args.budget_ms] if args.budget_ms is not None else []
+            if args.budget_ratio is not None:
+                limits.append(args.budget_ratio * r["interpreter_ms"])
+            if limits:
+                verdict = f"  budget {min(limits):.1f}: " + ("ok" if own <= min(limits) else "OVER")
+                if own > min(limits):
+                    over.append(name)
+            print(f"{name:<28} {r['status']:<16} total {r['total_ms']:6.1f} ms = interpreter {r['interpreter_ms']:.1f}"
+                  f" + imports {r['imports_ms']:.1f} + request {request_ms:.1f}{verdict}")
+            for module, ms in sorted(r["modules"].items(), key=lambda x: -x[1])[:args.top]:
+                print(f"      {ms:7.2f} ms  {module}")
+            if args.tree:
+                print("         self |   cumul | module (ms)")
+                print_tree(r["tree"], preloaded, args.min_ms)
+            print()
+            results[name] = {
+                "status": r["status"],
+                "total_ms": round(r["total_ms"], 2),
+                "interpreter_ms": round(r["interpreter_ms"], 2),
+                "own_ms": round(own, 2),
+                "imports_ms": round(r["imports_ms"], 2),
+                "request_ms": round(request_ms, 2),
+                "modules_ms": {k: round(v, 2) for k, v in sorted(r["modules"].items(), key=lambda x: -x[1])},
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"budget_ms": args.budget_ms, "budget_ratio": args.budget_ratio,
+                       "runs": args.runs, "routes": results}, f, indent=2)
+    if over:
+        print("over the budget: " + ", ".join(over), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
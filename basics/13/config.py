@@ -0,0 +1,67 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # .../basics/13
+
+# error details in responses, indented JSON (?pretty=1 works in any mode)
+DEV_MODE = os.environ.get("DEV_MODE", "1") == "1"
+
+# set by server.py: long-lived process (background threads are allowed)
+SERVER_MODE = False
+# set by server.py with --workers > 1: a waiting long-poll request occupies a whole
+# (single-threaded) worker, so with one worker it would block everybody else
+LONG_POLL = False
+# set by server.py: how many workers may wait in a long-poll at once (across processes);
+# further ?wait= requests are answered at once, so the other workers keep serving
+LONG_POLL_WAITERS = 0
+
+# ---- order storage ----
+# "json": db.json rewritten on every change (default)
+# "wal":  append-only log db.wal + db.json as snapshot
+# "sqlite": db.sqlite3 (import db.json once: python -m stores.sqlite_store import)
+ORDER_STORE = os.environ.get("ORDER_STORE", "json").lower()
+DB_PATH = os.environ.get("ORDER_DB_PATH", os.path.join(BASE_DIR, "db.json"))
+WAL_PATH = os.environ.get("ORDER_WAL_PATH", os.path.join(BASE_DIR, "db.wal"))
+SQLITE_PATH = os.environ.get("ORDER_SQLITE_PATH", os.path.join(BASE_DIR, "db.sqlite3"))
+
+# "always": fsync every append before answering; "interval" (server mode): at most one fsync
+# per interval in the background - the answer does not wait for it, so a machine crash or power
+# loss can drop the writes of the last interval ("batch" is the old name); "off": leave it to the OS
+WAL_FSYNC = os.environ.get("ORDER_WAL_FSYNC", "interval").lower()
+WAL_FSYNC_INTERVAL = float(os.environ.get("ORDER_WAL_FSYNC_INTERVAL", "0.05"))
+# compact when the log has more records than this and than live orders
+WAL_COMPACT_MIN_RECORDS = int(os.environ.get("ORDER_WAL_COMPACT_MIN_RECORDS", "1000"))
+
+# ---- change feed (GET /order/changes) ----
+# deletions are remembered for this many mutations; an older ?since= gets 410 Gone
+CHANGES_HISTORY = int(os.environ.get("ORDER_CHANGES_HISTORY", "10000"))
+# upper bound for ?wait= (seconds) when LONG_POLL is on
+CHANGES_MAX_WAIT = float(os.environ.get("ORDER_CHANGES_MAX_WAIT", "25"))
+
+# ---- response cache (GET /order, GET /order/{id}) ----
+# encoded bodies, valid while the store's data token is unchanged; 0 disables it
+RESPONSE_CACHE_SIZE = int(os.environ.get("ORDER_RESPONSE_CACHE_SIZE", "256"))
+# shared by all worker/CGI processes ("" = per-process memory only); the directory must be
+# private to the app's user, otherwise only the memory level is used
+RESPONSE_CACHE_DIR = os.environ.get("ORDER_RESPONSE_CACHE_DIR", os.path.join(BASE_DIR, ".response_cache"))
+# bigger list pages are streamed instead of cached
+RESPONSE_CACHE_MAX_ITEMS = int(os.environ.get("ORDER_RESPONSE_CACHE_MAX_ITEMS", "200"))
+
+# ---- token minting (POST /user/batch) ----
+USER_BATCH_MAX = int(os.environ.get("USER_BATCH_MAX", "10000"))
+# server mode: batches of at least this many tokens are signed in a process pool of USER_BATCH_WORKERS
+USER_BATCH_PARALLEL_MIN = int(os.environ.get("USER_BATCH_PARALLEL_MIN", "2000"))
+USER_BATCH_WORKERS = int(os.environ.get("USER_BATCH_WORKERS", str(os.cpu_count() or 1)))
+
+# ---- JWT keys (/user signs, /discount verifies) ----
+# {"active": kid, "keys": {kid: secret, ...}, "legacy": true}; no file = built-in key, no kid
+JWT_KEYS_PATH = os.environ.get("JWT_KEYS_PATH", os.path.join(BASE_DIR, "jwt_keys.json"))
+# how often a process looks at the file (seconds); a changed file is reloaded without restart
+JWT_KEYS_CHECK_INTERVAL = float(os.environ.get("JWT_KEYS_CHECK_INTERVAL", "1.0"))
+
+# ---- token revocation (POST /user/revoke) ----
+# revoked jti until their exp; shared by all processes
+REVOKED_PATH = os.environ.get("JWT_REVOKED_PATH", os.path.join(BASE_DIR, "revoked.sqlite3"))
+# server mode: Bloom filter sized for this many ids (grows when exceeded, ~1.2 MB per million)
+REVOKED_BLOOM_CAPACITY = int(os.environ.get("JWT_REVOKED_BLOOM_CAPACITY", "100000"))
+# how often a worker picks up ids revoked by other processes (seconds)
+REVOKED_CHECK_INTERVAL = float(os.environ.get("JWT_REVOKED_CHECK_INTERVAL", "1.0"))
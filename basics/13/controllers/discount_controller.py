@@ -1,10 +1,72 @@
 from models.request import CgiRequest
 import json
 import time
-import base64
-import hmac
 import hashlib
-import re
+import binascii
+from collections import OrderedDict
+from jwt_codec import get_keyring, JwtError, b64url_decode
+from revocation import get_revocation_list
+from lazy_re import LazyPattern
+from responses import send_json, Fragment
+
+LINKS = Fragment({"get_user": "GET /user", "get_discount": "GET /discount", "quote": "POST /discount/quote"})
+
+
+class TokenCache:
+    """
+    Results of _validate_token() by token digest, so a reused bearer token skips
+    parsing and HMAC until it expires.
+    - valid tokens: kept until their exp (the same second the full check would reject them)
+    - invalid tokens (bad signature, claims, ...): kept for negative_ttl seconds,
+      in a separate LRU so a flood of junk tokens cannot push out the valid ones
+    - everything is dropped when the key ring changes (a removed or added kid)
+    """
+
+    def __init__(self, size: int = 1024, negative_size: int = 256, negative_ttl: float = 60.0):
+        self.size = size
+        self.negative_size = negative_size
+        self.negative_ttl = negative_ttl
+        self._valid = OrderedDict()    # digest -> (expires_at, info)
+        self._invalid = OrderedDict()  # digest -> (expires_at, message)
+        self.generation = 0            # KeyRing.generation the entries were checked with
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, key: bytes, now: float):
+        """-> (ok, info) like _validate_token(), or None on a miss."""
+        for entries, ok in ((self._valid, True), (self._invalid, False)):
+            entry = entries.get(key)
+            if entry is None:
+                continue
+            expires_at, info = entry
+            if now >= expires_at:
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return ok, info
+        return None
+
+    def clear(self, generation: int):
+        self._valid.clear()
+        self._invalid.clear()
+        self.generation = generation
+
+    def put(self, key: bytes, ok: bool, info, now: float):
+        if ok:
+            # exp is checked as int(now) <= exp: valid until the end of that second
+            entries, size, expires_at = self._valid, self.size, info["payload"]["exp"] + 1
+        else:
+            entries, size, expires_at = self._invalid, self.negative_size, now + self.negative_ttl
+        entries[key] = (expires_at, info)
+        entries.move_to_end(key)
+        while len(entries) > size:
+            entries.popitem(last=False)
+
+
+# per process: in server mode it lives as long as the worker
+_verified_tokens = TokenCache()
 
 
 class DiscountController:
@@ -15,18 +77,22 @@ class DiscountController:
     - signature check
     - exp check
     - nested JWT Step 8 (cty=JWT)
+    - revocation: jti denied after POST /user/revoke
     - internal claims validation:
         sub must be UUID
         iss must be "Server-KN-P-221"
         must have at least one of: name OR email
         if email exists -> must be valid email format
+
+    POST /discount/quote -> discounted prices for many orders, one token check (see handle_quote)
     """
 
-    SECRET = b"super-secret-key-13"
     MAX_NESTING = 3
+    DISCOUNT_PERCENT = 7
+    MAX_QUOTE = 1000
 
-    UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
-    EMAIL_RE = re.compile(r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}$")
+    UUID_RE = LazyPattern(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+    EMAIL_RE = LazyPattern(r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}$")
 
     def __init__(self, request: CgiRequest):
         self.request = request
@@ -37,23 +103,8 @@ class DiscountController:
             self._json(self._err(method, 405, "Method Not Allowed"), status_line="405 Method Not Allowed")
             return
 
-        auth = self.request.headers.get("Authorization")
-        if not auth:
-            self._json(self._err(method, 403, "Forbidden: missing Authorization header"), status_line="403 Forbidden")
-            return
-
-        if not auth.startswith("Bearer "):
-            self._json(self._err(method, 403, "Forbidden: invalid scheme (expected 'Bearer <token>')"), status_line="403 Forbidden")
-            return
-
-        token = auth[len("Bearer "):].strip()
-        if not token:
-            self._json(self._err(method, 403, "Forbidden: empty token"), status_line="403 Forbidden")
-            return
-
-        ok, info = self._validate_token(token, depth=0)
-        if not ok:
-            self._json(self._err(method, 403, f"Forbidden: {info}"), status_line="403 Forbidden")
+        info = self._authorize(method)
+        if info is None:
             return
 
         payload = info["payload"]
@@ -67,10 +118,10 @@ class DiscountController:
                 "authUserId": payload.get("sub"),
                 "serverTime": time.time(),
                 "nesting": nesting,
-                "links": {"get_user": "GET /user", "get_discount": "GET /discount"}
+                "links": LINKS
             },
             "data": {
-                "discountPercent": 7,
+                "discountPercent": self.DISCOUNT_PERCENT,
                 "forUser": payload.get("name"),
                 "email": payload.get("email"),
                 "aud": payload.get("aud"),
@@ -79,38 +130,136 @@ class DiscountController:
         }
         self._json(response)
 
-    # ---------------- JWT validation (with nested support) ----------------
+    def handle_quote(self):
+        """
+        POST /discount/quote   (Authorization: Bearer <token>)
+          {"ids": [3, 5, 8]}
+        The token is checked once and the orders are read in one pass of the store;
+        results follow the order of "ids":
+          {"id", "status": 200, "title", "price", "discountedPrice"}
+          {"id", "status": 404 | 422, "error"}   (missing order / price is not a number)
+        plus "total" and "discountedTotal" over the priced orders.
+        """
+        method = "POST"
+        info = self._authorize(method)
+        if info is None:
+            return
 
-    def _validate_token(self, token: str, depth: int):
-        if depth > self.MAX_NESTING:
-            return False, "nested JWT depth limit exceeded"
+        try:
+            body = json.loads(self.request.read_body() or "{}")
+        except ValueError:
+            body = None
+        ids = body.get("ids") if isinstance(body, dict) else None
+        if not isinstance(ids, list) or not ids or not all(self._is_id(x) for x in ids):
+            self._json(self._err(method, 400, "Bad Request: ids must be a non-empty list of order ids"),
+                       status_line="400 Bad Request")
+            return
+        if len(ids) > self.MAX_QUOTE:
+            self._json(self._err(method, 413, f"Too many ids (max {self.MAX_QUOTE})"),
+                       status_line="413 Payload Too Large")
+            return
+        ids = [int(x) for x in ids]
+
+        # only the quote reads orders: GET /discount does not import the stores
+        from stores import get_order_store
+        from stores.base import is_number
+        orders = get_order_store().get_many(ids)
+        factor = (100 - self.DISCOUNT_PERCENT) / 100
+        quotes, total, discounted_total = [], 0, 0
+        for oid in ids:
+            item = orders.get(oid)
+            if item is None:
+                quotes.append({"id": oid, "status": 404, "error": "Order not found"})
+                continue
+            price = item.get("price")
+            if not is_number(price):
+                quotes.append({"id": oid, "status": 422, "error": "Order price is not a number"})
+                continue
+            discounted = round(price * factor, 2)
+            quotes.append({"id": oid, "status": 200, "title": item.get("title"), "price": price,
+                           "discountedPrice": discounted})
+            total += price
+            discounted_total += discounted
+
+        payload = info["payload"]
+        self._json({
+            "status": {"is_ok": True, "code": 200, "message": "OK"},
+            "meta": {
+                "service": "Discount API: protected",
+                "requestMethod": method,
+                "authUserId": payload.get("sub"),
+                "serverTime": time.time(),
+                "nesting": info.get("nesting", 0),
+                "links": LINKS
+            },
+            "data": {
+                "discountPercent": self.DISCOUNT_PERCENT,
+                "forUser": payload.get("name"),
+                "quotes": quotes,
+                "total": round(total, 2),
+                "discountedTotal": round(discounted_total, 2)
+            }
+        })
 
-        allowed = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_."
-        for ch in token:
-            if ch not in allowed:
-                return False, f"token has invalid base64url symbol '{ch}'"
+    @staticmethod
+    def _is_id(value) -> bool:
+        # 5 or "5", like /order/5 and ?id=5; ids start at 1
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            value = int(value)
+        return isinstance(value, int) and not isinstance(value, bool) and value > 0
 
-        parts = token.split(".")
-        if len(parts) != 3:
-            return False, "token format invalid (expected 3 parts: header.payload.signature)"
+    # ---------------- JWT validation (with nested support) ----------------
+
+    def _authorize(self, method: str):
+        """Bearer token -> validation info, or None after sending the 403."""
+        auth = self.request.headers.get("Authorization")
+        if not auth:
+            self._json(self._err(method, 403, "Forbidden: missing Authorization header"), status_line="403 Forbidden")
+            return None
 
-        h64, p64, s64 = parts
+        if not auth.startswith("Bearer "):
+            self._json(self._err(method, 403, "Forbidden: invalid scheme (expected 'Bearer <token>')"), status_line="403 Forbidden")
+            return None
 
-        header_json = self._b64url_decode_to_text(h64)
-        if header_json is None:
-            return False, "header part is not valid base64url"
+        token = auth[len("Bearer "):].strip()
+        if not token:
+            self._json(self._err(method, 403, "Forbidden: empty token"), status_line="403 Forbidden")
+            return None
 
-        try:
-            header = json.loads(header_json)
-        except Exception:
-            return False, "header JSON invalid"
+        ok, info = self._validate_cached(token)
+        if not ok:
+            self._json(self._err(method, 403, f"Forbidden: {info}"), status_line="403 Forbidden")
+            return None
+        return info
+
+    def _validate_cached(self, token: str):
+        generation = get_keyring().refresh()
+        if generation != _verified_tokens.generation:
+            _verified_tokens.clear(generation)
+
+        now = time.time()
+        key = TokenCache.key(token)
+        cached = _verified_tokens.get(key, now)
+        if cached is None:
+            cached = self._validate_token(token, depth=0)
+            _verified_tokens.put(key, *cached, now)
+
+        # revocation can happen at any moment: checked on every request, cached or not
+        ok, info = cached
+        jti = info["payload"].get("jti") if ok else None
+        if isinstance(jti, str) and get_revocation_list().is_revoked(jti):
+            return False, "token revoked"
+        return ok, info
 
-        if header.get("alg") != "HS256":
-            return False, "unsupported alg (expected HS256)"
+    def _validate_token(self, token: str, depth: int):
+        if depth > self.MAX_NESTING:
+            return False, "nested JWT depth limit exceeded"
 
-        expected_sig = self._sign(h64, p64)
-        if not hmac.compare_digest(expected_sig, s64):
-            return False, "signature invalid"
+        # alphabet, shape, header, alg, then the signature with the key named by kid
+        try:
+            header, h64, p64 = get_keyring().verify(token)
+        except JwtError as ex:
+            return False, str(ex)
 
         # ---- Step 8 (nested JWT): cty=JWT ----
         cty = header.get("cty")
@@ -178,20 +327,10 @@ class DiscountController:
 
         return True, "OK"
 
-    def _sign(self, h64: str, p64: str) -> str:
-        signing_input = f"{h64}.{p64}".encode("ascii")
-        sig = hmac.new(self.SECRET, signing_input, hashlib.sha256).digest()
-        return self._b64url_encode(sig)
-
-    def _b64url_encode(self, b: bytes) -> str:
-        return base64.urlsafe_b64encode(b).decode("ascii").rstrip("=")
-
     def _b64url_decode_to_text(self, s: str):
         try:
-            pad = "=" * ((4 - (len(s) % 4)) % 4)
-            raw = base64.urlsafe_b64decode((s + pad).encode("ascii"))
-            return raw.decode("utf-8")
-        except Exception:
+            return b64url_decode(s).decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError):
             return None
 
     # ---------------- response helpers ----------------
@@ -204,8 +343,4 @@ class DiscountController:
         }
 
     def _json(self, obj, status_line: str = None):
-        if status_line:
-            print(f"Status: {status_line}")
-        print("Content-Type: application/json; charset=utf-8")
-        print()
-        print(json.dumps(obj, ensure_ascii=False, indent=2))
+        send_json(obj, status_line, self.request)
@@ -1,15 +1,53 @@
 from models.request import CgiRequest
-import os
+from stores import get_order_store, VersionConflict, HistoryExpired, FIELDS, SORT_FIELDS, version_of
+from stores.base import FileLock
+from responses import (send_json, send_json_stream, send_status, send_body, render_json, choose_encoding,
+                       wants_pretty, items_placeholder, Fragment)
+from response_cache import get_response_cache
+import config
 import json
 import time
-import sys
+import base64
+
+LINKS = Fragment({
+    "get_list": "GET /order",
+    "get_one": "GET /order?id=1",
+    "post": "POST /order",
+    "put": "PUT /order?id=1",
+    "patch": "PATCH /order?id=1",
+    "delete": "DELETE /order?id=1",
+    "batch": "POST /order/batch",
+    "changes": "GET /order/changes?since=0",
+    "stats": "GET /order/stats",
+})
+
+# batch "op" names (HTTP method names work too)
+BATCH_OPS = {
+    "create": "create", "post": "create",
+    "replace": "replace", "put": "replace",
+    "patch": "patch",
+    "delete": "delete",
+}
+
+# long-poll slots of this process: one lock file per slot, shared by all workers
+_poll_slots = []
 
 
 class OrderController:
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+    MAX_BATCH = 1000
+    # long-poll: how often the store version is re-checked. Workers are single-threaded, so a
+    # waiting request takes a whole worker: only config.LONG_POLL_WAITERS requests (half of
+    # the workers) wait at once, any further one gets its (empty) answer right away
+    POLL_INTERVAL = 0.1
+
     def __init__(self, request: CgiRequest):
         self.request = request
-        self.base_dir = os.path.dirname(os.path.dirname(__file__))  # .../basics/13
-        self.db_path = os.path.join(self.base_dir, "db.json")
+        # backend chosen by config.ORDER_STORE (db.json by default)
+        self.store = get_order_store()
+        self.cache = get_response_cache()
+        self._cache_slot = None  # (key, token) of a cache miss, filled by _send_cached()
 
     # =========================
     # MAIN ENTRY
@@ -41,41 +79,150 @@ class OrderController:
     # =========================
     def handle_get(self):
         method = "GET"
-        db = self._read_db()
-        orders = db.get("orders", [])
 
         oid = self._get_id()
         if oid is None:
-            self._json(self._ok(method, {"items": orders}))
+            self.handle_list()
+            return
+        if self._send_cached():
             return
 
-        item = next((x for x in orders if x.get("id") == oid), None)
+        item = self.store.get(oid)
         if not item:
             self._json(self._err(method, 404, "Order not found"), status_line="404 Not Found")
             return
 
-        self._json(self._ok(method, {"item": item}))
+        etag = self._etag(item)
+        if self._not_modified(etag):
+            send_status("304 Not Modified", {"ETag": etag, "Cache-Control": "no-cache"})
+            return
+        self._json_cached(self._ok(method, {"item": item}), {"ETag": etag, "Cache-Control": "no-cache"})
+
+    def handle_list(self):
+        """
+        GET /order?limit=&after=&status=&min_price=&max_price=&sort=&fields=
+          limit      page size (default DEFAULT_LIMIT, at most MAX_LIMIT)
+          after      cursor from meta.links.next of the previous page
+          status     status filter, comma separated: status=new,paid
+          min_price / max_price   inclusive price range
+          sort       id | title | price | status, '-' prefix for descending: sort=-price
+          fields     projection, comma separated: fields=id,title
+        """
+        method = "GET"
+        try:
+            q = self._list_query()
+        except ValueError as ex:
+            self._json(self._err(method, 400, f"Bad Request: {ex}"), status_line="400 Bad Request")
+            return
+        # big pages are streamed, not cached
+        cacheable = q["limit"] <= config.RESPONSE_CACHE_MAX_ITEMS
+        if cacheable and self._send_cached():
+            return
+
+        # the page depends only on the query string and the collection version
+        version = self.store.version()
+        etag = f'W/"orders-{version}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self._not_modified(etag):
+            send_status("304 Not Modified", headers)
+            return
+
+        items, has_more = self.store.query(
+            statuses=q["statuses"], min_price=q["min_price"], max_price=q["max_price"],
+            sort=q["sort"], descending=q["descending"], after=q["after"], limit=q["limit"]
+        )
+
+        links = {}
+        if has_more and items:
+            links["next"] = "GET /order?" + self._next_query(self._cursor(items[-1], q["sort"]))
+        count = len(items)
+        if q["fields"]:
+            items = ({k: x[k] for k in q["fields"] if k in x} for x in items)
+
+        # version: starting point for GET /order/changes?since=
+        envelope = self._ok(method, {"items": items_placeholder(), "count": count, "version": version}, links=links)
+        if cacheable:
+            self._json_cached(envelope, headers, items)
+            return
+        # the envelope is written first, then items are encoded one by one
+        send_json_stream(envelope, items, request=self.request, headers=headers)
+
+    def handle_changes(self):
+        """
+        GET /order/changes?since=&limit=&wait=
+          since   last seq the client has applied (start with data.version of GET /order)
+          limit   max changes per response (default DEFAULT_LIMIT, at most MAX_LIMIT)
+          wait    long-poll: seconds to wait when there is nothing new yet
+                  (server mode with several workers only, at most CHANGES_MAX_WAIT;
+                  answered at once while LONG_POLL_WAITERS other requests are waiting)
+        data.changes: {"seq", "op": "put", "item"} / {"seq", "op": "del", "id"}, in seq order,
+        one entry per order (its latest state). data.since is the cursor for the next call.
+        410 Gone: the feed no longer covers `since` -> reload GET /order.
+        """
+        method = "GET"
+        since, limit, wait = self._param("since"), self._param("limit"), self._param("wait")
+        try:
+            if since is None or not since.isdigit():
+                raise ValueError("since must be a seq number (data.version of GET /order)")
+            since = int(since)
+            limit = int(limit) if limit else self.DEFAULT_LIMIT
+            if not 1 <= limit <= self.MAX_LIMIT:
+                raise ValueError(f"limit must be 1..{self.MAX_LIMIT}")
+            wait = min(float(wait), config.CHANGES_MAX_WAIT) if wait and config.LONG_POLL else 0
+        except ValueError as ex:
+            self._json(self._err(method, 400, f"Bad Request: {ex}"), status_line="400 Bad Request")
+            return
+
+        try:
+            changes, has_more, version = self.store.changes(since, limit)
+            slot = self._poll_slot() if not changes and wait > 0 and since == version else None
+            if slot is not None:
+                with slot:
+                    # writes may come from any worker/process: poll the (cheap) store version
+                    deadline = time.monotonic() + wait
+                    while version == since and time.monotonic() < deadline:
+                        time.sleep(self.POLL_INTERVAL)
+                        version = self.store.version()
+                if version != since:
+                    changes, has_more, version = self.store.changes(since, limit)
+        except HistoryExpired as ex:
+            self._json(self._err(method, 410, f"Gone: {ex}, reload GET /order"), status_line="410 Gone")
+            return
+        if since > version:
+            # the store was reset/replaced: the client is ahead of it
+            self._json(self._err(method, 410, f"Gone: since is ahead of version {version}, reload GET /order"),
+                       status_line="410 Gone")
+            return
+
+        next_since = changes[-1]["seq"] if has_more else max(version, since)
+        self._json(self._ok(method, {"changes": changes, "count": len(changes), "has_more": has_more,
+                                     "since": next_since, "version": version},
+                            links={"next": f"GET /order/changes?since={next_since}"}))
+
+    def handle_stats(self):
+        """
+        GET /order/stats
+        Counts and price totals overall, by status and by price bucket.
+        The store keeps them up to date on every write, so this costs O(#groups).
+        """
+        method = "GET"
+        version = self.store.version()
+        etag = f'W/"stats-{version}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self._not_modified(etag):
+            send_status("304 Not Modified", headers)
+            return
+
+        self._json(self._ok(method, {**self.store.stats(), "version": version}), headers=headers)
 
     def handle_post(self):
         method = "POST"
-        db = self._read_db()
-        orders = db.get("orders", [])
-
         body = self._read_body_json()
-        new_id = max([x.get("id", 0) for x in orders], default=0) + 1
-
-        item = {
-            "id": new_id,
-            "title": body.get("title", f"Order {new_id}"),
-            "price": body.get("price", 0),
-            "status": body.get("status", "new")
-        }
 
-        orders.append(item)
-        db["orders"] = orders
-        self._write_db(db)
+        item = self.store.create({k: body[k] for k in FIELDS if k in body})
 
-        self._json(self._ok(method, {"created": item}, code=201, message="Created"), status_line="201 Created")
+        self._json(self._ok(method, {"created": item}, code=201, message="Created"), status_line="201 Created",
+                   headers={"ETag": self._etag(item)})
 
     def handle_put(self):
         method = "PUT"
@@ -84,27 +231,21 @@ class OrderController:
             self._json(self._err(method, 400, "PUT requires ?id="), status_line="400 Bad Request")
             return
 
-        db = self._read_db()
-        orders = db.get("orders", [])
-
-        idx = next((i for i, x in enumerate(orders) if x.get("id") == oid), None)
-        if idx is None:
+        body = self._read_body_json()
+        try:
+            replaced = self.store.replace(oid, {
+                "title": body.get("title", ""),
+                "price": body.get("price", 0),
+                "status": body.get("status", "new")
+            }, self._if_match(oid))
+        except VersionConflict as ex:
+            self._precondition_failed(method, ex)
+            return
+        if replaced is None:
             self._json(self._err(method, 404, "Order not found"), status_line="404 Not Found")
             return
 
-        body = self._read_body_json()
-        replaced = {
-            "id": oid,
-            "title": body.get("title", ""),
-            "price": body.get("price", 0),
-            "status": body.get("status", "new")
-        }
-
-        orders[idx] = replaced
-        db["orders"] = orders
-        self._write_db(db)
-
-        self._json(self._ok(method, {"updated": replaced}, message="Replaced"))
+        self._json(self._ok(method, {"updated": replaced}, message="Replaced"), headers={"ETag": self._etag(replaced)})
 
     def handle_patch(self):
         method = "PATCH"
@@ -113,22 +254,18 @@ class OrderController:
             self._json(self._err(method, 400, "PATCH requires ?id="), status_line="400 Bad Request")
             return
 
-        db = self._read_db()
-        orders = db.get("orders", [])
-
-        item = next((x for x in orders if x.get("id") == oid), None)
-        if not item:
-            self._json(self._err(method, 404, "Order not found"), status_line="404 Not Found")
-            return
-
         body = self._read_body_json()
         # partial update
-        for k in ["title", "price", "status"]:
-            if k in body:
-                item[k] = body[k]
+        try:
+            item = self.store.patch(oid, {k: body[k] for k in FIELDS if k in body}, self._if_match(oid))
+        except VersionConflict as ex:
+            self._precondition_failed(method, ex)
+            return
+        if item is None:
+            self._json(self._err(method, 404, "Order not found"), status_line="404 Not Found")
+            return
 
-        self._write_db(db)
-        self._json(self._ok(method, {"updated": item}, message="Patched"))
+        self._json(self._ok(method, {"updated": item}, message="Patched"), headers={"ETag": self._etag(item)})
 
     def handle_delete(self):
         method = "DELETE"
@@ -137,47 +274,249 @@ class OrderController:
             self._json(self._err(method, 400, "DELETE requires ?id="), status_line="400 Bad Request")
             return
 
-        db = self._read_db()
-        orders = db.get("orders", [])
-
-        before = len(orders)
-        orders = [x for x in orders if x.get("id") != oid]
-        if len(orders) == before:
+        try:
+            deleted = self.store.delete(oid, self._if_match(oid))
+        except VersionConflict as ex:
+            self._precondition_failed(method, ex)
+            return
+        if not deleted:
             self._json(self._err(method, 404, "Order not found"), status_line="404 Not Found")
             return
 
-        db["orders"] = orders
-        self._write_db(db)
-
         self._json(self._ok(method, {"deletedId": oid}, message="Deleted"))
 
+    def handle_batch(self):
+        """
+        POST /order/batch
+          {"operations": [
+              {"op": "create",  "fields": {"title": "A", "price": 10}},
+              {"op": "replace", "id": 3, "fields": {...}},
+              {"op": "patch",   "id": 4, "fields": {"status": "paid"}, "version": 12},
+              {"op": "delete",  "id": 5}
+          ]}
+        Operations run in order against one loaded store and are persisted once.
+        "version" makes replace/patch/delete conditional (412 if the order has changed).
+        Every operation gets its own result: {"index", "op", "status", "item" | "id" | "error"}.
+        """
+        method = "POST"
+        body = self._read_body_json()
+        operations = body.get("operations") if isinstance(body, dict) else body
+        if not isinstance(operations, list) or not operations:
+            self._json(self._err(method, 400, "Bad Request: operations must be a non-empty list"),
+                       status_line="400 Bad Request")
+            return
+        if len(operations) > self.MAX_BATCH:
+            self._json(self._err(method, 413, f"Too many operations (max {self.MAX_BATCH})"),
+                       status_line="413 Payload Too Large")
+            return
+
+        results, valid = [], []
+        for index, raw in enumerate(operations):
+            try:
+                op = self._batch_op(raw)
+            except ValueError as ex:
+                results.append({"index": index, "op": raw.get("op") if isinstance(raw, dict) else None,
+                                "status": 400, "error": str(ex)})
+                continue
+            results.append(None)
+            valid.append((index, op))
+
+        # invalid operations never reach the store
+        applied = self.store.apply_batch([op for _, op in valid]) if valid else []
+        for (index, op), result in zip(valid, applied):
+            results[index] = {"index": index, "op": op["op"], **result}
+        failed = sum(1 for r in results if r["status"] >= 400)
+
+        self._json(self._ok(method, {"results": results, "applied": len(results) - failed, "failed": failed},
+                            message="Batch"))
+
     # =========================
     # LOW-LEVEL HELPERS
     # =========================
-    def _read_db(self):
-        if not os.path.exists(self.db_path):
-            return {"orders": []}
-        with open(self.db_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    def _write_db(self, data):
-        with open(self.db_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
     def _get_id(self):
-        oid = self.request.query_params.get("id")
+        # /order/5 or /order?id=5
+        oid = self.request.route_params.get("id") or self.request.query_params.get("id")
         if oid and str(oid).isdigit():
             return int(oid)
         return None
 
-    def _read_body_json(self):
+    @staticmethod
+    def _poll_slot():
+        """A free long-poll slot, locked (release: with slot), or None when all of them are taken."""
+        while len(_poll_slots) < config.LONG_POLL_WAITERS:
+            _poll_slots.append(FileLock(f"{config.DB_PATH}.poll{len(_poll_slots)}.lock"))
+        for slot in _poll_slots[:config.LONG_POLL_WAITERS]:
+            if slot.try_exclusive():
+                return slot
+        return None
+
+    @staticmethod
+    def _etag(item: dict) -> str:
+        # weak: the same version is sent compact/pretty/compressed
+        return f'W/"order-{item["id"]}-{version_of(item)}"'
+
+    def _not_modified(self, etag: str) -> bool:
+        if_none_match = self.request.headers.get("If-None-Match")
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+    def _if_match(self, oid: int):
+        """If-Match -> set of acceptable versions of order `oid`; None: no condition (or '*')."""
+        if_match = self.request.headers.get("If-Match")
+        if not if_match or if_match.strip() == "*":
+            return None
+        expected = set()
+        for tag in if_match.split(","):
+            tag = tag.strip().removeprefix("W/").strip('"')
+            prefix, _, version = tag.rpartition("-")
+            if prefix == f"order-{oid}" and version.isdigit():
+                expected.add(int(version))
+        return expected
+
+    def _precondition_failed(self, method: str, ex: VersionConflict):
+        self._json(self._err(method, 412, f"Precondition Failed: {ex}"), status_line="412 Precondition Failed",
+                   headers={"ETag": self._etag(ex.item)})
+
+    def _cache_key(self) -> str:
+        # normalized request: id, sorted query (without the rewrite marker), representation
+        query = sorted((k, v or "") for k, v in self.request.query_params.items() if k != "htctrl")
+        return json.dumps([self.request.route_params.get("id"), query,
+                           wants_pretty(self.request), choose_encoding(self.request)])
+
+    def _send_cached(self) -> bool:
+        """
+        Answers from the response cache (200 or 304) if it holds this request for the
+        current data. On a miss remembers where _json_cached() should store the response.
+        The data token is taken before the response is built, so a concurrent write can
+        only make the entry look older than it is, never newer.
+        """
+        self._cache_slot = None
+        if self.cache is None:
+            return False
+        key, token = self._cache_key(), self.store.data_token()
+        entry = self.cache.get(key, token)
+        if entry is None:
+            self._cache_slot = (key, token)
+            return False
+
+        coding, headers, body = entry
+        if self._not_modified(headers["ETag"]):
+            send_status("304 Not Modified", headers)
+            return True
+        send_body(coding, body, headers={**headers, "X-Cache": "HIT"})
+        return True
+
+    def _json_cached(self, obj, headers: dict, items=None):
+        coding, body = render_json(obj, self.request, items)
+        if self._cache_slot is not None:
+            key, token = self._cache_slot
+            self.cache.put(key, token, coding, headers, body)
+        send_body(coding, body, headers={**headers, "X-Cache": "MISS"} if self.cache else headers)
+
+    def _param(self, name: str):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        if "%" not in value and "+" not in value:
+            return value  # nothing to decode: no urllib.parse import (~5 ms) for ?limit=20 & co
+        from urllib.parse import unquote_plus
+        return unquote_plus(value)
+
+    def _list_query(self) -> dict:
+        limit = self._param("limit")
+        limit = int(limit) if limit else self.DEFAULT_LIMIT
+        if not 1 <= limit <= self.MAX_LIMIT:
+            raise ValueError(f"limit must be 1..{self.MAX_LIMIT}")
+
+        sort = self._param("sort") or "id"
+        descending = sort.startswith("-")
+        sort = sort.lstrip("-")
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+
+        fields = self._param("fields")
+        fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        unknown = [f for f in fields or [] if f not in SORT_FIELDS and f != "version"]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+
+        status = self._param("status")
+        min_price, max_price = self._param("min_price"), self._param("max_price")
+        after = self._param("after")
+
+        return {
+            "limit": limit,
+            "sort": sort,
+            "descending": descending,
+            "fields": fields,
+            "statuses": {s.strip() for s in status.split(",")} if status else None,
+            "min_price": float(min_price) if min_price else None,
+            "max_price": float(max_price) if max_price else None,
+            "after": self._parse_cursor(after, sort) if after else None,
+        }
+
+    @staticmethod
+    def _cursor(item: dict, sort: str) -> str:
+        # sort by id: the cursor is just the id; otherwise (value, id) packed in base64url
+        if sort == "id":
+            return str(item["id"])
+        raw = json.dumps([item.get(sort), item["id"]], ensure_ascii=False, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _parse_cursor(cursor: str, sort: str):
+        if sort == "id":
+            if not cursor.isdigit():
+                raise ValueError("after must be an order id")
+            return int(cursor), int(cursor)
         try:
-            length = int(os.environ.get("CONTENT_LENGTH", "0") or "0")
-        except ValueError:
-            length = 0
+            pad = "=" * ((4 - len(cursor) % 4) % 4)
+            value, oid = json.loads(base64.urlsafe_b64decode(cursor + pad))
+            return value, int(oid)
+        except Exception:
+            raise ValueError("after is not a valid cursor")
+
+    def _next_query(self, cursor: str) -> str:
+        params = [(k, v) for k, v in self.request.query_params.items() if k not in ("htctrl", "after")]
+        params.append(("after", cursor))
+        return "&".join(k if v is None else f"{k}={v}" for k, v in params)
+
+    def _batch_op(self, raw) -> dict:
+        # same field rules as the single-order handlers
+        if not isinstance(raw, dict):
+            raise ValueError("operation must be an object")
+        kind = BATCH_OPS.get(str(raw.get("op", "")).lower())
+        if kind is None:
+            raise ValueError("op must be one of: create, replace, patch, delete")
+
+        op = {"op": kind}
+        if kind != "create":
+            oid = raw.get("id")
+            if isinstance(oid, str) and oid.isdigit():
+                oid = int(oid)
+            if not isinstance(oid, int) or isinstance(oid, bool):
+                raise ValueError(f"{kind} requires an integer id")
+            op["id"] = oid
+            if "version" in raw:
+                version = raw["version"]
+                if not isinstance(version, int) or isinstance(version, bool):
+                    raise ValueError("version must be an integer")
+                op["expected"] = {version}
+        if kind != "delete":
+            fields = raw.get("fields", {})
+            if not isinstance(fields, dict):
+                raise ValueError("fields must be an object")
+            if kind == "replace":
+                op["fields"] = {"title": fields.get("title", ""), "price": fields.get("price", 0),
+                                "status": fields.get("status", "new")}
+            else:
+                op["fields"] = {k: fields[k] for k in FIELDS if k in fields}
+        return op
 
-        raw = "" if length == 0 else sys.stdin.read(length)
-        raw = raw.strip()
+    def _read_body_json(self):
+        raw = self.request.read_body().strip()
         if not raw:
             return {}
         try:
@@ -185,21 +524,14 @@ class OrderController:
         except Exception:
             return {"_raw": raw}
 
-    def _ok(self, method: str, data, code=200, message="OK"):
+    def _ok(self, method: str, data, code=200, message="OK", links: dict = None):
         return {
             "status": {"is_ok": True, "code": code, "message": message},
             "meta": {
                 "service": "Order API: REST",
                 "requestMethod": method,
                 "serverTime": time.time(),
-                "links": {
-                    "get_list": "GET /order",
-                    "get_one": "GET /order?id=1",
-                    "post": "POST /order",
-                    "put": "PUT /order?id=1",
-                    "patch": "PATCH /order?id=1",
-                    "delete": "DELETE /order?id=1",
-                }
+                "links": {**LINKS.value, **links} if links else LINKS
             },
             "data": data
         }
@@ -215,9 +547,5 @@ class OrderController:
             "data": None
         }
 
-    def _json(self, obj, status_line: str = None):
-        if status_line:
-            print(f"Status: {status_line}")
-        print("Content-Type: application/json; charset=utf-8")
-        print()
-        print(json.dumps(obj, ensure_ascii=False, indent=2))
+    def _json(self, obj, status_line: str = None, headers: dict = None):
+        send_json(obj, status_line, self.request, headers)
@@ -1,9 +1,11 @@
 from models.request import CgiRequest
 import json
+import os
 import time
-import base64
-import hmac
-import hashlib
+import config
+from jwt_codec import encode_many, get_keyring, JwtError
+from revocation import get_revocation_list
+from responses import send_json
 
 
 class UserController:
@@ -21,9 +23,14 @@ class UserController:
       ?mode=bad_email
       ?mode=email_only
       ?mode=name_only
+
+    POST /user/batch -> many tokens in one response (see handle_batch)
+    POST /user/revoke -> revoke tokens by their jti (see handle_revoke)
+
+    Every token carries a unique "jti" claim.
     """
 
-    SECRET = b"super-secret-key-13"
+    BATCH_MODES = ("", "expired", "nested", "nested_expired")
 
     def __init__(self, request: CgiRequest):
         self.request = request
@@ -60,16 +67,9 @@ class UserController:
         if mode == "expired":
             exp = now - 30
 
-        header = {"alg": "HS256", "typ": "JWT"}
-        payload = {
-            "sub": "296c7f07-ba1a-11f0-83b6-62517600596c",
-            "iss": "Server-KN-P-221",
-            "aud": "admin",
-            "iat": now,
-            "exp": exp,
-            "name": "Default Administrator",
-            "email": "change.me@fake.net",
-        }
+        key = get_keyring().signing_key()
+        header = key.header
+        payload = self._default_payload(now, exp)
 
         # --- internal validation bad cases ---
         if mode == "bad_sub":
@@ -93,7 +93,7 @@ class UserController:
             payload.pop("email", None)
             payload["name"] = "Only Name"
 
-        token = self._jwt_encode(header, payload)
+        token = key.codec.encode(payload, key.header_segment)
 
         response = {
             "status": {"is_ok": True, "code": 200, "message": "OK"},
@@ -109,43 +109,150 @@ class UserController:
         now = int(time.time())
         exp_inner = (now - 30) if expired_inner else (now + 3600)
 
-        header_inner = {"alg": "HS256", "typ": "JWT"}
-        payload_inner = {
+        # both levels are signed with the active key and name it in "kid"
+        key = get_keyring().signing_key()
+        header_inner = key.header
+        payload_inner = self._default_payload(now, exp_inner)
+        inner_token = key.codec.encode(payload_inner, key.header_segment)
+
+        header_outer = key.nested_header
+        outer_token = key.codec.encode(inner_token, key.nested_header_segment)
+
+        return outer_token, inner_token, header_outer, header_inner, payload_inner
+
+    @staticmethod
+    def _default_payload(now: int, exp: int) -> dict:
+        return {
             "sub": "296c7f07-ba1a-11f0-83b6-62517600596c",
             "iss": "Server-KN-P-221",
             "aud": "admin",
             "iat": now,
-            "exp": exp_inner,
+            "exp": exp,
+            "jti": os.urandom(16).hex(),
             "name": "Default Administrator",
             "email": "change.me@fake.net",
         }
-        inner_token = self._jwt_encode(header_inner, payload_inner)
-
-        header_outer = {"alg": "HS256", "typ": "JWT", "cty": "JWT"}
-        outer_token = self._jwt_encode(header_outer, inner_token)
 
-        return outer_token, inner_token, header_outer, header_inner, payload_inner
-
-    def _b64url_encode(self, b: bytes) -> str:
-        return base64.urlsafe_b64encode(b).decode("ascii").rstrip("=")
-
-    def _jwt_encode(self, header: dict, payload):
-        h = self._b64url_encode(json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
-
-        if isinstance(payload, dict):
-            p_bytes = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
-        elif isinstance(payload, str):
-            p_bytes = payload.encode("utf-8")
-        else:
-            p_bytes = str(payload).encode("utf-8")
+    # ---------------- batch minting ----------------
+
+    def handle_batch(self):
+        """
+        POST /user/batch
+          {"count": 1000,
+           "mode": "" | "expired" | "nested" | "nested_expired",
+           "claims": {"aud": "loadtest"},
+           "overrides": ["<sub>", {"sub": "...", "name": "..."}, ...]}
+        Token i gets the default payload of GET /user, then "claims", a jti of its own,
+        then overrides[i] (a string is a subject: {"sub": ...}). count defaults to len(overrides).
+        data.exp is the expiry shared by all tokens; when overrides give them different
+        ones it is left out and data.exps lists the expiry of every token instead.
+        In server mode large batches are signed in a process pool (config.USER_BATCH_*).
+        """
+        method = "POST"
+        try:
+            mode, claims, overrides, count = self._batch_request(self._read_body_json())
+        except ValueError as ex:
+            self._json(self._err(method, 400, f"Bad Request: {ex}"), status_line="400 Bad Request")
+            return
+        if count > config.USER_BATCH_MAX:
+            self._json(self._err(method, 413, f"Too many tokens (max {config.USER_BATCH_MAX})"),
+                       status_line="413 Payload Too Large")
+            return
 
-        p = self._b64url_encode(p_bytes)
+        now = int(time.time())
+        exp = (now - 30) if mode.endswith("expired") else (now + 3600)
+        base = {**self._default_payload(now, exp), **claims}
+        payloads = [{**base, "jti": os.urandom(16).hex(), **(overrides[i] if i < len(overrides) else {})}
+                    for i in range(count)]
+
+        workers = config.USER_BATCH_WORKERS if config.SERVER_MODE else 1
+        key = get_keyring().signing_key()
+        sign = dict(workers=workers, parallel_min=config.USER_BATCH_PARALLEL_MIN, signer=key.codec)
+        tokens = encode_many(payloads, key.header_segment, **sign)
+        header = key.header
+        if mode.startswith("nested"):
+            tokens = encode_many(tokens, key.nested_header_segment, **sign)
+            header = key.nested_header
+
+        exps = [p.get("exp") for p in payloads]
+        expiry = {"exp": exps[0]} if all(e == exps[0] for e in exps) else {"exps": exps}
+        response = {
+            "status": {"is_ok": True, "code": 200, "message": "OK"},
+            "meta": {"service": "User API: authentication", "requestMethod": method, "serverTime": time.time(), "mode": mode},
+            "data": {"count": count, "header": header, "iat": now, **expiry, "tokens": tokens}
+        }
+        self._json(response)
 
-        signing_input = f"{h}.{p}".encode("ascii")
-        sig = hmac.new(self.SECRET, signing_input, hashlib.sha256).digest()
-        s = self._b64url_encode(sig)
+    def handle_revoke(self):
+        """
+        POST /user/revoke
+          {"token": "<jwt>"} or {"tokens": ["<jwt>", ...]}
+        Every valid token is denied by /discount from now on until its exp
+        (nested tokens: the inner jti). Per token: {"index", "status": "revoked", "jti"},
+        {"index", "status": "expired"} (nothing to do) or {"index", "status": "invalid", "error"}.
+        """
+        method = "POST"
+        body = self._read_body_json()
+        tokens = body.get("tokens", [body.get("token")] if "token" in body else None) if isinstance(body, dict) else None
+        if not isinstance(tokens, list) or not tokens or not all(isinstance(t, str) for t in tokens):
+            self._json(self._err(method, 400, "Bad Request: expected token or a non-empty list of tokens"),
+                       status_line="400 Bad Request")
+            return
+        if len(tokens) > config.USER_BATCH_MAX:
+            self._json(self._err(method, 413, f"Too many tokens (max {config.USER_BATCH_MAX})"),
+                       status_line="413 Payload Too Large")
+            return
 
-        return f"{h}.{p}.{s}"
+        keyring, now = get_keyring(), int(time.time())
+        results, entries = [], []
+        for index, token in enumerate(tokens):
+            try:
+                claims = keyring.claims(token.strip())
+            except JwtError as ex:
+                results.append({"index": index, "status": "invalid", "error": str(ex)})
+                continue
+            jti, exp = claims.get("jti"), claims.get("exp")
+            if not isinstance(jti, str) or not jti or not isinstance(exp, int):
+                results.append({"index": index, "status": "invalid", "error": "token has no jti/exp"})
+            elif exp < now:
+                results.append({"index": index, "status": "expired", "jti": jti})
+            else:
+                results.append({"index": index, "status": "revoked", "jti": jti})
+                entries.append((jti, exp))
+
+        if entries:
+            get_revocation_list().revoke(entries)
+        self._json({
+            "status": {"is_ok": True, "code": 200, "message": "OK"},
+            "meta": {"service": "User API: authentication", "requestMethod": method, "serverTime": time.time()},
+            "data": {"revoked": len(entries), "results": results}
+        })
+
+    def _batch_request(self, body):
+        """-> (mode, claims, overrides, count); ValueError with the reason."""
+        if not isinstance(body, dict):
+            raise ValueError("body must be a JSON object")
+        mode = str(body.get("mode") or "").lower()
+        if mode not in self.BATCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(repr(m) for m in self.BATCH_MODES)}")
+
+        claims = body.get("claims") or {}
+        if not isinstance(claims, dict):
+            raise ValueError("claims must be an object")
+
+        overrides = body.get("overrides") or []
+        if not isinstance(overrides, list):
+            raise ValueError("overrides must be a list")
+        overrides = [{"sub": x} if isinstance(x, str) else x for x in overrides]
+        if not all(isinstance(x, dict) for x in overrides):
+            raise ValueError("every override must be a subject string or an object of claims")
+
+        count = body.get("count", len(overrides))
+        if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+            raise ValueError("count must be a positive integer (or give overrides)")
+        if count < len(overrides):
+            raise ValueError(f"count ({count}) is less than the number of overrides ({len(overrides)})")
+        return mode, claims, overrides, count
 
     # ---------------- response helpers ----------------
 
@@ -156,9 +263,14 @@ class UserController:
             "data": None
         }
 
+    def _read_body_json(self):
+        raw = self.request.read_body().strip()
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except Exception:
+            return None
+
     def _json(self, obj, status_line: str = None):
-        if status_line:
-            print(f"Status: {status_line}")
-        print("Content-Type: application/json; charset=utf-8")
-        print()
-        print(json.dumps(obj, ensure_ascii=False, indent=2))
+        send_json(obj, status_line, self.request)
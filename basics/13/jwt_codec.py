@@ -0,0 +1,304 @@
+"""
+HS256 JWT encode/verify shared by UserController and DiscountController.
+
+- the keyed HMAC state (key padding hashed once) is built per secret and copied per token
+- the fixed headers {"alg":"HS256","typ":"JWT"} (+ "cty":"JWT") are encoded once
+- the token alphabet/shape is checked by one compiled regex instead of a per-character loop
+- encode_many() signs big batches in a process pool (each worker has its own prepared codec)
+- KeyRing: keys by "kid" from a local file, reloaded when the file changes; a token
+  is checked against the one key its header names, never key by key
+"""
+import os
+import time
+import json
+import hmac
+import base64
+import hashlib
+import binascii
+from itertools import repeat
+
+import config
+from lazy_re import LazyPattern
+
+# built-in key: signs when there is no key file, verifies tokens without "kid"
+SECRET = b"super-secret-key-13"
+
+HEADER = {"alg": "HS256", "typ": "JWT"}
+NESTED_HEADER = {"alg": "HS256", "typ": "JWT", "cty": "JWT"}
+
+# header.payload.signature, base64url without padding
+_TOKEN_RE = LazyPattern(r"[A-Za-z0-9_-]*\.[A-Za-z0-9_-]*\.[A-Za-z0-9_-]*")
+_INVALID_CHAR_RE = LazyPattern(r"[^A-Za-z0-9_.-]")
+
+
+class JwtError(ValueError):
+    """Token rejected; the message is the reason shown to the client."""
+
+
+def b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(segment: str) -> bytes:
+    """Raises binascii.Error for invalid base64url."""
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _json_bytes(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def header_segment(header: dict) -> str:
+    return b64url_encode(_json_bytes(header))
+
+
+# the fixed headers, encoded once per process
+HEADER_SEGMENT = header_segment(HEADER)
+NESTED_HEADER_SEGMENT = header_segment(NESTED_HEADER)
+
+
+class JwtCodec:
+    """HS256 for one secret."""
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+        self._mac = hmac.new(secret, digestmod=hashlib.sha256)
+
+    def __reduce__(self):
+        # to pool workers by secret: hmac objects do not pickle
+        return JwtCodec, (self.secret,)
+
+    def signature(self, h64: str, p64: str) -> str:
+        mac = self._mac.copy()
+        mac.update(f"{h64}.{p64}".encode("ascii"))
+        return b64url_encode(mac.digest())
+
+    def encode(self, payload, h64: str = HEADER_SEGMENT) -> str:
+        """
+        payload: dict (JSON) or str (nested JWT: the inner token as is).
+        h64: encoded header segment (HEADER_SEGMENT, NESTED_HEADER_SEGMENT or header_segment(...)).
+        """
+        if isinstance(payload, dict):
+            p64 = b64url_encode(_json_bytes(payload))
+        else:
+            p64 = b64url_encode(str(payload).encode("utf-8"))
+        return f"{h64}.{p64}.{self.signature(h64, p64)}"
+
+    def verify(self, token: str):
+        """
+        Shape, alphabet, header, alg and signature in this order (same messages as before).
+        Returns (header dict, h64, p64); the payload is left to the caller (JSON or nested JWT).
+        """
+        header, h64, p64, s64 = parse(token)
+        self.check(h64, p64, s64)
+        return header, h64, p64
+
+    def check(self, h64: str, p64: str, s64: str):
+        if not hmac.compare_digest(self.signature(h64, p64), s64):
+            raise JwtError("signature invalid")
+
+
+def parse(token: str):
+    """Shape, alphabet, header JSON and alg -> (header, h64, p64, s64); the signature is not checked."""
+    if not _TOKEN_RE.fullmatch(token):
+        bad = _INVALID_CHAR_RE.search(token)
+        if bad:
+            raise JwtError(f"token has invalid base64url symbol '{bad.group()}'")
+        raise JwtError("token format invalid (expected 3 parts: header.payload.signature)")
+    h64, p64, s64 = token.split(".")
+
+    try:
+        header_json = b64url_decode(h64).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        raise JwtError("header part is not valid base64url")
+    try:
+        header = json.loads(header_json)
+    except ValueError:
+        raise JwtError("header JSON invalid")
+    if not isinstance(header, dict) or header.get("alg") != "HS256":
+        raise JwtError("unsupported alg (expected HS256)")
+    return header, h64, p64, s64
+
+
+codec = JwtCodec(SECRET)
+
+
+# =========================
+# KEY RING
+# =========================
+class SigningKey:
+    """One key of the ring: the prepared codec and its encoded headers (with "kid" when it has one)."""
+
+    def __init__(self, kid, secret: bytes):
+        self.kid = kid
+        self.codec = codec if secret == SECRET else JwtCodec(secret)
+        kid_field = {"kid": kid} if kid is not None else {}
+        self.header = {**HEADER, **kid_field}
+        self.nested_header = {**NESTED_HEADER, **kid_field}
+        self.header_segment = header_segment(self.header)
+        self.nested_header_segment = header_segment(self.nested_header)
+
+
+LEGACY_KEY = SigningKey(None, SECRET)
+
+
+class KeyRing:
+    """
+    Signing keys by kid, from a JSON file:
+      {"active": "2026-10",
+       "keys": {"2026-10": "new secret", "2026-04": "previous secret"},
+       "legacy": true}
+    New tokens are signed with "active" and carry its kid; any key still listed
+    verifies. Tokens without kid (issued before the ring) verify with the built-in
+    key while "legacy" is true (default). No file: the built-in key only, no kid.
+
+    The file is stat()-ed at most every check_interval seconds and re-read when it
+    changes, so a rotation needs no restart: add the new key, make it active,
+    drop the old one once its tokens have expired. A file that does not parse
+    (caught mid-write) keeps the previous keys until the next check.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.generation = 0     # +1 on every change of the keys
+        self._active = LEGACY_KEY
+        self._keys = {None: LEGACY_KEY}
+        self._signature = None
+        self._checked_at = None
+
+    def refresh(self) -> int:
+        """Reloads the file if it changed; -> generation."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self.generation
+        self._checked_at = now
+
+        try:
+            st = os.stat(self.path)
+            signature = st.st_ino, st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return self.generation
+
+        try:
+            active, keys = self._read() if signature else (LEGACY_KEY, {None: LEGACY_KEY})
+        except (OSError, ValueError):
+            return self.generation
+        self._active, self._keys, self._signature = active, keys, signature
+        self.generation += 1
+        return self.generation
+
+    def signing_key(self) -> SigningKey:
+        self.refresh()
+        return self._active
+
+    def verify(self, token: str):
+        """Like JwtCodec.verify() with the key named by the header's kid: -> (header, h64, p64)."""
+        self.refresh()
+        header, h64, p64, s64 = parse(token)
+        kid = header.get("kid")
+        key = self._keys.get(kid) if kid is None or isinstance(kid, str) else None
+        if key is None:
+            raise JwtError("unknown key id (kid)")
+        key.codec.check(h64, p64, s64)
+        return header, h64, p64
+
+    def claims(self, token: str, max_nesting: int = 3) -> dict:
+        """Verified payload; a nested token (cty=JWT) is unwrapped. exp and claims are not checked."""
+        for _ in range(max_nesting + 1):
+            header, h64, p64 = self.verify(token)
+            try:
+                payload = b64url_decode(p64).decode("utf-8")
+            except (binascii.Error, UnicodeDecodeError):
+                raise JwtError("payload part is not valid base64url")
+            cty = header.get("cty")
+            if not (isinstance(cty, str) and cty.upper() == "JWT"):
+                try:
+                    claims = json.loads(payload)
+                except ValueError:
+                    raise JwtError("payload JSON invalid")
+                if not isinstance(claims, dict):
+                    raise JwtError("payload JSON invalid")
+                return claims
+            token = payload.strip()
+        raise JwtError("nested JWT depth limit exceeded")
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        secrets = data.get("keys") if isinstance(data, dict) else None
+        if not isinstance(secrets, dict) or not all(isinstance(v, str) and v for v in secrets.values()):
+            raise ValueError(f"{self.path}: \"keys\" must map kid -> non-empty secret string")
+        if data.get("active") not in secrets:
+            raise ValueError(f"{self.path}: \"active\" must be one of the keys")
+
+        # unchanged secrets keep their prepared codec
+        known = {(k.kid, k.codec.secret): k for k in self._keys.values()}
+        keys = {}
+        for kid, secret in secrets.items():
+            secret = secret.encode("utf-8")
+            keys[kid] = known.get((kid, secret)) or SigningKey(kid, secret)
+        active = keys[data["active"]]
+        if data.get("legacy", True):
+            keys[None] = LEGACY_KEY
+        return active, keys
+
+
+_keyring = None
+
+
+def get_keyring() -> KeyRing:
+    """One ring per process."""
+    global _keyring
+    if _keyring is None:
+        _keyring = KeyRing(config.JWT_KEYS_PATH, config.JWT_KEYS_CHECK_INTERVAL)
+    return _keyring
+
+
+# =========================
+# BATCH SIGNING
+# =========================
+_pool = None
+_pool_workers = 0
+
+
+def _encode_chunk(signer: JwtCodec, h64: str, payloads: list) -> list:
+    return [signer.encode(p, h64) for p in payloads]
+
+
+def encode_many(payloads: list, h64: str = HEADER_SEGMENT, workers: int = 1, parallel_min: int = 2000,
+                signer: JwtCodec = codec) -> list:
+    """
+    Tokens for all payloads, in order, signed by `signer`.
+    Batches of at least parallel_min payloads are split over `workers` processes;
+    the pool is created on first use and kept for the life of the process
+    (worth it in server mode; a CGI process would pay the pool start-up every time).
+    """
+    if workers <= 1 or len(payloads) < parallel_min:
+        return _encode_chunk(signer, h64, payloads)
+
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        # here, not at the top: multiprocessing + concurrent.futures cost every /user request ~10 ms to import
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # forkserver, not fork: workers must not inherit the server's listening socket,
+        # and they exit with the process that created them; spawn where there is no forkserver (Windows)
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["jwt_codec"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers, mp_context=context), workers
+
+    # a few chunks per worker: a slow worker does not hold up the whole batch
+    step = -(-len(payloads) // (workers * 4))
+    chunks = [payloads[i:i + step] for i in range(0, len(payloads), step)]
+    tokens = []
+    for part in _pool.map(_encode_chunk, repeat(signer), repeat(h64), chunks):
+        tokens.extend(part)
+    return tokens
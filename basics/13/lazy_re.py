@@ -0,0 +1,36 @@
+"""
+Regular expressions compiled on first use.
+
+A CGI process serves one route, so a pattern compiled at import time is compiled
+by every route that imports the module, whether it matches anything or not.
+LazyPattern looks like the compiled pattern (match/fullmatch/search/...); the
+server compiles them all up front in warm_up(). Only the compilation is deferred:
+`re` itself is imported anyway (json.decoder imports it).
+"""
+_patterns = []
+
+
+class LazyPattern:
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+        _patterns.append(self)
+
+    def compile(self):
+        """-> the compiled re.Pattern."""
+        if self._compiled is None:
+            import re
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
+
+    def __getattr__(self, name):
+        # only for what the instance does not have yet: kept, so the next lookup is a plain attribute
+        value = getattr(self.compile(), name)
+        setattr(self, name, value)
+        return value
+
+
+def compile_all():
+    for p in _patterns:
+        p.compile()
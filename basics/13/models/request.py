@@ -1,6 +1,9 @@
+import sys
+
+
 class CgiRequest:
     def __init__(self, server: dict, query_params: dict, headers: dict, path: str,
-                 controller: str, path_parts: list[str]):
+                 controller: str, path_parts: list[str], body_stream=None, route_params: dict = None):
         self.server = server
         self.query_params = query_params
         self.headers = headers
@@ -9,3 +12,24 @@ class CgiRequest:
         self.controller = controller
         # path_parts includes controller at [0], then remaining segments
         self.path_parts = path_parts
+        # named segments from the route pattern: /order/{id} -> {"id": "5"}
+        self.route_params = route_params or {}
+        # CGI: body comes from stdin; server mode passes its own stream
+        self.body_stream = body_stream
+        self._body = None
+
+    def read_body(self) -> str:
+        if self._body is not None:
+            return self._body
+        try:
+            length = int(self.server.get("CONTENT_LENGTH", "0") or "0")
+        except ValueError:
+            length = 0
+
+        if length <= 0:
+            self._body = ""
+        elif self.body_stream is not None:
+            self._body = self.body_stream.read(length).decode("utf-8", errors="replace")
+        else:
+            self._body = sys.stdin.read(length)
+        return self._body
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Prefork supervisor for server.py (POSIX only).
+
+The master binds the listening socket once and forks N workers that all
+accept() on it. Every worker is a normal single-threaded server process,
+so N workers use N cores.
+
+Signals sent to the master:
+    SIGTERM / SIGINT  stop: workers finish the current request and exit
+    SIGHUP            graceful reload: start a fresh set of workers,
+                      then ask the old ones to finish and exit
+Workers that die unexpectedly are restarted.
+"""
+
+import os
+import sys
+import time
+import signal
+import selectors
+import traceback
+
+
+def cpu_count() -> int:
+    # respects taskset/cgroup cpu affinity where the platform supports it
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def parse_workers(value: str) -> int:
+    if value == "auto":
+        return cpu_count()
+    n = int(value)
+    if n < 1:
+        raise ValueError("workers must be >= 1 or 'auto'")
+    return n
+
+
+class PreforkSupervisor:
+    POLL_INTERVAL = 0.2       # master wake-up period (seconds)
+    STOP_TIMEOUT = 10.0       # graceful stop before SIGKILL
+    RESPAWN_BACKOFF = 1.0     # delay when workers keep dying right after start
+
+    def __init__(self, server, workers: int, worker_init=None, log=None):
+        """
+        server      -- bound socketserver instance, shared by every worker
+        worker_init -- called in each worker after fork (import controllers etc.)
+        """
+        self.server = server
+        self.workers = workers
+        self.worker_init = worker_init
+        self.log = log or (lambda msg: print(msg, file=sys.stderr))
+
+        self.children = {}    # pid -> (generation, started_at)
+        self.generation = 0
+        self._stopping = False
+        self._reload = False
+
+    # ---------------- master ----------------
+
+    def run(self):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("prefork workers need os.fork() (POSIX); use --workers 1")
+
+        # accept() must not block a worker that lost the race for a connection
+        self.server.socket.setblocking(False)
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        self.log(f"[master {os.getpid()}] starting {self.workers} workers")
+        self._spawn_generation()
+
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                old = [pid for pid, (gen, _) in self.children.items() if gen == self.generation]
+                self.log(f"[master {os.getpid()}] reload: new workers, retiring {len(old)}")
+                self._spawn_generation()
+                self._signal(old, signal.SIGTERM)
+
+            self._reap()
+            self._respawn()
+            time.sleep(self.POLL_INTERVAL)
+
+        self._shutdown()
+
+    def _spawn_generation(self):
+        self.generation += 1
+        for _ in range(self.workers):
+            self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_main()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (self.generation, time.monotonic())
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            gen, started = self.children.pop(pid, (None, 0.0))
+            if gen == self.generation and not self._stopping:
+                code = os.waitstatus_to_exitcode(status)
+                self.log(f"[master {os.getpid()}] worker {pid} died (exit {code}), restarting")
+                if time.monotonic() - started < self.RESPAWN_BACKOFF:
+                    time.sleep(self.RESPAWN_BACKOFF)
+
+    def _respawn(self):
+        alive = sum(1 for gen, _ in self.children.values() if gen == self.generation)
+        for _ in range(self.workers - alive):
+            self._spawn()
+
+    def _shutdown(self):
+        self.log(f"[master {os.getpid()}] stopping workers")
+        self._signal(list(self.children), signal.SIGTERM)
+        deadline = time.monotonic() + self.STOP_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(self.POLL_INTERVAL)
+        self._signal(list(self.children), signal.SIGKILL)
+        self._reap()
+        self.server.server_close()
+
+    def _signal(self, pids, sig):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    # ---------------- worker ----------------
+
+    def _worker_main(self):
+        running = True
+
+        def stop(signum, frame):
+            nonlocal running
+            running = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the master, it sends SIGTERM
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        if self.worker_init:
+            self.worker_init()
+
+        # wait with a timeout so SIGTERM is noticed quickly; the listening socket
+        # is non-blocking, so handle_request() returns at once if another worker won accept()
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.server, selectors.EVENT_READ)
+            while running:
+                if selector.select(self.POLL_INTERVAL * 5):
+                    self.server.handle_request()
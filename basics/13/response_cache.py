@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+import config
+
+
+class ResponseCache:
+    """
+    Encoded response bodies (already compressed for the negotiated coding).
+
+    Every entry carries the store's data token (OrderStore.data_token()) of the
+    moment it was rendered; a lookup with a different token is a miss, so any
+    write - from this or another process - invalidates the cached responses.
+
+    Two levels:
+      memory     LRU of `size` entries, per process
+      directory  one file per key, shared by all workers and CGI processes;
+                 at most `size` files, the least recently used are removed
+    """
+
+    def __init__(self, size: int, directory: str = None, namespace: str = ""):
+        self.size = size
+        self.directory = directory
+        self.namespace = namespace
+        self._memory = OrderedDict()  # key -> (token, coding, headers, body)
+        if directory and not self._private_dir(directory):
+            self.directory = None
+
+    def get(self, key: str, token: str):
+        """-> (coding, headers, body) or None."""
+        entry = self._memory.get(key)
+        if (entry is None or entry[0] != token) and self.directory:
+            # another process may already have rendered the current data
+            entry = self._read_file(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or entry[0] != token:
+            return None
+        self._memory.move_to_end(key)
+        return entry[1:]
+
+    def put(self, key: str, token: str, coding, headers: dict, body: bytes):
+        entry = (token, coding, headers, body)
+        self._remember(key, entry)
+        if self.directory:
+            self._write_file(key, entry)
+
+    # =========================
+    # LOW-LEVEL HELPERS
+    # =========================
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _private_dir(directory: str) -> bool:
+        """
+        Creates the directory (0700) if needed. Entries are served as they are, so a
+        directory that someone else owns or can write to must not be trusted.
+        """
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            st = os.stat(directory)
+        except OSError:
+            return False
+        if os.name == "nt":
+            return True
+        return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(f"{self.namespace}\n{key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".cache")
+
+    def _read_file(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime = last use, for eviction
+        except OSError:
+            return None
+        head, sep, body = data.partition(b"\n")
+        try:
+            meta = json.loads(head)
+        except ValueError:
+            return None
+        if not sep or meta.get("key") != key:
+            return None  # torn or foreign file
+        return meta["token"], meta["coding"], meta["headers"], body
+
+    def _write_file(self, key: str, entry):
+        token, coding, headers, body = entry
+        head = json.dumps({"key": key, "token": token, "coding": coding, "headers": headers}, ensure_ascii=False)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(head.encode("utf-8") + b"\n" + body)
+            os.replace(tmp, path)
+            self._evict_files()
+        except OSError:
+            pass  # the cache is an optimization: a full or read-only disk only costs hits
+
+    def _evict_files(self):
+        with os.scandir(self.directory) as it:
+            files = [e for e in it if e.name.endswith(".cache")]
+        if len(files) <= self.size:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime_ns)
+        for e in files[:len(files) - self.size]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """One cache per process; None when RESPONSE_CACHE_SIZE is 0."""
+    global _response_cache
+    if _response_cache is None and config.RESPONSE_CACHE_SIZE > 0:
+        # separate keys for every backend/database sharing the directory
+        db = config.SQLITE_PATH if config.ORDER_STORE == "sqlite" else config.DB_PATH
+        _response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_DIR or None,
+                                        namespace=f"{config.ORDER_STORE}:{os.path.abspath(db)}")
+    return _response_cache
@@ -0,0 +1,203 @@
+import sys
+import json
+import zlib
+
+import config
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# smaller bodies are sent as is: compression would cost more than it saves
+MIN_COMPRESS_SIZE = 1024
+STREAM_CHUNK = 16 * 1024
+
+# placeholder for the streamed list inside the envelope
+_ITEMS_MARK = "\u0000items\u0000"
+
+_compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class Fragment:
+    """Constant JSON value (e.g. meta.links) encoded once per process, spliced into every response."""
+    __slots__ = ("value", "text")
+
+    def __init__(self, value):
+        self.value = value
+        self.text = _compact_encoder.encode(value)
+
+
+def _fragment_value(obj):
+    if isinstance(obj, Fragment):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode(obj, pretty: bool = False) -> str:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_fragment_value)
+    return _encode_compact(obj, 2)
+
+
+def _encode_compact(obj, depth: int) -> str:
+    # walks only the envelope levels (status/meta/data); deeper values go to the C encoder
+    if isinstance(obj, Fragment):
+        return obj.text
+    if depth and isinstance(obj, dict):
+        return "{" + ",".join(_compact_encoder.encode(str(k)) + ":" + _encode_compact(v, depth - 1)
+                              for k, v in obj.items()) + "}"
+    return _compact_encoder.encode(obj)
+
+
+def wants_pretty(request) -> bool:
+    if config.DEV_MODE:
+        return True
+    return request is not None and request.query_params.get("pretty") in ("1", "true")
+
+
+def accepts(accept_encoding: str, coding: str) -> bool:
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def choose_encoding(request):
+    if request is None:
+        return None
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    if brotli is not None and accepts(accept_encoding, "br"):
+        return "br"
+    if accepts(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+def _compressor(coding):
+    if coding == "br":
+        c = brotli.Compressor(quality=4)
+        return c.process, c.finish
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    return c.compress, c.flush
+
+
+def _write_head(status_line, coding, headers=None):
+    if status_line:
+        print(f"Status: {status_line}")
+    print("Content-Type: application/json; charset=utf-8")
+    print("Vary: Accept-Encoding")
+    if coding:
+        print(f"Content-Encoding: {coding}")
+    for name, value in (headers or {}).items():
+        print(f"{name}: {value}")
+    print()
+    sys.stdout.flush()
+
+
+def send_status(status_line: str, headers: dict = None):
+    """Response without a body, e.g. 304 Not Modified (headers: ETag, ...)."""
+    print(f"Status: {status_line}")
+    for name, value in (headers or {}).items():
+        print(f"{name}: {value}")
+    print()
+    sys.stdout.flush()
+
+
+def send_json(obj, status_line: str = None, request=None, headers: dict = None):
+    """
+    Shared JSON response for all API controllers.
+    Compact by default; indented with ?pretty=1 or DEV_MODE.
+    gzip/br (Accept-Encoding) for bodies of MIN_COMPRESS_SIZE bytes and more.
+    """
+    coding, body = render_json(obj, request)
+    send_body(coding, body, status_line, headers)
+
+
+def render_json(obj, request=None, items=None):
+    """
+    Encoded (and possibly compressed) body as send_json() would write it -> (coding, bytes).
+    With `items`, items_placeholder() inside obj is replaced by that list (see iter_json).
+    """
+    pretty = wants_pretty(request)
+    text = "".join(iter_json(obj, items, pretty)) if items is not None else encode(obj, pretty)
+    body = (text + "\n").encode("utf-8")
+
+    coding = choose_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else None
+    if coding:
+        compress, finish = _compressor(coding)
+        body = compress(body) + finish()
+    return coding, body
+
+
+def send_body(coding, body: bytes, status_line: str = None, headers: dict = None):
+    """Writes a body produced by render_json() (e.g. taken from the response cache)."""
+    _write_head(status_line, coding, headers)
+    sys.stdout.buffer.write(body)
+
+
+def iter_json(obj, items, pretty: bool = True):
+    """
+    Yields the JSON text of `obj` piece by piece; items_placeholder() inside obj
+    is replaced by the list of `items`, encoded one item at a time.
+    Output is identical to encode(obj_with_list, pretty).
+    """
+    envelope = encode(obj, pretty)
+    head, tail = envelope.split(json.dumps(_ITEMS_MARK), 1)
+
+    if not pretty:
+        yield head + "["
+        sep = ""
+        for item in items:
+            yield sep + _compact_encoder.encode(item)
+            sep = ","
+        yield "]" + tail
+        return
+
+    line_start = head.rfind("\n") + 1
+    outer = " " * (len(head) - line_start - len(head[line_start:].lstrip(" ")))
+    inner = outer + "  "
+
+    yield head + "["
+    sep = "\n"
+    empty = True
+    for item in items:
+        text = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n" + inner)
+        yield sep + inner + text
+        sep = ",\n"
+        empty = False
+    yield ("]" if empty else "\n" + outer + "]") + tail
+
+
+def items_placeholder():
+    return _ITEMS_MARK
+
+
+def send_json_stream(obj, items, status_line: str = None, request=None, headers: dict = None):
+    """
+    Writes a JSON response whose big list (items_placeholder() inside obj) is
+    encoded lazily, in STREAM_CHUNK pieces (compressed on the fly if accepted).
+    In server mode the pieces go out as HTTP chunks while the rest is still encoded.
+    """
+    coding = choose_encoding(request)
+    _write_head(status_line, coding, headers)
+
+    start_streaming = getattr(sys.stdout.buffer, "start_streaming", None)
+    if start_streaming is not None:
+        start_streaming()
+
+    out = sys.stdout.buffer
+    compress, finish = _compressor(coding) if coding else (None, None)
+    pending, size = [], 0
+    for piece in iter_json(obj, items, wants_pretty(request)):
+        pending.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK:
+            data = "".join(pending).encode("utf-8")
+            out.write(compress(data) if compress else data)
+            pending, size = [], 0
+
+    pending.append("\n")
+    data = "".join(pending).encode("utf-8")
+    out.write(compress(data) + finish() if compress else data)
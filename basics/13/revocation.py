@@ -0,0 +1,186 @@
+import os
+import math
+import time
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    jti TEXT NOT NULL UNIQUE,
+    exp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revoked_exp ON revoked(exp);
+"""
+
+SQL_INSERT = "INSERT OR IGNORE INTO revoked (jti, exp) VALUES (?, ?)"
+SQL_PRUNE = "DELETE FROM revoked WHERE exp < ?"
+SQL_EXISTS = "SELECT 1 FROM revoked WHERE jti = ?"
+SQL_SINCE = "SELECT seq, jti FROM revoked WHERE seq > ? ORDER BY seq"
+SQL_COUNT = "SELECT COUNT(*) FROM revoked"
+
+
+class BloomFilter:
+    """
+    Set membership with false positives only: `x in bloom` is False for everything never added.
+    m bits and k probes sized for `capacity` items at `error_rate`, double hashing (h1 + i*h2).
+    The filter never leaves the process, so the built-in str hash (randomized per
+    process, cached on the string object) is good enough and costs nothing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.m = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def add(self, key: str):
+        bits, m = self.bits, self.m
+        h1, h2 = hash(key), hash((key, m)) | 1
+        for i in range(self.k):
+            p = (h1 + i * h2) % m
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # a key that was never added usually fails on the first probe
+        bits, m = self.bits, self.m
+        h1 = hash(key)
+        p = h1 % m
+        if not bits[p >> 3] >> (p & 7) & 1:
+            return False
+        h2 = hash((key, m)) | 1
+        for i in range(1, self.k):
+            p = (h1 + i * h2) % m
+            if not bits[p >> 3] >> (p & 7) & 1:
+                return False
+        return True
+
+
+class RevocationList:
+    """
+    Revoked token ids (jti) until their exp, in SQLite (the exact set, shared by all processes).
+
+    A long-lived process (bloom=True) keeps a Bloom filter of every revoked jti and asks
+    SQLite only when the filter says "maybe": for the tokens in use - never revoked -
+    the check is a few hashes in memory whatever the size of the list. Rows added by
+    other processes are picked up by seq every check_interval seconds; the filter is
+    rebuilt when it outgrows its capacity (expired rows are dropped on the way).
+    One-shot CGI processes (bloom=False) do not load the list: one indexed lookup,
+    and none at all while nothing has ever been revoked (no file).
+    Lookups go through a read-only connection; only revoke() opens the database for
+    writing and creates the schema.
+    """
+
+    def __init__(self, path: str, bloom: bool = False, capacity: int = 100000, check_interval: float = 1.0):
+        self.path = path
+        self.use_bloom = bloom
+        self.capacity = capacity
+        self.check_interval = check_interval
+        self._conn = None
+        self._reader = None
+        self._bloom = None
+        self._seen_seq = 0
+        self._checked_at = None
+
+    @property
+    def conn(self):
+        """Read-write connection (revoke()); creates the file and the schema."""
+        if self._conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @property
+    def reader(self):
+        """Read-only connection for lookups: never writes, so no schema script per request."""
+        if self._reader is None:
+            import sqlite3  # ~5 ms: not imported while nothing has been revoked (CGI)
+            # the path goes into a URI: only these characters have a meaning there
+            path = os.path.abspath(self.path).replace("%", "%25").replace("?", "%3f").replace("#", "%23")
+            self._reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10, isolation_level=None)
+        return self._reader
+
+    def is_revoked(self, jti: str) -> bool:
+        if not self.use_bloom:
+            return os.path.exists(self.path) and bool(self._query(SQL_EXISTS, (jti,)))
+        self._refresh()
+        if jti not in self._bloom:
+            return False
+        return bool(self._query(SQL_EXISTS, (jti,)))
+
+    def revoke(self, entries) -> int:
+        """entries: (jti, exp) pairs; -> how many were not revoked yet. Expired rows are pruned."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(SQL_INSERT, entries)
+            added = conn.total_changes - before
+            conn.execute(SQL_PRUNE, (int(time.time()),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if self._bloom is not None:
+            self._checked_at = None  # pick the new rows up on the next check
+        return added
+
+    # =========================
+    # LOW-LEVEL HELPERS
+    # =========================
+    def _refresh(self):
+        now = time.monotonic()
+        if self._bloom is not None and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        if not os.path.exists(self.path):
+            if self._bloom is None:
+                self._bloom = BloomFilter(self.capacity)
+            return
+        if self._bloom is None:
+            self._rebuild()  # sized for what is already there
+            return
+        for seq, jti in self._query(SQL_SINCE, (self._seen_seq,)):
+            self._bloom.add(jti)
+            self._seen_seq = seq
+        if self._bloom.count > self._bloom.capacity:
+            self._rebuild()
+
+    def _rebuild(self):
+        rows = self._query(SQL_COUNT)
+        self.capacity = max(self.capacity, 2 * (rows[0][0] if rows else 0))
+        self._bloom = BloomFilter(self.capacity)
+        self._seen_seq = 0
+        for seq, jti in self._query(SQL_SINCE, (0,)):
+            self._bloom.add(jti)
+            self._seen_seq = seq
+
+    def _query(self, sql: str, args=()) -> list:
+        """Rows of a lookup; none while the first revoke() has created the file but not the table yet."""
+        import sqlite3
+        try:
+            return self.reader.execute(sql, args).fetchall()
+        except sqlite3.OperationalError as ex:
+            if "no such table" in str(ex):
+                return []
+            raise
+
+
+_revocations = None
+
+
+def get_revocation_list() -> RevocationList:
+    """One list per process; the Bloom filter only in server mode."""
+    global _revocations
+    if _revocations is None:
+        _revocations = RevocationList(config.REVOKED_PATH, bloom=config.SERVER_MODE,
+                                      capacity=config.REVOKED_BLOOM_CAPACITY,
+                                      check_interval=config.REVOKED_CHECK_INTERVAL)
+    return _revocations
@@ -0,0 +1,118 @@
+import importlib
+
+
+class RouteError(Exception):
+    """Broken route table (bad pattern, duplicate, missing controller/action)."""
+
+
+class Route:
+    def __init__(self, method: str, pattern: str, controller: str, action: str):
+        self.method = method
+        self.pattern = pattern
+        self.controller = controller    # "order" -> controllers.order_controller.OrderController
+        self.action = action
+        self._controller_class = None
+
+    def resolve(self):
+        """Imports the controller once and checks the action; returns the controller class."""
+        if self._controller_class is None:
+            module_name = self.controller.lower() + "_controller"
+            class_name = self.controller.capitalize() + "Controller"
+            try:
+                module = importlib.import_module(f"controllers.{module_name}")
+            except Exception as ex:
+                raise RouteError(f"{self}: controller module controllers.{module_name} not importable: {ex}")
+            controller_class = getattr(module, class_name, None)
+            if controller_class is None:
+                raise RouteError(f"{self}: class {class_name} not found in {module_name}")
+            if not callable(getattr(controller_class, self.action, None)):
+                raise RouteError(f"{self}: {class_name} has no action '{self.action}'")
+            self._controller_class = controller_class
+        return self._controller_class
+
+    def __repr__(self):
+        return f"{self.method} {self.pattern} -> {self.controller}.{self.action}"
+
+
+class _Node:
+    __slots__ = ("literal", "param_name", "param", "routes")
+
+    def __init__(self):
+        self.literal = {}       # segment -> _Node
+        self.param_name = None  # "{id}" -> "id"
+        self.param = None       # _Node for any segment
+        self.routes = {}        # method ("GET", ..., "*") -> Route
+
+
+class Router:
+    """
+    Route table built once per process.
+    Patterns are '/order' or '/order/{id}'; lookup walks one dict per path segment.
+    Method "*" is a fallback for a path: the controller checks the method itself.
+    Literal segments are matched case-insensitively (/Order == /order).
+    """
+
+    def __init__(self, routes=()):
+        self.root = _Node()
+        self.routes = []
+        for method, pattern, controller, action in routes:
+            self.add(method, pattern, controller, action)
+
+    @staticmethod
+    def _segments(path: str) -> list:
+        return [s for s in path.split("/") if s]
+
+    def add(self, method: str, pattern: str, controller: str, action: str):
+        if not pattern.startswith("/"):
+            raise RouteError(f"pattern must start with '/': {pattern!r}")
+        method = method.upper()
+        node = self.root
+        for seg in self._segments(pattern):
+            if seg.startswith("{") or seg.endswith("}"):
+                name = seg[1:-1]
+                if not (seg.startswith("{") and seg.endswith("}") and name.isidentifier()):
+                    raise RouteError(f"bad path parameter {seg!r} in {pattern!r}")
+                if node.param is None:
+                    node.param, node.param_name = _Node(), name
+                elif node.param_name != name:
+                    raise RouteError(f"conflicting parameter names {{{node.param_name}}} and {seg} in {pattern!r}")
+                node = node.param
+            else:
+                node = node.literal.setdefault(seg.lower(), _Node())
+
+        if method in node.routes:
+            raise RouteError(f"duplicate route: {method} {pattern}")
+        route = Route(method, pattern, controller, action)
+        node.routes[method] = route
+        self.routes.append(route)
+        return route
+
+    def match(self, method: str, path: str):
+        """
+        Returns (route, params, allowed_methods):
+          route found           -> (Route, {"id": "5"}, None)
+          path known, no method -> (None, None, ["GET", ...])   # 405
+          unknown path          -> (None, None, None)           # 404
+        """
+        node = self.root
+        params = {}
+        for seg in self._segments(path):
+            nxt = node.literal.get(seg.lower())
+            if nxt is None:
+                if node.param is None:
+                    return None, None, None
+                params[node.param_name] = seg
+                nxt = node.param
+            node = nxt
+
+        if not node.routes:
+            return None, None, None
+        route = node.routes.get(method.upper()) or node.routes.get("*")
+        if route is None:
+            return None, None, sorted(node.routes)
+        return route, params, None
+
+    def preload(self):
+        """Resolves every route (imports controllers, checks actions): typos fail at startup."""
+        for route in self.routes:
+            route.resolve()
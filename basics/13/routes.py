@@ -0,0 +1,36 @@
+# Route table: (method, path pattern, controller, action)
+# controller "order" -> controllers/order_controller.py, class OrderController
+# method "*" -> any other method goes to the action, which answers 405 itself
+
+ROUTES = [
+    # ---- Order API: REST ----
+    ("GET",    "/order",          "order", "handle_get"),
+    ("GET",    "/order/{id}",     "order", "handle_get"),
+    ("GET",    "/order/changes",  "order", "handle_changes"),
+    ("GET",    "/order/stats",    "order", "handle_stats"),
+    ("POST",   "/order",          "order", "handle_post"),
+    ("PUT",    "/order",          "order", "handle_put"),
+    ("PUT",    "/order/{id}",     "order", "handle_put"),
+    ("PATCH",  "/order",          "order", "handle_patch"),
+    ("PATCH",  "/order/{id}",     "order", "handle_patch"),
+    ("DELETE", "/order",          "order", "handle_delete"),
+    ("DELETE", "/order/{id}",     "order", "handle_delete"),
+    ("POST",   "/order/batch",    "order", "handle_batch"),
+    ("*",      "/order",          "order", "serve"),
+    ("*",      "/order/{id}",     "order", "serve"),
+
+    # ---- JWT ----
+    ("*",      "/user",           "user", "serve"),
+    ("POST",   "/user/batch",     "user", "handle_batch"),
+    ("POST",   "/user/revoke",    "user", "handle_revoke"),
+    ("*",      "/discount",       "discount", "serve"),
+    ("POST",   "/discount/quote", "discount", "handle_quote"),
+
+    # ---- test pages ----
+    ("GET",    "/usertest",       "usertest", "index"),
+    ("GET",    "/usertest/index", "usertest", "index"),
+    ("GET",    "/ordertest",      "ordertest", "index"),
+    ("GET",    "/ordertest/index", "ordertest", "index"),
+    ("GET",    "/resttest",       "resttest", "index"),
+    ("GET",    "/resttest/index", "resttest", "index"),
+]
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent server mode for access_manager.
+
+Apache CGI starts a new interpreter for every hit. Here one warm process
+imports models/controllers once and runs access_manager.handle_request()
+for every request, so routing, htctrl/BASE_PREFIX and CgiRequest stay the same.
+
+    python server.py --host 127.0.0.1 --port 8013
+    python server.py --workers auto        # prefork, one worker per CPU (POSIX)
+
+WSGI servers (mod_wsgi, gunicorn, ...) can use `application` from this module.
+"""
+
+import io
+import os
+import sys
+import argparse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# views/static are opened by relative paths (like under Apache CGI)
+os.chdir(BASE_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import config
+import access_manager
+import lazy_re
+import prefork
+
+config.SERVER_MODE = True
+
+
+def rewrite_query(query_string: str) -> str:
+    # same as .htaccess: RewriteRule .* access_manager.py?htctrl=1 [L,QSA]
+    return "htctrl=1&" + query_string if query_string else "htctrl=1"
+
+
+def parse_cgi_output(raw: bytes):
+    """Splits CGI output into (status, [(name, value)], body)."""
+    sep = raw.find(b"\n\n")
+    sep_len = 2
+    crlf = raw.find(b"\r\n\r\n")
+    if crlf != -1 and (sep == -1 or crlf < sep):
+        sep, sep_len = crlf, 4
+    if sep == -1:
+        return "500 Internal Server Error", [("Content-Type", "text/plain; charset=utf-8")], b"Malformed CGI response"
+
+    status = "200 OK"
+    headers = []
+    for line in raw[:sep].decode("latin-1").splitlines():
+        if ":" not in line:
+            continue
+        name, value = line.split(":", 1)
+        name, value = name.strip(), value.strip()
+        if name.lower() == "status":
+            status = value
+        else:
+            headers.append((name, value))
+    return status, headers, raw[sep + sep_len:]
+
+
+class CgiOutput(io.BytesIO):
+    """
+    Captured stdout of one request.
+    Static files hand over a file segment instead of bytes; big responses may
+    switch to streaming, after which writes go straight to the client.
+    """
+
+    def __init__(self, on_stream=None):
+        super().__init__()
+        self.file_segment = None  # (fd, offset, count), sent with os.sendfile()
+        self.on_stream = on_stream  # (status, headers) -> write(bytes); None: no streaming
+        self.stream_write = None
+
+    def sendfile(self, f, offset: int, count: int):
+        self.file_segment = (os.dup(f.fileno()), offset, count)
+
+    def start_streaming(self) -> bool:
+        """Called after the header block is complete; sends it and keeps the body open."""
+        if self.on_stream is None or self.stream_write is not None:
+            return False
+        status, headers, body = parse_cgi_output(self.getvalue())
+        self.stream_write = self.on_stream(status, headers)
+        self.seek(0)
+        self.truncate()
+        if body:
+            self.stream_write(body)
+        return True
+
+    def write(self, b):
+        if self.stream_write is not None:
+            if b:
+                self.stream_write(bytes(b))
+            return len(b)
+        return super().write(b)
+
+
+def run_cgi(environ: dict, body_stream=None, on_stream=None):
+    """
+    Runs access_manager in-process with stdout captured.
+    Returns (status, headers, body, file_segment); the caller closes file_segment's fd.
+    If the response was streamed through on_stream, status is None.
+    """
+    out = CgiOutput(on_stream)
+    saved_stdout = sys.stdout
+    sys.stdout = io.TextIOWrapper(out, encoding="utf-8", newline="\n")
+    try:
+        access_manager.handle_request(environ, body_stream)
+        sys.stdout.flush()
+        raw = out.getvalue()
+    except Exception as ex:
+        msg = "Request processing error:\n" + (str(ex) if access_manager.DEV_MODE else "Internal error")
+        raw = ("Status: 500 Internal Server Error\nContent-Type: text/plain; charset=utf-8\n\n" + msg).encode("utf-8")
+        if out.file_segment:
+            os.close(out.file_segment[0])
+            out.file_segment = None
+    finally:
+        sys.stdout = saved_stdout
+    if out.stream_write is not None:
+        return None, [], b"", None
+    return parse_cgi_output(raw) + (out.file_segment,)
+
+
+def needs_length(status: str, headers: list) -> bool:
+    return not status.startswith(("304", "204")) and not any(k.lower() == "content-length" for k, _ in headers)
+
+
+def read_segment(file_segment) -> bytes:
+    fd, offset, count = file_segment
+    try:
+        return os.pread(fd, count, offset)
+    finally:
+        os.close(fd)
+
+
+def warm_up():
+    """Imports every routed controller once; a broken route table fails here, not mid-request."""
+    access_manager.router.preload()
+    # long-lived process: compile the lazy patterns before the first request instead of during it
+    lazy_re.compile_all()
+
+
+# ---------------- WSGI ----------------
+
+def application(environ, start_response):
+    uri = quote(environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", ""))
+    query_string = environ.get("QUERY_STRING", "")
+    cgi_env = {k: v for k, v in environ.items() if k.startswith("HTTP_")}
+    cgi_env.update({
+        "REQUEST_METHOD": environ.get("REQUEST_METHOD", "GET"),
+        "REQUEST_URI": uri + ("?" + query_string if query_string else ""),
+        "QUERY_STRING": rewrite_query(query_string),
+        "CONTENT_LENGTH": environ.get("CONTENT_LENGTH", ""),
+    })
+
+    status, headers, body, file_segment = run_cgi(cgi_env, environ.get("wsgi.input"))
+    if file_segment:
+        body = read_segment(file_segment)
+    if needs_length(status, headers):
+        headers.append(("Content-Length", str(len(body))))
+    start_response(status, headers)
+    return [body]
+
+
+# ---------------- built-in HTTP server ----------------
+
+class BodyReader:
+    """
+    The request body and nothing more: reads stop at Content-Length, so a controller
+    cannot read into the next request on a keep-alive connection.
+    """
+
+    # an unread rest bigger than this is not worth reading: the connection is closed instead
+    MAX_DRAIN = 1024 * 1024
+
+    def __init__(self, stream, length: int):
+        self.stream = stream
+        self.remaining = length
+        self.broken = False  # the client stopped sending before the end of the body
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size == 0:
+            return b""
+        try:
+            data = self.stream.read(size)
+        except OSError:
+            data = b""
+        if len(data) < size:
+            # a partial body must not pass for the whole one (e.g. "{}" cut to "{")
+            self.remaining, self.broken = 0, True
+            raise ConnectionError("client closed the connection before the end of the body")
+        self.remaining -= size
+        return data
+
+    def drain(self) -> bool:
+        """Skips what the controller did not read; False when the connection cannot be reused."""
+        if self.remaining > self.MAX_DRAIN:
+            return False
+        try:
+            while self.remaining:
+                self.read(min(self.remaining, 64 * 1024))
+        except ConnectionError:
+            pass
+        return not self.broken
+
+
+def content_length(headers):
+    """Content-Length as int (0 when absent); None when it is invalid or ambiguous."""
+    values = set(v.strip() for v in headers.get_all("Content-Length") or [])
+    if not values:
+        return 0
+    if len(values) != 1:
+        return None
+    value = values.pop()
+    return int(value) if value.isdigit() else None
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: responses carry Content-Length or are chunked
+    timeout = 5                    # idle keep-alive connections release the worker
+    # headers and body leave in separate writes: with Nagle the body waits for the
+    # client's delayed ACK (~40 ms per keep-alive request)
+    disable_nagle_algorithm = True
+    quiet = False
+
+    def handle_any(self):
+        # the next request starts where this body ends: without a reliable length
+        # the connection cannot be reused (request smuggling), so it is refused
+        if "Transfer-Encoding" in self.headers:
+            self.send_error(411, "Length Required", "Transfer-Encoding is not supported, send Content-Length")
+            return
+        length = content_length(self.headers)
+        if length is None:
+            self.send_error(400, "Bad Request", "Invalid Content-Length")
+            return
+        body_stream = BodyReader(self.rfile, length)
+
+        query_string = self.path.split("?", 1)[1] if "?" in self.path else ""
+        environ = {"HTTP_" + k.upper().replace("-", "_"): v for k, v in self.headers.items()}
+        environ.update({
+            "REQUEST_METHOD": self.command,
+            "REQUEST_URI": self.path,
+            "QUERY_STRING": rewrite_query(query_string),
+            "CONTENT_LENGTH": str(length),
+        })
+
+        self.chunked = False
+        try:
+            status, headers, body, file_segment = run_cgi(environ, body_stream, self.start_stream)
+        finally:
+            if not body_stream.drain():
+                self.close_connection = True
+        if status is None:
+            self.end_stream()
+            return
+
+        self.send_head(status, headers)
+        if needs_length(status, headers):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        if file_segment:
+            self.send_segment(file_segment)
+
+    def send_head(self, status: str, headers: list):
+        code, _, phrase = status.partition(" ")
+        self.send_response(int(code), phrase or None)
+        for name, value in headers:
+            self.send_header(name, value)
+
+    def start_stream(self, status: str, headers: list):
+        """Headers now, body as it is produced: chunked for HTTP/1.1, until close for 1.0."""
+        self.send_head(status, headers)
+        if self.request_version == "HTTP/1.1":
+            self.chunked = True
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
+            self.send_header("Connection", "close")
+        self.end_headers()
+        return self.write_chunk
+
+    def write_chunk(self, data: bytes):
+        if self.command == "HEAD":
+            return
+        if self.chunked:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def end_stream(self):
+        if self.chunked and self.command != "HEAD":
+            self.wfile.write(b"0\r\n\r\n")
+
+    def send_segment(self, file_segment):
+        fd, offset, count = file_segment
+        try:
+            self.wfile.flush()
+            if not hasattr(os, "sendfile"):
+                self.wfile.write(os.pread(fd, count, offset))
+                return
+            # zero-copy: the kernel moves file pages straight into the socket
+            while count > 0:
+                sent = os.sendfile(self.connection.fileno(), fd, offset, count)
+                if sent == 0:
+                    break
+                offset += sent
+                count -= sent
+        finally:
+            os.close(fd)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = handle_any
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+class Server(HTTPServer):
+    def get_request(self):
+        conn, addr = super().get_request()
+        # the listening socket is non-blocking under prefork; connections are not
+        conn.setblocking(True)
+        return conn, addr
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Persistent HTTP server for basics/13")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8013)
+    parser.add_argument("--workers", default="1", help="number of worker processes or 'auto' (one per CPU)")
+    parser.add_argument("--quiet", action="store_true", help="disable per-request access log")
+    args = parser.parse_args(argv)
+
+    RequestHandler.quiet = args.quiet
+    workers = prefork.parse_workers(args.workers)
+    config.LONG_POLL = workers > 1
+    config.LONG_POLL_WAITERS = workers // 2
+
+    # each process is single-threaded on purpose: controllers write to the process-wide sys.stdout
+    httpd = Server((args.host, args.port), RequestHandler)
+    print(f"Serving on http://{args.host}:{args.port}{access_manager.BASE_PREFIX}/ ({workers} worker(s))",
+          file=sys.stderr)
+
+    if workers > 1:
+        # controllers are imported after fork, so SIGHUP reload picks up new code
+        prefork.PreforkSupervisor(httpd, workers, worker_init=warm_up).run()
+        return
+
+    warm_up()
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import stat
+import time
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "css": "text/css",
+    "js": "text/javascript",
+    "ico": "image/x-icon",
+}
+
+# precompressed siblings: site.js.br / site.js.gz (made at deploy time)
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+CACHE_CONTROL = "public, max-age=300"
+COPY_CHUNK = 64 * 1024
+
+_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def is_static(path: str) -> bool:
+    return not path.endswith("/") and "." in path and path.rsplit(".", 1)[-1].lower() in MEDIA_TYPES
+
+
+def serve(path: str, environ: dict, root: str = "."):
+    """
+    Writes a CGI response for a static file to sys.stdout.
+    ETag/Last-Modified + 304, single byte Range (206/416), precompressed .br/.gz.
+    When stdout supports sendfile() (server mode) the body is not copied through Python.
+    """
+    method = environ.get("REQUEST_METHOD", "GET").upper()
+    if method not in ("GET", "HEAD"):
+        _status_only("405 Method Not Allowed", {"Allow": "GET, HEAD"}, "Method Not Allowed")
+        return
+
+    from responses import accepts  # only static requests pay for it
+
+    root = os.path.abspath(root)
+    local_path = os.path.abspath(os.path.join(root, path.lstrip("/")))
+    if not local_path.startswith(root + os.sep):
+        _status_only("404 Not Found", {}, f"Static not found: {path}")
+        return
+
+    try:
+        st = os.stat(local_path)
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
+        _status_only("404 Not Found", {}, f"Static not found: {path}")
+        return
+
+    headers = {
+        "Content-Type": MEDIA_TYPES[path.rsplit(".", 1)[-1].lower()],
+        "Cache-Control": CACHE_CONTROL,
+        "Last-Modified": http_date(st.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+
+    # pick the precompressed variant the client accepts (only if it is not older than the source)
+    file_path, encoding = local_path, None
+    accept_encoding = environ.get("HTTP_ACCEPT_ENCODING", "")
+    for enc, suffix in PRECOMPRESSED:
+        if accepts(accept_encoding, enc):
+            try:
+                cst = os.stat(local_path + suffix)
+            except OSError:
+                continue
+            if cst.st_mtime >= st.st_mtime:
+                file_path, encoding, st = local_path + suffix, enc, cst
+                break
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers["ETag"] = etag
+
+    if _not_modified(environ, etag, st.st_mtime):
+        _write_head("304 Not Modified", {k: v for k, v in headers.items() if k != "Content-Type"})
+        return
+
+    size = st.st_size
+    offset, count, status = 0, size, None
+    range_header = environ.get("HTTP_RANGE")
+    if range_header and environ.get("HTTP_IF_RANGE", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is False:
+            _status_only("416 Range Not Satisfiable", {"Content-Range": f"bytes */{size}"}, "Range Not Satisfiable")
+            return
+        if byte_range is not None:
+            offset, end = byte_range
+            count = end - offset + 1
+            status = "206 Partial Content"
+            headers["Content-Range"] = f"bytes {offset}-{end}/{size}"
+
+    headers["Content-Length"] = str(count)
+    _write_head(status, headers)
+    if method == "HEAD" or count == 0:
+        return
+
+    out = sys.stdout.buffer
+    with open(file_path, "rb") as f:
+        sendfile = getattr(out, "sendfile", None)
+        if sendfile is not None:
+            sendfile(f, offset, count)
+            return
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(COPY_CHUNK, count))
+            if not chunk:
+                break
+            out.write(chunk)
+            count -= len(chunk)
+
+
+def http_date(timestamp: float) -> str:
+    """IMF-fixdate, same as email.utils.formatdate(timestamp, usegmt=True) (no locale)."""
+    t = time.gmtime(timestamp)
+    return (f"{_DAYS[t.tm_wday]}, {t.tm_mday:02d} {_MONTHS[t.tm_mon - 1]} {t.tm_year} "
+            f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d} GMT")
+
+
+def _not_modified(environ: dict, etag: str, mtime: float) -> bool:
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # weak comparison: W/"x" matches "x"
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return etag in tags
+
+    if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since:
+        # browsers send back our own Last-Modified: no date parsing (email.utils costs ~30 ms to import)
+        if if_modified_since == http_date(mtime):
+            return True
+        from email.utils import parsedate_to_datetime
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _parse_range(value: str, size: int):
+    """
+    'bytes=0-99' / 'bytes=100-' / 'bytes=-100' -> (start, end) inclusive.
+    None: ignore the header (unsupported/multiple ranges), False: not satisfiable.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_s, sep, end_s = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_s == "":
+            suffix = int(end_s)
+            if suffix <= 0:
+                return False
+            return max(0, size - suffix), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _write_head(status, headers: dict):
+    if status:
+        print(f"Status: {status}")
+    for name, value in headers.items():
+        print(f"{name}: {value}")
+    print()
+    sys.stdout.flush()
+
+
+def _status_only(status: str, headers: dict, message: str):
+    print(f"Status: {status}")
+    print("Content-Type: text/plain; charset=utf-8")
+    for name, value in headers.items():
+        print(f"{name}: {value}")
+    print()
+    print(message)
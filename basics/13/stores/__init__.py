@@ -0,0 +1,33 @@
+import config
+from stores.base import OrderStore, VersionConflict, HistoryExpired, FIELDS, SORT_FIELDS, version_of
+
+# one store per process: server mode reuses its in-memory state across requests
+_order_store = None
+
+
+def get_order_store() -> OrderStore:
+    global _order_store
+    if _order_store is None:
+        _order_store = create_order_store(config.ORDER_STORE)
+    return _order_store
+
+
+def create_order_store(backend: str) -> OrderStore:
+    if backend == "json":
+        from stores.json_store import JsonOrderStore
+        # one request per process (CGI): stream db.json instead of indexing all of it
+        return JsonOrderStore(config.DB_PATH, history=config.CHANGES_HISTORY, lazy=not config.SERVER_MODE)
+    if backend == "wal":
+        from stores.wal_store import WalOrderStore
+        return WalOrderStore(
+            config.DB_PATH, config.WAL_PATH,
+            fsync=config.WAL_FSYNC,
+            fsync_interval=config.WAL_FSYNC_INTERVAL,
+            compact_min_records=config.WAL_COMPACT_MIN_RECORDS,
+            background=config.SERVER_MODE,
+            history=config.CHANGES_HISTORY
+        )
+    if backend == "sqlite":
+        from stores.sqlite_store import SqliteOrderStore
+        return SqliteOrderStore(config.SQLITE_PATH, history=config.CHANGES_HISTORY)
+    raise ValueError(f"Unknown ORDER_STORE backend: {backend!r} (expected 'json', 'wal' or 'sqlite')")
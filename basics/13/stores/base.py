@@ -0,0 +1,279 @@
+import os
+import heapq
+import itertools
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev setup, no cross-process locking
+    fcntl = None
+
+
+FIELDS = ("title", "price", "status")
+SORT_FIELDS = ("id",) + FIELDS
+
+
+def sort_key(value):
+    # one total order for mixed JSON values (same as SQLite: NULL < numbers < text)
+    if value is None:
+        return 0, 0
+    if isinstance(value, bool):
+        return 1, int(value)
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    return 3, str(value)
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def new_item(oid: int, fields: dict) -> dict:
+    return {
+        "id": oid,
+        "title": fields.get("title", f"Order {oid}"),
+        "price": fields.get("price", 0),
+        "status": fields.get("status", "new")
+    }
+
+
+class VersionConflict(Exception):
+    """If-Match precondition failed: the order was changed by someone else."""
+
+    def __init__(self, item: dict):
+        super().__init__(f"Order {item['id']} is at version {version_of(item)}")
+        self.item = item
+
+
+def version_of(item: dict) -> int:
+    # orders written before versioning count as version 0
+    return item.get("version", 0)
+
+
+def check_version(item: dict, expected):
+    """expected: None (unconditional) or a set of acceptable versions."""
+    if expected is not None and version_of(item) not in expected:
+        raise VersionConflict(item)
+
+
+class HistoryExpired(Exception):
+    """The change feed no longer remembers every deletion after the requested seq."""
+
+    def __init__(self, floor: int):
+        super().__init__(f"changes before seq {floor} are no longer available")
+        self.floor = floor
+
+
+def merge_changes(items, deleted, since: int, limit: int):
+    """
+    Change feed from current orders and deletion tombstones [(id, seq), ...]:
+    {"seq", "op": "put", "item"} for every order written after `since` (its latest state)
+    and {"seq", "op": "del", "id"} for every later deletion, in seq order.
+    Returns (changes, has_more).
+    """
+    puts = ({"seq": version_of(x), "op": "put", "item": x} for x in items if version_of(x) > since)
+    dels = ({"seq": seq, "op": "del", "id": oid} for oid, seq in deleted if seq > since)
+    page = heapq.nsmallest(limit + 1, itertools.chain(puts, dels), key=lambda c: c["seq"])
+    return page[:limit], len(page) > limit
+
+
+def prune_deleted(deleted: list, floor: int, version: int, history: int) -> int:
+    """Drops tombstones older than `history` mutations (list in seq order); returns the new floor."""
+    cutoff = version - history
+    drop = 0
+    while drop < len(deleted) and deleted[drop][1] <= cutoff:
+        drop += 1
+    if drop:
+        floor = max(floor, deleted[drop - 1][1])
+        del deleted[:drop]
+    return floor
+
+
+def run_op(op: dict, create, replace, patch, delete) -> dict:
+    """One batch operation through the given primitives -> {"status": ..., "item"/"id"/"error"}."""
+    kind = op["op"]
+    if kind == "create":
+        return {"status": 201, "item": create(op["fields"])}
+    expected = op.get("expected")
+    try:
+        if kind == "replace":
+            item = replace(op["id"], op["fields"], expected)
+        elif kind == "patch":
+            item = patch(op["id"], op["fields"], expected)
+        else:
+            if not delete(op["id"], expected):
+                return {"status": 404, "error": "Order not found"}
+            return {"status": 200, "id": op["id"]}
+    except VersionConflict as ex:
+        return {"status": 412, "error": str(ex)}
+    if item is None:
+        return {"status": 404, "error": "Order not found"}
+    return {"status": 200, "item": item}
+
+
+class OrderStore:
+    """
+    Order storage backend used by OrderController.
+    Items are dicts {"id", "title", "price", "status", "version"}; returned dicts must not be modified.
+
+    Versions: the store keeps one counter that grows with every mutation (version());
+    a written order gets the new counter value as its own "version", a deleted one
+    leaves a tombstone (id, seq) for the change feed.
+    replace/patch/delete take `expected` (set of versions, None = unconditional)
+    and raise VersionConflict when the order's version is not in it.
+    """
+
+    def list(self) -> list:
+        raise NotImplementedError
+
+    def get(self, oid: int):
+        raise NotImplementedError
+
+    def scan(self):
+        """Iterates over all orders; backends may produce them lazily."""
+        return iter(self.list())
+
+    def get_many(self, ids) -> dict:
+        """
+        id -> order for those of `ids` that exist.
+        Generic version: one pass over scan(), stopping once every id is found.
+        """
+        wanted = set(ids)
+        found = {}
+        if not wanted:
+            return found
+        for item in self.scan():
+            if item.get("id") in wanted:
+                found[item["id"]] = item
+                if len(found) == len(wanted):
+                    break
+        return found
+
+    def create(self, fields: dict) -> dict:
+        """Adds an order with a new id; missing title becomes 'Order <id>'."""
+        raise NotImplementedError
+
+    def replace(self, oid: int, fields: dict, expected=None):
+        """Replaces the whole order; returns None if there is no such id."""
+        raise NotImplementedError
+
+    def patch(self, oid: int, changes: dict, expected=None):
+        """Updates the given fields; returns None if there is no such id."""
+        raise NotImplementedError
+
+    def delete(self, oid: int, expected=None) -> bool:
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Collection version: changes whenever any order is created, changed or deleted."""
+        raise NotImplementedError
+
+    def data_token(self) -> str:
+        """
+        Cheap identifier of the stored data that changes with every write,
+        obtained without loading the data (used to validate cached responses).
+        """
+        return str(self.version())
+
+    def stats(self) -> dict:
+        """Counts and price totals by status and price bucket (stores.stats.summarize)."""
+        raise NotImplementedError
+
+    def changes(self, since: int, limit: int = 100):
+        """
+        Change feed after seq `since` (see merge_changes) -> (changes, has_more, version).
+        Raises HistoryExpired if deletions after `since` were already forgotten.
+        """
+        raise NotImplementedError
+
+    def apply_batch(self, ops: list) -> list:
+        """
+        Applies validated operations {"op": "create"|"replace"|"patch"|"delete", "id", "fields"}
+        in order and returns one result per operation.
+        Backends override it to load once and persist once; this version persists per operation.
+        """
+        return [run_op(op, self.create, self.replace, self.patch, self.delete) for op in ops]
+
+    def query(self, statuses=None, min_price=None, max_price=None,
+              sort: str = "id", descending: bool = False, after=None, limit: int = 100):
+        """
+        One page of orders: filtered, sorted by (sort, id), starting after the
+        cursor `after` = (sort value, id) of the previous page's last item.
+        Returns (items, has_more).
+        Generic version: one pass over scan() keeping only limit+1 items (heap).
+        """
+        def match(x):
+            if statuses is not None and x.get("status") not in statuses:
+                return False
+            if min_price is not None or max_price is not None:
+                price = x.get("price")
+                if not is_number(price):
+                    return False
+                if min_price is not None and price < min_price:
+                    return False
+                if max_price is not None and price > max_price:
+                    return False
+            return True
+
+        def key(x):
+            return sort_key(x.get(sort)), x.get("id")
+
+        candidates = (x for x in self.scan() if match(x))
+        if after is not None:
+            cursor = (sort_key(after[0]), after[1])
+            if descending:
+                candidates = (x for x in candidates if key(x) < cursor)
+            else:
+                candidates = (x for x in candidates if key(x) > cursor)
+
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        page = pick(limit + 1, candidates, key=key)
+        return page[:limit], len(page) > limit
+
+
+def fsync_dir(path: str):
+    """Makes a rename into the directory of `path` durable; directories cannot be opened this way on Windows."""
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """flock() on a separate lock file, shared between processes (CGI, prefork workers)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def _acquire(self, mode):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self.fd, mode)
+        return self
+
+    def shared(self):
+        return self._acquire(fcntl.LOCK_SH if fcntl else None)
+
+    def exclusive(self):
+        return self._acquire(fcntl.LOCK_EX if fcntl else None)
+
+    def try_exclusive(self) -> bool:
+        """exclusive() without waiting: False while another process holds the lock."""
+        try:
+            self._acquire(fcntl.LOCK_EX | fcntl.LOCK_NB if fcntl else None)
+        except BlockingIOError:
+            return False
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
@@ -0,0 +1,212 @@
+import os
+import json
+
+from stores.base import (OrderStore, FileLock, HistoryExpired, new_item, run_op, check_version,
+                         version_of, merge_changes, prune_deleted, fsync_dir)
+from stores.stats import OrderStats
+from stores.json_stream import JsonStreamReader
+
+
+class JsonOrderStore(OrderStore):
+    """
+    db.json as a whole: every change rewrites the file.
+
+    Orders are kept in a dict index by id together with the next free id.
+    The collection version is stored as the top-level "version" key of db.json,
+    deletion tombstones for the change feed as "deleted": [[id, seq], ...].
+    The file is parsed again only when its (inode, mtime, size) changes, so in
+    server mode reads and lookups do not touch the parser at all.
+
+    lazy=True (one-shot CGI processes): until something needs the whole index,
+    reads stream the file (JsonStreamReader) - get() stops at the requested id,
+    scan() yields orders one at a time, version() reads only the keys written
+    before "orders".
+    """
+
+    def __init__(self, db_path: str, history: int = 10000, lazy: bool = False):
+        self.db_path = db_path
+        self.history = history
+        self.lazy = lazy
+        self.items = {}       # id -> item, in file order
+        self.next_id = 1      # max(id) + 1, like before
+        self._version = 0
+        self._deleted = []    # [id, seq] tombstones, oldest first
+        self._deleted_floor = 0
+        self._stats = OrderStats()
+        self._extra = {}      # other top-level keys of db.json, written back as is
+        self._signature = None
+        self._lock = FileLock(db_path + ".lock")
+
+    def list(self) -> list:
+        self._load()
+        return list(self.items.values())
+
+    def get(self, oid: int):
+        if self._streaming():
+            return JsonStreamReader(self.db_path).find(oid)
+        self._load()
+        return self.items.get(oid)
+
+    def get_many(self, ids) -> dict:
+        if self._streaming():
+            return super().get_many(ids)  # one pass over the file
+        self._load()
+        return {oid: self.items[oid] for oid in set(ids) if oid in self.items}
+
+    def scan(self):
+        if self._streaming():
+            return JsonStreamReader(self.db_path).iter_orders()
+        self._load()
+        return iter(self.items.values())
+
+    def create(self, fields: dict) -> dict:
+        return self._locked_write(self._create, fields)
+
+    def replace(self, oid: int, fields: dict, expected=None):
+        return self._locked_write(self._replace, oid, fields, expected)
+
+    def patch(self, oid: int, changes: dict, expected=None):
+        return self._locked_write(self._patch, oid, changes, expected)
+
+    def delete(self, oid: int, expected=None) -> bool:
+        return self._locked_write(self._delete, oid, expected)
+
+    def version(self) -> int:
+        if self._streaming():
+            header = JsonStreamReader(self.db_path).read_header()
+            if "version" in header:
+                return header["version"]
+            # older layout ("orders" first): fall back to the full load
+        self._load()
+        return self._version
+
+    def data_token(self) -> str:
+        # stat() only: valid without parsing db.json (a fresh CGI process)
+        return "%s:%s:%s" % (self._stat_signature() or ("-", "-", "-"))
+
+    def stats(self) -> dict:
+        self._load()
+        return self._stats.summary()
+
+    def changes(self, since: int, limit: int = 100):
+        self._load()
+        if since < self._deleted_floor:
+            raise HistoryExpired(self._deleted_floor)
+        changes, has_more = merge_changes(self.items.values(), self._deleted, since, limit)
+        return changes, has_more, self._version
+
+    def apply_batch(self, ops: list) -> list:
+        # one load, every operation in memory, one rewrite of db.json
+        with self._lock.exclusive():
+            self._load()
+            results = [run_op(op, self._create, self._replace, self._patch, self._delete) for op in ops]
+            if any(r["status"] < 300 for r in results):
+                self._write_db()
+        return results
+
+    # =========================
+    # in-memory operations (caller holds the lock and writes the file)
+    # =========================
+    def _locked_write(self, operation, *args):
+        with self._lock.exclusive():
+            self._load()
+            result = operation(*args)
+            if result:
+                self._write_db()
+        return result
+
+    def _create(self, fields: dict) -> dict:
+        self._version += 1
+        item = {**new_item(self.next_id, fields), "version": self._version}
+        self.items[item["id"]] = item
+        self._stats.add(item)
+        self.next_id += 1
+        return item
+
+    def _replace(self, oid: int, fields: dict, expected=None):
+        if oid not in self.items:
+            return None
+        check_version(self.items[oid], expected)
+        self._version += 1
+        self._stats.remove(self.items[oid])
+        item = self.items[oid] = {**new_item(oid, fields), "version": self._version}
+        self._stats.add(item)
+        return item
+
+    def _patch(self, oid: int, changes: dict, expected=None):
+        item = self.items.get(oid)
+        if item is None:
+            return None
+        check_version(item, expected)
+        self._version += 1
+        self._stats.remove(item)
+        item = self.items[oid] = {**item, **changes, "version": self._version}
+        self._stats.add(item)
+        return item
+
+    def _delete(self, oid: int, expected=None) -> bool:
+        item = self.items.get(oid)
+        if item is None:
+            return False
+        check_version(item, expected)
+        self._version += 1
+        del self.items[oid]
+        self._stats.remove(item)
+        self._deleted.append([oid, self._version])
+        self._deleted_floor = prune_deleted(self._deleted, self._deleted_floor, self._version, self.history)
+        if oid == self.next_id - 1:
+            self.next_id = max(self.items, default=0) + 1
+        return True
+
+    # =========================
+    # LOW-LEVEL HELPERS
+    # =========================
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _streaming(self) -> bool:
+        return self.lazy and self._signature is None
+
+    def _load(self):
+        signature = self._stat_signature()
+        if signature is not None and signature == self._signature:
+            return
+
+        data = self._read_db()
+        orders = data.pop("orders", [])
+        self.items = {x.get("id"): x for x in orders}
+        self._stats = OrderStats(self.items.values())
+        self.next_id = max([x.get("id", 0) for x in orders], default=0) + 1
+        # a WAL snapshot keeps its counter as "seq"
+        self._version = max(data.pop("version", 0), data.get("seq", 0),
+                            max(map(version_of, orders), default=0))
+        self._deleted = data.pop("deleted", [])
+        self._deleted_floor = data.pop("deleted_floor", 0)
+        self._extra = data
+        self._signature = signature
+
+    def _read_db(self):
+        if not os.path.exists(self.db_path):
+            return {"orders": []}
+        with open(self.db_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_db(self):
+        # small keys first: a streaming reader gets them without touching the orders
+        data = {"version": self._version, "deleted_floor": self._deleted_floor, **self._extra,
+                "orders": list(self.items.values()), "deleted": self._deleted}
+        # write + rename: readers never see a half-written file, and the new inode
+        # invalidates the index of every other process
+        tmp = self.db_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            # the data must be on disk before the rename, or a crash can leave an empty db.json
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.db_path)
+        fsync_dir(self.db_path)
+        self._signature = self._stat_signature()
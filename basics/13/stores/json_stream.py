@@ -0,0 +1,142 @@
+import os
+import json
+import mmap
+from json.decoder import WHITESPACE as _WS  # the decoder's own compiled [ \t\n\r]*
+
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamReader:
+    """
+    Incremental reader for db.json ({"orders": [...], ...}) over a memory-mapped file.
+
+    Only one chunk of text (CHUNK_SIZE bytes, decoded) and the current order are
+    in memory at a time; every order is parsed by the C decoder (raw_decode).
+      read_header()  top-level keys written before "orders" (version, ...)
+      iter_orders()  orders one by one, lazily
+      find(oid)      the order with this id, stops at the first match
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def read_header(self) -> dict:
+        header = {}
+        for key, value in self._entries():
+            if key == "orders":
+                break
+            header[key] = value
+        return header
+
+    def iter_orders(self):
+        for key, value in self._entries():
+            if key == "orders":
+                yield from value
+                return
+
+    def find(self, oid: int):
+        for item in self.iter_orders():
+            if item.get("id") == oid:
+                return item
+        return None
+
+    def _entries(self):
+        """(key, value) of the top-level object; the value of "orders" is a lazy iterator."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                cur = _Cursor(mm, self.chunk_size)
+                cur.expect("{")
+                if cur.peek() == "}":
+                    return
+                while True:
+                    key = cur.value()
+                    cur.expect(":")
+                    if key == "orders":
+                        yield key, cur.array()
+                    else:
+                        yield key, cur.value()
+                    c = cur.next_char()
+                    if c == "}":
+                        return
+                    if c != ",":
+                        raise ValueError(f"db.json: expected ',' or '}}', got {c!r}")
+
+
+class _Cursor:
+    """Text window over the mmap: buf[i:] is unread, mm[pos:] is not decoded yet."""
+
+    def __init__(self, mm, chunk_size: int):
+        self.mm = mm
+        self.chunk_size = chunk_size
+        self.pos = 0
+        self.buf = ""
+        self.i = 0
+
+    def _more(self) -> bool:
+        size = len(self.mm)
+        if self.pos >= size:
+            return False
+        end = min(self.pos + self.chunk_size, size)
+        # do not cut a UTF-8 sequence: back off over continuation bytes,
+        # or take the whole character when the chunk is shorter than it
+        while self.pos < end < size and self.mm[end] & 0xC0 == 0x80:
+            end -= 1
+        while end == self.pos or end < size and self.mm[end] & 0xC0 == 0x80:
+            end += 1
+        self.buf = self.buf[self.i:] + self.mm[self.pos:end].decode("utf-8")
+        self.i = 0
+        self.pos = end
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.i = _WS.match(self.buf, self.i).end()
+            if self.i < len(self.buf) or not self._more():
+                return self.buf[self.i:self.i + 1]
+
+    def next_char(self) -> str:
+        c = self.peek()
+        self.i += len(c)
+        return c
+
+    def expect(self, c: str):
+        got = self.next_char()
+        if got != c:
+            raise ValueError(f"db.json: expected {c!r}, got {got!r}")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.i)
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+                continue
+            # a number at the very end of the window may continue in the next chunk
+            if end == len(self.buf) and self._more():
+                continue
+            self.i = end
+            return obj
+
+    def array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.i += 1
+            return
+        while True:
+            yield self.value()
+            c = self.next_char()
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"db.json: expected ',' or ']', got {c!r}")
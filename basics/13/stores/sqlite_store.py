@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import sqlite3
+
+from stores.base import (OrderStore, FIELDS, SORT_FIELDS, HistoryExpired, new_item, run_op, check_version,
+                         merge_changes)
+from stores.stats import PRICE_BUCKETS, NO_PRICE, summarize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id     INTEGER PRIMARY KEY,
+    title,
+    price,
+    status,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS orders_price ON orders(price);
+CREATE INDEX IF NOT EXISTS orders_version ON orders(version);
+CREATE TABLE IF NOT EXISTS deleted (
+    seq INTEGER PRIMARY KEY,
+    id  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('deleted_floor', 0);
+"""
+
+
+def _bucket_sql(price: str) -> str:
+    # same buckets as stores.stats.price_bucket()
+    cases = " ".join(f"WHEN {price} < {bound} THEN {i}" for i, bound in enumerate(PRICE_BUCKETS))
+    return (f"CASE WHEN typeof({price}) NOT IN ('integer', 'real') THEN {NO_PRICE} "
+            f"{cases} ELSE {len(PRICE_BUCKETS)} END")
+
+
+def _stats_sql(row: str, sign: str) -> str:
+    price = f"{row}.price"
+    return f"""
+    INSERT INTO order_stats (skey, bucket, status, count, total)
+    VALUES (quote({row}.status), {_bucket_sql(price)}, {row}.status, {sign}1,
+            {sign}CASE WHEN typeof({price}) IN ('integer', 'real') THEN {price} ELSE 0 END)
+    ON CONFLICT (skey, bucket) DO UPDATE SET count = count + excluded.count, total = total + excluded.total;"""
+
+
+# aggregates per (status, price bucket), maintained by triggers in the writing transaction
+STATS_SCHEMA = f"""
+CREATE TABLE order_stats (
+    skey   TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    status,
+    count  INTEGER NOT NULL,
+    total  NOT NULL,
+    PRIMARY KEY (skey, bucket)
+);
+CREATE TRIGGER orders_stats_insert AFTER INSERT ON orders BEGIN{_stats_sql("NEW", "")}
+END;
+CREATE TRIGGER orders_stats_delete AFTER DELETE ON orders BEGIN{_stats_sql("OLD", "-")}
+    DELETE FROM order_stats WHERE count = 0;
+END;
+CREATE TRIGGER orders_stats_update AFTER UPDATE OF status, price ON orders BEGIN{_stats_sql("OLD", "-")}{_stats_sql("NEW", "")}
+    DELETE FROM order_stats WHERE count = 0;
+END;
+"""
+STATS_BACKFILL = f"""
+INSERT INTO order_stats (skey, bucket, status, count, total)
+SELECT quote(status), {_bucket_sql("price")}, status, COUNT(*),
+       SUM(CASE WHEN typeof(price) IN ('integer', 'real') THEN price ELSE 0 END)
+FROM orders GROUP BY 1, 2
+"""
+
+# PRAGMA user_version of a database with everything above; lower: _create_schema() runs once
+SCHEMA_VERSION = 1
+
+# constant SQL text: sqlite3 keeps the prepared statements in its per-connection cache
+SQL_SELECT = "SELECT id, title, price, status, version FROM orders"
+SQL_LIST = SQL_SELECT + " ORDER BY id"
+SQL_GET = SQL_SELECT + " WHERE id = ?"
+# ids per IN (...) query: below SQLITE_MAX_VARIABLE_NUMBER of old builds (999)
+GET_MANY_CHUNK = 500
+SQL_NEXT_ID = "SELECT COALESCE(MAX(id), 0) + 1 FROM orders"
+SQL_INSERT = "INSERT INTO orders (id, title, price, status, version) VALUES (?, ?, ?, ?, ?)"
+SQL_REPLACE = "UPDATE orders SET title = ?, price = ?, status = ?, version = ? WHERE id = ?"
+SQL_DELETE = "DELETE FROM orders WHERE id = ?"
+SQL_PATCH = {k: f"UPDATE orders SET {k} = ? WHERE id = ?" for k in FIELDS}
+SQL_SET_VERSION = "UPDATE orders SET version = ? WHERE id = ?"
+SQL_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+SQL_BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+SQL_CHANGED = SQL_SELECT + " WHERE version > ? ORDER BY version LIMIT ?"
+SQL_DELETED = "SELECT id, seq FROM deleted WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_DELETED_FLOOR = "SELECT value FROM meta WHERE key = 'deleted_floor'"
+SQL_TOMBSTONE = "INSERT INTO deleted (seq, id) VALUES (?, ?)"
+SQL_PRUNE_FLOOR = "SELECT MAX(seq) FROM deleted WHERE seq <= ?"
+SQL_PRUNE = "DELETE FROM deleted WHERE seq <= ?"
+SQL_SET_FLOOR = "UPDATE meta SET value = MAX(value, ?) WHERE key = 'deleted_floor'"
+SQL_STATS = "SELECT status, bucket, count, total FROM order_stats"
+
+
+class SqliteOrderStore(OrderStore):
+    """
+    Orders in SQLite (WAL journal): concurrent readers, single-row updates.
+    One connection per process, opened on first use and reused by every request.
+    The collection version is a counter in the meta table, bumped inside every write transaction;
+    deletions leave (seq, id) rows in the deleted table for the change feed.
+    """
+
+    def __init__(self, path: str, history: int = 10000):
+        self.path = path
+        self.history = history
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # a read, not a write transaction: CGI opens the database on every request
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _create_schema(conn):
+        """New or older database. Every step is idempotent: processes racing here end up with the same schema."""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'orders'").fetchone():
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(orders)")]
+            if "version" not in columns:
+                # database created before order versions
+                conn.execute("ALTER TABLE orders ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(SCHEMA)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'order_stats'").fetchone():
+            # first open (or database created before stats): fill the aggregates once;
+            # CREATE TABLE fails in the process that lost the race
+            try:
+                conn.executescript("BEGIN IMMEDIATE;" + STATS_SCHEMA + STATS_BACKFILL + ";COMMIT;")
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def list(self) -> list:
+        return [self._row(r) for r in self.conn.execute(SQL_LIST)]
+
+    def get(self, oid: int):
+        row = self.conn.execute(SQL_GET, (oid,)).fetchone()
+        return self._row(row) if row else None
+
+    def get_many(self, ids) -> dict:
+        ids = sorted(set(ids))
+        found = {}
+        for i in range(0, len(ids), GET_MANY_CHUNK):
+            chunk = ids[i:i + GET_MANY_CHUNK]
+            sql = f"{SQL_SELECT} WHERE id IN ({', '.join('?' * len(chunk))})"
+            for row in self.conn.execute(sql, chunk):
+                item = self._row(row)
+                found[item["id"]] = item
+        return found
+
+    def create(self, fields: dict) -> dict:
+        return self._write(self._insert, fields)
+
+    def replace(self, oid: int, fields: dict, expected=None):
+        return self._write(self._update, oid, fields, expected)
+
+    def patch(self, oid: int, changes: dict, expected=None):
+        return self._write(self._patch, oid, changes, expected)
+
+    def delete(self, oid: int, expected=None) -> bool:
+        return self._write(self._delete, oid, expected)
+
+    def version(self) -> int:
+        return self.conn.execute(SQL_VERSION).fetchone()[0]
+
+    def stats(self) -> dict:
+        return summarize(self.conn.execute(SQL_STATS))
+
+    def changes(self, since: int, limit: int = 100):
+        conn = self.conn
+        conn.execute("BEGIN")  # one read snapshot for the counter and both tables
+        try:
+            floor = conn.execute(SQL_DELETED_FLOOR).fetchone()[0]
+            if since < floor:
+                raise HistoryExpired(floor)
+            version = conn.execute(SQL_VERSION).fetchone()[0]
+            items = [self._row(r) for r in conn.execute(SQL_CHANGED, (since, limit + 1))]
+            deleted = conn.execute(SQL_DELETED, (since, limit + 1)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        changes, has_more = merge_changes(items, deleted, since, limit)
+        return changes, has_more, version
+
+    def apply_batch(self, ops: list) -> list:
+        # one write transaction, one commit (and one WAL sync) for the whole batch
+        return self._write(lambda: [run_op(op, self._insert, self._update, self._patch, self._delete)
+                                    for op in ops])
+
+    def query(self, statuses=None, min_price=None, max_price=None,
+              sort: str = "id", descending: bool = False, after=None, limit: int = 100):
+        """Same contract as OrderStore.query(), done by SQLite (keyset pagination, LIMIT)."""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"unknown sort field: {sort}")
+        where, params = [], []
+        if statuses is not None:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if min_price is not None or max_price is not None:
+            where.append("typeof(price) IN ('integer', 'real')")
+        if min_price is not None:
+            where.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("price <= ?")
+            params.append(max_price)
+
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            if sort == "id":
+                where.append(f"id {'<' if descending else '>'} ?")
+                params.append(after[1])
+            else:
+                where.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+                params.extend((self._value(after[0]), after[1]))
+
+        order_by = "id" if sort == "id" else f"{sort} {direction}, id"
+        sql = (SQL_SELECT
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY {order_by} {direction} LIMIT ?")
+        rows = self.conn.execute(sql, params + [limit + 1]).fetchall()
+        return [self._row(r) for r in rows[:limit]], len(rows) > limit
+
+    def import_orders(self, orders: list) -> int:
+        """Bulk load (used by the db.json importer); existing ids are overwritten."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # an upsert, not INSERT OR REPLACE: the implicit delete of REPLACE fires no delete
+            # trigger, so order_stats would count a re-imported order twice
+            conn.executemany("INSERT INTO orders (id, title, price, status, version) VALUES (?, ?, ?, ?, ?) "
+                             "ON CONFLICT(id) DO UPDATE SET title = excluded.title, price = excluded.price, "
+                             "status = excluded.status, version = excluded.version",
+                             [self._params(x, with_id_first=True) for x in orders])
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'version'",
+                         (max((x.get("version", 0) for x in orders), default=0),))
+            self._bump_version()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(orders)
+
+    # =========================
+    # LOW-LEVEL HELPERS
+    # =========================
+    def _write(self, operation, *args):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = operation(*args)
+            conn.execute("COMMIT" if result else "ROLLBACK")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _bump_version(self) -> int:
+        self.conn.execute(SQL_BUMP_VERSION)
+        return self.conn.execute(SQL_VERSION).fetchone()[0]
+
+    def _insert(self, fields: dict) -> dict:
+        oid = self.conn.execute(SQL_NEXT_ID).fetchone()[0]
+        item = {**new_item(oid, fields), "version": self._bump_version()}
+        self.conn.execute(SQL_INSERT, self._params(item, with_id_first=True))
+        return item
+
+    def _update(self, oid: int, fields: dict, expected=None):
+        row = self.conn.execute(SQL_GET, (oid,)).fetchone()
+        if row is None:
+            return None
+        check_version(self._row(row), expected)
+        item = {**new_item(oid, fields), "version": self._bump_version()}
+        self.conn.execute(SQL_REPLACE, self._params(item))
+        return item
+
+    def _patch(self, oid: int, changes: dict, expected=None):
+        row = self.conn.execute(SQL_GET, (oid,)).fetchone()
+        if row is None:
+            return None
+        check_version(self._row(row), expected)
+        version = self._bump_version()
+        for k, v in changes.items():
+            self.conn.execute(SQL_PATCH[k], (self._value(v), oid))
+        self.conn.execute(SQL_SET_VERSION, (version, oid))
+        return {**self._row(row), **changes, "version": version}
+
+    def _delete(self, oid: int, expected=None) -> bool:
+        if expected is not None:
+            row = self.conn.execute(SQL_GET, (oid,)).fetchone()
+            if row is None:
+                return False
+            check_version(self._row(row), expected)
+        if self.conn.execute(SQL_DELETE, (oid,)).rowcount == 0:
+            return False
+        seq = self._bump_version()
+        self.conn.execute(SQL_TOMBSTONE, (seq, oid))
+        floor = self.conn.execute(SQL_PRUNE_FLOOR, (seq - self.history,)).fetchone()[0]
+        if floor is not None:
+            self.conn.execute(SQL_PRUNE, (floor,))
+            self.conn.execute(SQL_SET_FLOOR, (floor,))
+        return True
+
+    @staticmethod
+    def _value(v):
+        # columns are untyped: numbers/strings are stored as is, anything else as JSON text
+        return v if v is None or isinstance(v, (int, float, str)) else json.dumps(v, ensure_ascii=False)
+
+    def _params(self, item: dict, with_id_first: bool = False):
+        values = tuple(self._value(item.get(k)) for k in FIELDS) + (item.get("version", 0),)
+        return (item["id"],) + values if with_id_first else values + (item["id"],)
+
+    @staticmethod
+    def _row(row) -> dict:
+        return {"id": row[0], "title": row[1], "price": row[2], "status": row[3], "version": row[4]}
+
+
+def main(argv):
+    """
+    One-shot importer:
+        python -m stores.sqlite_store import [db.json] [db.sqlite3]
+    """
+    import config
+
+    if not argv or argv[0] != "import":
+        print(main.__doc__, file=sys.stderr)
+        return 2
+    src = argv[1] if len(argv) > 1 else config.DB_PATH
+    dst = argv[2] if len(argv) > 2 else config.SQLITE_PATH
+
+    with open(src, "r", encoding="utf-8") as f:
+        orders = json.load(f).get("orders", [])
+    count = SqliteOrderStore(dst).import_orders(orders)
+    print(f"imported {count} orders from {os.path.abspath(src)} into {os.path.abspath(dst)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
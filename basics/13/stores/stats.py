@@ -0,0 +1,83 @@
+import json
+from bisect import bisect_right
+
+from stores.base import is_number
+
+# upper bounds of the price buckets: <10, 10-100, 100-1000, 1000-10000, >=10000
+PRICE_BUCKETS = (10, 100, 1000, 10000)
+NO_PRICE = -1  # bucket of orders whose price is not a number
+
+
+def price_bucket(price) -> int:
+    return bisect_right(PRICE_BUCKETS, price) if is_number(price) else NO_PRICE
+
+
+def bucket_label(bucket: int) -> str:
+    if bucket == 0:
+        return f"<{PRICE_BUCKETS[0]}"
+    if bucket == len(PRICE_BUCKETS):
+        return f">={PRICE_BUCKETS[-1]}"
+    return f"{PRICE_BUCKETS[bucket - 1]}-{PRICE_BUCKETS[bucket]}"
+
+
+def _status_key(status):
+    # statuses are free-form JSON: lists/objects are grouped by their JSON text (like in SQLite)
+    return status if status is None or isinstance(status, (int, float, str)) else json.dumps(status, ensure_ascii=False)
+
+
+class OrderStats:
+    """
+    Counts and price totals per (status, price bucket), kept up to date order by order:
+    add() for a written order, remove() for its previous state.
+    summary() costs O(#groups), not O(#orders).
+    """
+
+    def __init__(self, items=()):
+        self.groups = {}  # (status, bucket) -> [count, total]
+        for item in items:
+            self.add(item)
+
+    def add(self, item: dict, sign: int = 1):
+        price = item.get("price")
+        key = (_status_key(item.get("status")), price_bucket(price))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = [0, 0]
+        group[0] += sign
+        if is_number(price):
+            group[1] += sign * price
+        if group[0] == 0:
+            del self.groups[key]
+
+    def remove(self, item: dict):
+        self.add(item, -1)
+
+    def summary(self) -> dict:
+        return summarize((status, bucket, count, total) for (status, bucket), (count, total) in self.groups.items())
+
+
+def summarize(groups) -> dict:
+    """(status, bucket, count, total) rows -> {"count", "total", "by_status": [...], "by_price": [...]}."""
+    by_status, by_bucket = {}, {}
+    count = total = 0
+    for status, bucket, n, t in groups:
+        for index, key in ((by_status, status), (by_bucket, bucket)):
+            row = index.setdefault(key, [0, 0])
+            row[0] += n
+            row[1] += t
+        count += n
+        total += t
+
+    return {
+        "count": count,
+        "total": _round(total),
+        "by_status": [{"status": s, "count": n, "total": _round(t)}
+                      for s, (n, t) in sorted(by_status.items(), key=lambda x: (-x[1][0], str(x[0])))],
+        "by_price": [{"bucket": bucket_label(b), "count": n, "total": _round(t)}
+                     for b, (n, t) in sorted(by_bucket.items()) if b != NO_PRICE],
+    }
+
+
+def _round(total):
+    # incremental float sums drift in the last digits
+    return round(total, 6) if isinstance(total, float) else total
@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import threading
+from functools import partial
+
+from stores.base import (OrderStore, FileLock, HistoryExpired, new_item, run_op, check_version,
+                         version_of, merge_changes, prune_deleted, fsync_dir)
+from stores.stats import OrderStats
+
+
+class WalOrderStore(OrderStore):
+    """
+    Append-only write-ahead log + snapshot.
+
+    snapshot (db.json): {"orders": [...], "seq": N, "next_id": M, "deleted": [[id, seq], ...], "deleted_floor": F}
+    log (db.wal):       one JSON record per line, appended per mutation
+        {"seq": 7, "op": "put", "item": {...}}
+        {"seq": 8, "op": "del", "id": 3}
+
+    The collection version is the seq of the last record; a written order
+    carries the seq of its record as "version".
+
+    Every process keeps the current state in memory (dict by id) and replays
+    only the log tail that other processes appended since its last look, so a
+    mutation costs one append no matter how many orders exist.
+    Compaction writes a new snapshot and starts an empty log (new inode, so
+    other processes notice it and reload).
+
+    fsync: "always"   every append is on disk before the write returns
+           "interval" server mode: a background thread fsyncs at most every fsync_interval
+                      seconds and the write returns at once - a crash of the machine (not
+                      of the process) loses the writes acknowledged in the last interval.
+                      Without background threads (CGI) it is the same as "always".
+           "off"      left to the OS
+    """
+    FSYNC_MODES = ("always", "interval", "off")
+
+    def __init__(self, snapshot_path: str, log_path: str, fsync: str = "interval",
+                 fsync_interval: float = 0.05, compact_min_records: int = 1000, background: bool = False,
+                 history: int = 10000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        fsync = "interval" if fsync == "batch" else fsync  # the old name of the mode
+        if fsync not in self.FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(self.FSYNC_MODES)}, not {fsync!r}")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_min_records = compact_min_records
+        # server mode: interval fsync and compaction run in background threads
+        self.background = background
+        self.history = history
+
+        self.items = {}       # id -> item, in insertion order
+        self.seq = 0          # seq of the last applied mutation
+        self.next_id = 1
+        self.deleted = []     # [id, seq] tombstones for the change feed, oldest first
+        self.deleted_floor = 0
+        self.stats_index = OrderStats()
+
+        self._mutex = threading.RLock()
+        self._lock = FileLock(log_path + ".lock")
+        self._log_ino = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._fd = None
+        self._fd_ino = None
+        self._dirty = False
+        self._flusher = None
+        self._compactor = None
+
+        with self._mutex, self._lock.exclusive():
+            self._recover(repair=True)
+
+    # =========================
+    # OrderStore
+    # =========================
+    def list(self) -> list:
+        with self._mutex:
+            self._refresh()
+            return list(self.items.values())
+
+    def get(self, oid: int):
+        with self._mutex:
+            self._refresh()
+            return self.items.get(oid)
+
+    def get_many(self, ids) -> dict:
+        with self._mutex:
+            self._refresh()
+            return {oid: self.items[oid] for oid in set(ids) if oid in self.items}
+
+    def create(self, fields: dict) -> dict:
+        return self._commit(lambda emit: self._create(emit, fields))
+
+    def replace(self, oid: int, fields: dict, expected=None):
+        return self._commit(lambda emit: self._replace(emit, oid, fields, expected))
+
+    def patch(self, oid: int, changes: dict, expected=None):
+        return self._commit(lambda emit: self._patch(emit, oid, changes, expected))
+
+    def delete(self, oid: int, expected=None) -> bool:
+        return self._commit(lambda emit: self._delete(emit, oid, expected))
+
+    def version(self) -> int:
+        with self._mutex:
+            self._refresh()
+            return self.seq
+
+    def data_token(self) -> str:
+        # every mutation grows the log; compaction replaces both files (new inodes)
+        parts = []
+        for path in (self.log_path, self.snapshot_path):
+            try:
+                st = os.stat(path)
+                parts.append(f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}")
+            except FileNotFoundError:
+                parts.append("-")
+        return "/".join(parts)
+
+    def stats(self) -> dict:
+        with self._mutex:
+            self._refresh()
+            return self.stats_index.summary()
+
+    def changes(self, since: int, limit: int = 100):
+        with self._mutex:
+            self._refresh()
+            if since < self.deleted_floor:
+                raise HistoryExpired(self.deleted_floor)
+            changes, has_more = merge_changes(self.items.values(), self.deleted, since, limit)
+            return changes, has_more, self.seq
+
+    def apply_batch(self, ops: list) -> list:
+        # all records of the batch go to the log in one write (and one fsync)
+        def build(emit):
+            return [run_op(op, partial(self._create, emit), partial(self._replace, emit),
+                           partial(self._patch, emit), partial(self._delete, emit)) for op in ops]
+        return self._commit(build)
+
+    # =========================
+    # operations: build the record from current state and pass it to emit()
+    # (the record gets seq = self.seq + 1, which is also the new order version)
+    # =========================
+    def _create(self, emit, fields: dict) -> dict:
+        item = {**new_item(self.next_id, fields), "version": self.seq + 1}
+        emit({"op": "put", "item": item})
+        return item
+
+    def _replace(self, emit, oid: int, fields: dict, expected=None):
+        if oid not in self.items:
+            return None
+        check_version(self.items[oid], expected)
+        item = {**new_item(oid, fields), "version": self.seq + 1}
+        emit({"op": "put", "item": item})
+        return item
+
+    def _patch(self, emit, oid: int, changes: dict, expected=None):
+        item = self.items.get(oid)
+        if item is None:
+            return None
+        check_version(item, expected)
+        item = {**item, **changes, "version": self.seq + 1}
+        emit({"op": "put", "item": item})
+        return item
+
+    def _delete(self, emit, oid: int, expected=None) -> bool:
+        item = self.items.get(oid)
+        if item is None:
+            return False
+        check_version(item, expected)
+        emit({"op": "del", "id": oid})
+        return True
+
+    # =========================
+    # log
+    # =========================
+    def _commit(self, build):
+        """
+        Catches up under the exclusive lock and runs build(emit) against fresh state.
+        Every emitted record is applied at once (later operations see it) and all
+        of them are appended with a single write.
+        """
+        with self._mutex:
+            with self._lock.exclusive():
+                # a torn tail must go before the append, or the new records would be glued to it
+                self._catch_up(repair=True)
+                lines = []
+
+                def emit(rec):
+                    rec = {"seq": self.seq + 1, **rec}
+                    self._apply(rec)
+                    lines.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+                try:
+                    result = build(emit)
+                    if lines:
+                        data = "".join(lines).encode("utf-8")
+                        self._append(data)
+                        self._log_offset += len(data)
+                except BaseException:
+                    if lines:
+                        self._recover(repair=True)  # memory is ahead of the log: reload it
+                    raise
+            if lines:
+                self._after_append()
+        return result
+
+    def _append(self, line: bytes):
+        if self._fd is None or self._fd_ino != self._log_ino:
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._fd_ino = self._log_ino = os.fstat(self._fd).st_ino
+        # os.write() may take only part of the buffer (full disk, signal): the rest must follow.
+        # On an error nothing of the batch may stay behind: complete records would be replayed
+        start = os.lseek(self._fd, 0, os.SEEK_END)
+        view = memoryview(line)
+        try:
+            while view:
+                view = view[os.write(self._fd, view):]
+        except BaseException:
+            os.ftruncate(self._fd, start)
+            raise
+
+        if self.fsync == "always" or (self.fsync == "interval" and not self.background):
+            os.fsync(self._fd)
+        elif self.fsync == "interval":
+            self._dirty = True
+
+    def _after_append(self):
+        if self._dirty and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-fsync", daemon=True)
+            self._flusher.start()
+
+        if self._log_records >= max(self.compact_min_records, len(self.items)):
+            if not self.background:
+                self.compact()
+            elif self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, name="wal-compact", daemon=True)
+                self._compactor.start()
+
+    def _flush_loop(self):
+        # not group commit: the writers do not wait for this fsync (see the class docstring)
+        while True:
+            time.sleep(self.fsync_interval)
+            with self._mutex:
+                if self._dirty and self._fd is not None:
+                    os.fsync(self._fd)
+                    self._dirty = False
+
+    def _apply(self, rec: dict):
+        self._log_records += 1
+        if rec.get("seq", 0) <= self.seq:
+            return  # already part of the snapshot
+        if rec["op"] == "put":
+            item = rec["item"]
+            old = self.items.get(item["id"])
+            if old is not None:
+                self.stats_index.remove(old)
+            self.items[item["id"]] = item
+            self.stats_index.add(item)
+            self.next_id = max(self.next_id, item["id"] + 1)
+        elif rec["op"] == "del":
+            old = self.items.pop(rec["id"], None)
+            if old is not None:
+                self.stats_index.remove(old)
+            self.deleted.append([rec["id"], rec["seq"]])
+            self.deleted_floor = prune_deleted(self.deleted, self.deleted_floor, rec["seq"], self.history)
+        self.seq = rec["seq"]
+
+    def _refresh(self):
+        # shared lock: no truncation here, a torn tail is repaired by the next writer
+        with self._lock.shared():
+            self._catch_up()
+
+    def _catch_up(self, repair: bool = False):
+        """
+        Applies records appended by other processes; reloads everything after a compaction.
+        repair=True (only with the exclusive lock): truncate a torn tail left by a crashed writer.
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            if self._log_ino is not None:
+                self._recover(repair)
+            return
+
+        if (self._log_ino is not None and st.st_ino != self._log_ino) or st.st_size < self._log_offset:
+            self._recover(repair)
+            return
+        self._log_ino = st.st_ino
+        if st.st_size == self._log_offset:
+            return
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(st.st_size - self._log_offset)
+
+        pos = 0
+        while True:
+            nl = data.find(b"\n", pos)
+            if nl == -1:
+                break
+            try:
+                rec = json.loads(data[pos:nl])
+            except ValueError:
+                break
+            self._apply(rec)
+            pos = nl + 1
+        self._log_offset += pos
+
+        if repair and self._log_offset < st.st_size:
+            # torn write from a crashed process: drop the incomplete tail
+            os.truncate(self.log_path, self._log_offset)
+
+    def _recover(self, repair: bool = False):
+        """Loads the snapshot and replays the whole log; repair as in _catch_up()."""
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        self.items = {x["id"]: x for x in data.get("orders", [])}
+        self.stats_index = OrderStats(self.items.values())
+        # a db.json written by the json backend keeps its counter as "version"
+        self.seq = max(data.get("seq", 0), data.get("version", 0), max(map(version_of, self.items.values()), default=0))
+        self.deleted = data.get("deleted", [])
+        self.deleted_floor = data.get("deleted_floor", 0)
+        self.next_id = max(data.get("next_id", 1), max(self.items, default=0) + 1)
+        self._log_ino = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._catch_up(repair)
+
+    # =========================
+    # compaction
+    # =========================
+    def compact(self):
+        with self._mutex, self._lock.exclusive():
+            self._catch_up(repair=True)
+            if self._log_records == 0:
+                return
+
+            snapshot = {"orders": list(self.items.values()), "seq": self.seq, "next_id": self.next_id,
+                        "deleted": self.deleted, "deleted_floor": self.deleted_floor}
+            self._write_atomic(self.snapshot_path, json.dumps(snapshot, ensure_ascii=False, indent=2).encode("utf-8"))
+            # a crash between these two steps is harmless: replay skips records with seq <= snapshot seq
+            self._write_atomic(self.log_path, b"")
+
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._dirty = False
+            self._log_ino = os.stat(self.log_path).st_ino
+            self._log_offset = 0
+            self._log_records = 0
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        # the rename must be on disk before the next step: an emptied log next to the
+        # old snapshot after a crash would lose everything since the previous compaction
+        fsync_dir(path)
@@ -0,0 +1,124 @@
+"""
+Shared fixtures. The app runs in-process the way Apache runs it (CGI mode:
+access_manager.handle_request() with stdout captured); every test gets its own
+data files under tmp_path and fresh per-process singletons.
+"""
+import io
+import os
+import sys
+import json
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = "/python-api/basics/13"
+
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import config  # noqa: E402
+
+
+class Response:
+    """Parsed CGI output: status (int), headers (name -> value), body (bytes)."""
+
+    def __init__(self, raw: bytes):
+        head, _, self.body = raw.partition(b"\n\n")
+        self.status = 200
+        self.headers = {}
+        for line in head.decode("latin-1").splitlines():
+            name, _, value = line.partition(":")
+            if name.lower() == "status":
+                self.status = int(value.split()[0])
+            else:
+                self.headers[name.strip()] = value.strip()
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class App:
+    def __init__(self, root):
+        self.root = root
+
+    def request(self, method: str, path: str, query: str = "", headers: dict = None, body=None) -> Response:
+        import access_manager
+
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        environ = {"HTTP_" + k.upper().replace("-", "_"): v for k, v in (headers or {}).items()}
+        environ.update({
+            "REQUEST_METHOD": method,
+            "REQUEST_URI": PREFIX + path + ("?" + query if query else ""),
+            "QUERY_STRING": "htctrl=1" + ("&" + query if query else ""),
+            "CONTENT_LENGTH": str(len(body)) if body else "",
+        })
+        raw = io.BytesIO()
+        out = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+        saved_stdout, sys.stdout = sys.stdout, out
+        try:
+            access_manager.handle_request(environ, io.BytesIO(body or b""))
+            out.flush()
+        finally:
+            sys.stdout = saved_stdout
+        return Response(raw.getvalue())
+
+    def token(self, mode: str = "") -> str:
+        return self.request("GET", "/user", f"mode={mode}" if mode else "").json()["data"]["token"]
+
+    def write_db(self, orders: list):
+        with open(config.DB_PATH, "w", encoding="utf-8") as f:
+            json.dump({"orders": orders}, f)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import stores
+    import jwt_codec
+    import revocation
+    import response_cache
+    from controllers import discount_controller, order_controller
+
+    monkeypatch.chdir(BASE_DIR)  # views/static are opened by relative paths
+    for name, value in {
+        "ORDER_STORE": "json",
+        "DB_PATH": str(tmp_path / "db.json"),
+        "WAL_PATH": str(tmp_path / "db.wal"),
+        "SQLITE_PATH": str(tmp_path / "db.sqlite3"),
+        "JWT_KEYS_PATH": str(tmp_path / "jwt_keys.json"),
+        "REVOKED_PATH": str(tmp_path / "revoked.sqlite3"),
+        "RESPONSE_CACHE_DIR": str(tmp_path / "cache"),
+        "SERVER_MODE": False,
+        "LONG_POLL": False,
+        "LONG_POLL_WAITERS": 0,
+    }.items():
+        monkeypatch.setattr(config, name, value)
+    # one instance per process in production: a fresh one per test
+    monkeypatch.setattr(stores, "_order_store", None)
+    monkeypatch.setattr(jwt_codec, "_keyring", None)
+    monkeypatch.setattr(revocation, "_revocations", None)
+    monkeypatch.setattr(response_cache, "_response_cache", None)
+    monkeypatch.setattr(discount_controller, "_verified_tokens", discount_controller.TokenCache())
+    monkeypatch.setattr(order_controller, "_poll_slots", [])
+
+    app = App(tmp_path)
+    app.write_db([])
+    return app
+
+
+# =========================
+# stores
+# =========================
+BACKENDS = ["json", "wal", "sqlite"]
+
+
+def open_store(backend: str):
+    """A new instance on the same files: what another process would see."""
+    from stores import create_order_store
+
+    return create_order_store(backend)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, app):
+    return request.param
@@ -0,0 +1,167 @@
+"""GET /discount: bearer token checks, the key ring (kid) and the verified-token cache."""
+import json
+
+import pytest
+
+import config
+from jwt_codec import JwtCodec, HEADER_SEGMENT, get_keyring
+from controllers import discount_controller
+from controllers.discount_controller import TokenCache
+
+
+def discount(app, token=None, auth=None):
+    headers = {"Authorization": auth if auth is not None else f"Bearer {token}"}
+    return app.request("GET", "/discount", headers=headers)
+
+
+def error(response) -> str:
+    return response.json()["status"]["message"]
+
+
+def payload(**changes) -> dict:
+    return {"sub": "296c7f07-ba1a-11f0-83b6-62517600596c", "iss": "Server-KN-P-221", "exp": 2000000000,
+            "name": "Test", "email": "test@fake.net", **changes}
+
+
+def sign(claims: dict, secret: bytes = b"super-secret-key-13") -> str:
+    return JwtCodec(secret).encode(claims, HEADER_SEGMENT)
+
+
+def write_keys(active: str, keys: dict, legacy: bool = True):
+    with open(config.JWT_KEYS_PATH, "w", encoding="utf-8") as f:
+        json.dump({"active": active, "keys": keys, "legacy": legacy}, f)
+
+
+def test_valid_token(app):
+    response = discount(app, app.token())
+    assert response.status == 200
+    assert response.json()["data"]["discountPercent"] == 7
+
+
+def test_nested_token(app):
+    response = discount(app, app.token("nested"))
+    assert response.status == 200
+    assert response.json()["meta"]["nesting"] == 1
+
+
+@pytest.mark.parametrize("mode, reason", [
+    ("expired", "token expired"),
+    ("nested_expired", "nested JWT invalid: token expired"),
+    ("bad_sub", "invalid sub"),
+    ("bad_iss", "invalid iss"),
+    ("no_name_email", "at least one of 'name' or 'email'"),
+    ("bad_email", "invalid email format"),
+])
+def test_rejected_tokens(app, mode, reason):
+    response = discount(app, app.token(mode))
+    assert response.status == 403
+    assert reason in error(response)
+
+
+@pytest.mark.parametrize("mode", ["email_only", "name_only"])
+def test_name_or_email_is_enough(app, mode):
+    assert discount(app, app.token(mode)).status == 200
+
+
+@pytest.mark.parametrize("auth, reason", [
+    ("", "missing Authorization"),
+    ("Basic abc", "invalid scheme"),
+    ("Bearer ", "empty token"),
+    ("Bearer a.b", None),
+    ("Bearer a.b.c!", None),
+])
+def test_malformed_authorization(app, auth, reason):
+    response = discount(app, auth=auth)
+    assert response.status == 403
+    if reason:
+        assert reason in error(response)
+
+
+def test_tampered_payload_and_signature(app):
+    h64, p64, s64 = app.token().split(".")
+    other = sign(payload(name="Mallory")).split(".")[1]
+    assert discount(app, f"{h64}.{other}.{s64}").status == 403
+    assert discount(app, f"{h64}.{p64}.{s64[:-2]}AA").status == 403
+    assert discount(app, sign(payload(), b"another secret")).status == 403
+
+
+def test_hand_made_token_with_the_built_in_key(app):
+    assert discount(app, sign(payload())).status == 200
+    assert "missing/invalid exp" in error(discount(app, sign(payload(exp="2000000000"))))
+
+
+# =========================
+# key ring
+# =========================
+@pytest.fixture
+def rotating(app, monkeypatch):
+    monkeypatch.setattr(config, "JWT_KEYS_CHECK_INTERVAL", 0)
+    return app
+
+
+def test_tokens_carry_the_active_kid(rotating):
+    write_keys("k1", {"k1": "secret one"})
+    token = rotating.token()
+    assert rotating.request("GET", "/user").json()["data"]["header"]["kid"] == "k1"
+    assert discount(rotating, token).status == 200
+
+
+def test_rotation_keeps_old_keys_until_removed(rotating):
+    write_keys("k1", {"k1": "secret one"})
+    old = rotating.token()
+    write_keys("k2", {"k2": "secret two", "k1": "secret one"})
+    new = rotating.token()
+    assert discount(rotating, old).status == 200
+    assert discount(rotating, new).status == 200
+
+    write_keys("k2", {"k2": "secret two"})
+    response = discount(rotating, old)  # cached as valid, but the ring has changed
+    assert response.status == 403 and "unknown key id" in error(response)
+    assert discount(rotating, new).status == 200
+
+
+def test_legacy_tokens_without_kid(rotating):
+    legacy = rotating.token()  # no key file: built-in key, no kid
+    write_keys("k1", {"k1": "secret one"})
+    assert discount(rotating, legacy).status == 200
+    write_keys("k1", {"k1": "secret one"}, legacy=False)
+    assert discount(rotating, legacy).status == 403
+
+
+def test_broken_key_file_keeps_the_previous_keys(rotating):
+    write_keys("k1", {"k1": "secret one"})
+    token = rotating.token()
+    with open(config.JWT_KEYS_PATH, "w", encoding="utf-8") as f:
+        f.write('{"active": "k1", "keys": ')
+    assert get_keyring().signing_key().kid == "k1"
+    assert discount(rotating, token).status == 200
+
+
+# =========================
+# verified-token cache
+# =========================
+def test_valid_token_is_checked_once(app, monkeypatch):
+    token = app.token()
+    calls = []
+    validate = discount_controller.DiscountController._validate_token
+
+    def counting(self, *args, **kwargs):
+        calls.append(args[0])
+        return validate(self, *args, **kwargs)
+
+    monkeypatch.setattr(discount_controller.DiscountController, "_validate_token", counting)
+    assert [discount(app, token).status for _ in range(3)] == [200, 200, 200]
+    assert calls == [token]
+
+
+def test_cache_expiry_and_separate_negative_lru():
+    cache = TokenCache(size=2, negative_size=1, negative_ttl=10)
+    valid = {"payload": {"exp": 100}}
+    cache.put(b"v", True, valid, now=50)
+    for i in range(3):
+        cache.put(b"x%d" % i, False, "bad", now=50)  # junk does not push out valid entries
+    assert cache.get(b"v", 100) == (True, valid)
+    assert cache.get(b"v", 101) is None
+    assert cache.get(b"x0", 50) is None
+    assert cache.get(b"x2", 59) == (False, "bad")
+    assert cache.get(b"x2", 60) is None
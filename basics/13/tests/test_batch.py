@@ -0,0 +1,82 @@
+"""POST /order/batch: per-operation results, the size limit, partial failure."""
+import pytest
+
+import config
+from controllers.order_controller import OrderController
+
+
+@pytest.fixture
+def shop(app, backend, monkeypatch):
+    monkeypatch.setattr(config, "ORDER_STORE", backend)
+    for title in "AB":
+        app.request("POST", "/order", body={"title": title, "price": 10})
+    return app
+
+
+def batch(app, operations):
+    response = app.request("POST", "/order/batch", body={"operations": operations})
+    assert response.status == 200, response.body
+    return response.json()["data"]
+
+
+def titles(app) -> dict:
+    return {x["id"]: x["title"] for x in app.request("GET", "/order").json()["data"]["items"]}
+
+
+def test_mixed_results(shop):
+    version_of_b = shop.request("GET", "/order/2").json()["data"]["item"]["version"]
+    data = batch(shop, [
+        {"op": "create", "fields": {"title": "C", "price": 5}},
+        {"op": "patch", "id": 1, "fields": {"status": "paid"}},
+        {"op": "delete", "id": 99},
+        {"op": "replace", "id": 2, "fields": {"title": "B2"}, "version": version_of_b + 100},
+        {"op": "put", "id": "2", "fields": {"title": "B3"}, "version": version_of_b},
+        {"op": "frobnicate", "id": 1},
+        {"op": "delete", "id": 1},
+    ])
+    results = data["results"]
+    assert [(r["index"], r["op"], r["status"]) for r in results] == [
+        (0, "create", 201), (1, "patch", 200), (2, "delete", 404), (3, "replace", 412),
+        (4, "replace", 200), (5, "frobnicate", 400), (6, "delete", 200)]
+    assert results[0]["item"]["id"] == 3
+    assert results[1]["item"]["status"] == "paid"
+    assert results[4]["item"]["title"] == "B3" and results[4]["item"]["price"] == 0
+    assert results[6]["id"] == 1
+    assert "error" in results[2] and "error" in results[3] and "error" in results[5]
+    assert (data["applied"], data["failed"]) == (4, 3)
+
+
+def test_failed_operations_leave_the_others_applied(shop):
+    data = batch(shop, [
+        {"op": "patch", "id": 1, "fields": {"title": "A2"}},
+        {"op": "patch", "id": 1, "fields": {"title": "lost"}, "version": 1},  # stale: the first op changed it
+        {"op": "patch", "id": "x", "fields": {}},
+        {"op": "create", "fields": {"title": "C"}},
+    ])
+    assert [r["status"] for r in data["results"]] == [200, 412, 400, 201]
+    assert titles(shop) == {1: "A2", 2: "B", 3: "C"}
+
+
+def test_operations_see_the_earlier_ones(shop):
+    data = batch(shop, [
+        {"op": "create", "fields": {"title": "C"}},
+        {"op": "patch", "id": 3, "fields": {"title": "C2"}},
+        {"op": "delete", "id": 3},
+        {"op": "delete", "id": 3},
+    ])
+    assert [r["status"] for r in data["results"]] == [201, 200, 200, 404]
+    assert titles(shop) == {1: "A", 2: "B"}
+
+
+def test_size_limit(shop):
+    ops = [{"op": "create", "fields": {}}] * (OrderController.MAX_BATCH + 1)
+    response = shop.request("POST", "/order/batch", body={"operations": ops})
+    assert response.status == 413
+    assert titles(shop) == {1: "A", 2: "B"}
+
+
+@pytest.mark.parametrize("body", [{"operations": []}, {"operations": {}}, {}, "junk"])
+def test_bad_batches(shop, body):
+    response = shop.request("POST", "/order/batch", body=body if isinstance(body, dict) else body.encode())
+    assert response.status == 400
+    assert titles(shop) == {1: "A", 2: "B"}
@@ -0,0 +1,108 @@
+"""Change feed: store.changes() on every backend and GET /order/changes."""
+import time
+
+import pytest
+
+import config
+from stores import HistoryExpired
+from stores.base import FileLock
+from conftest import open_store
+
+
+def test_changes_in_seq_order_latest_state_only(backend):
+    store = open_store(backend)
+    since = store.version()
+    a = store.create({"title": "A"})["id"]
+    b = store.create({"title": "B"})["id"]
+    store.patch(a, {"price": 5})
+    store.delete(b)
+
+    changes, has_more, version = store.changes(since, 100)
+    assert not has_more and version == store.version()
+    assert [c["op"] for c in changes] == ["put", "del"]
+    assert changes[0]["item"]["price"] == 5 and changes[1]["id"] == b
+    assert [c["seq"] for c in changes] == sorted(c["seq"] for c in changes)
+    assert store.changes(version, 100) == ([], False, version)
+
+
+def test_changes_are_paged(backend):
+    store = open_store(backend)
+    for i in range(5):
+        store.create({"title": str(i)})
+    page, has_more, _ = store.changes(0, 2)
+    assert has_more and len(page) == 2
+    rest, has_more, _ = store.changes(page[-1]["seq"], 100)
+    assert not has_more
+    assert [c["item"]["title"] for c in page + rest] == ["0", "1", "2", "3", "4"]
+
+
+def test_forgotten_deletions_expire_the_feed(app, monkeypatch, backend):
+    monkeypatch.setattr(config, "CHANGES_HISTORY", 2)
+    store = open_store(backend)
+    ids = [store.create({})["id"] for _ in range(3)]
+    for oid in ids:
+        store.delete(oid)
+    with pytest.raises(HistoryExpired):
+        store.changes(0, 100)
+
+
+def test_feed_endpoint(app):
+    version = app.request("GET", "/order").json()["data"]["version"]
+    created = app.request("POST", "/order", body={"title": "A"}).json()["data"]["created"]
+    app.request("DELETE", f"/order/{created['id']}")
+
+    data = app.request("GET", "/order/changes", f"since={version}").json()["data"]
+    assert [c["op"] for c in data["changes"]] == ["del"]
+    assert data["since"] == data["version"] > version
+    assert app.request("GET", "/order/changes", f"since={data['since']}").json()["data"]["changes"] == []
+
+
+def test_feed_endpoint_pages_with_since(app):
+    for i in range(3):
+        app.request("POST", "/order", body={"title": str(i)})
+    data = app.request("GET", "/order/changes", "since=0&limit=2").json()["data"]
+    assert data["has_more"] and data["count"] == 2
+    data = app.request("GET", "/order/changes", f"since={data['since']}&limit=2").json()["data"]
+    assert not data["has_more"] and [c["item"]["title"] for c in data["changes"]] == ["2"]
+
+
+@pytest.mark.parametrize("query", ["", "since=abc", "since=-1", "since=0&limit=0", "since=0&limit=x"])
+def test_feed_endpoint_bad_parameters(app, query):
+    assert app.request("GET", "/order/changes", query).status == 400
+
+
+def test_feed_endpoint_gone(app, monkeypatch):
+    monkeypatch.setattr(config, "CHANGES_HISTORY", 1)
+    for _ in range(2):
+        created = app.request("POST", "/order", body={}).json()["data"]["created"]
+        app.request("DELETE", f"/order/{created['id']}")
+    assert app.request("GET", "/order/changes", "since=0").status == 410
+    assert app.request("GET", "/order/changes", "since=1000").status == 410
+
+
+def test_feed_long_poll_waits_only_in_a_free_slot(app, monkeypatch):
+    monkeypatch.setattr(config, "LONG_POLL", True)
+    monkeypatch.setattr(config, "LONG_POLL_WAITERS", 1)
+    version = app.request("GET", "/order").json()["data"]["version"]
+
+    started = time.monotonic()
+    assert app.request("GET", "/order/changes", f"since={version}&wait=0.3").json()["data"]["changes"] == []
+    assert time.monotonic() - started >= 0.3
+
+    # the only slot is taken by a waiter in another worker: no second one blocks this worker
+    other_worker = FileLock(f"{config.DB_PATH}.poll0.lock")
+    assert other_worker.try_exclusive()
+    with other_worker:
+        started = time.monotonic()
+        data = app.request("GET", "/order/changes", f"since={version}&wait=5").json()["data"]
+        assert data["changes"] == [] and data["since"] == version
+        assert time.monotonic() - started < 1
+    assert not app.request("GET", "/order/changes", f"since={version}&wait=0.1").json()["data"]["changes"]
+
+
+def test_feed_long_poll_without_slots_answers_at_once(app, monkeypatch):
+    monkeypatch.setattr(config, "LONG_POLL", True)
+    version = app.request("GET", "/order").json()["data"]["version"]
+    started = time.monotonic()
+    assert app.request("GET", "/order/changes", f"since={version}&wait=5").status == 200
+    assert time.monotonic() - started < 1
@@ -0,0 +1,68 @@
+"""Order versions: ETag, conditional GET (If-None-Match) and If-Match on writes."""
+import pytest
+
+
+@pytest.fixture
+def order(app):
+    return app.request("POST", "/order", body={"title": "A", "price": 10}).json()["data"]["created"]
+
+
+def test_get_sends_an_etag_and_answers_304(app, order):
+    response = app.request("GET", f"/order/{order['id']}")
+    etag = response.headers["ETag"]
+    assert etag == f'W/"order-{order["id"]}-{order["version"]}"'
+
+    assert app.request("GET", f"/order/{order['id']}", headers={"If-None-Match": etag}).status == 304
+    assert app.request("GET", f"/order/{order['id']}", headers={"If-None-Match": etag[2:]}).status == 304
+    assert app.request("GET", f"/order/{order['id']}", headers={"If-None-Match": '"other"'}).status == 200
+
+
+def test_etag_changes_with_the_order(app, order):
+    etag = app.request("GET", f"/order/{order['id']}").headers["ETag"]
+    app.request("PATCH", f"/order/{order['id']}", body={"price": 11})
+    response = app.request("GET", f"/order/{order['id']}", headers={"If-None-Match": etag})
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["data"]["item"]["price"] == 11
+
+
+def test_list_and_stats_etags_follow_the_collection_version(app, order):
+    for path in ("/order", "/order/stats"):
+        etag = app.request("GET", path).headers["ETag"]
+        assert app.request("GET", path, headers={"If-None-Match": etag}).status == 304
+        app.request("POST", "/order", body={"title": path})
+        assert app.request("GET", path, headers={"If-None-Match": etag}).status == 200
+
+
+@pytest.mark.parametrize("method", ["PUT", "PATCH", "DELETE"])
+def test_if_match_with_the_current_etag_succeeds(app, order, method):
+    etag = app.request("GET", f"/order/{order['id']}").headers["ETag"]
+    response = app.request(method, f"/order/{order['id']}", headers={"If-Match": etag}, body={"price": 12})
+    assert response.status == 200
+
+
+@pytest.mark.parametrize("method", ["PUT", "PATCH", "DELETE"])
+def test_if_match_with_a_stale_etag_is_412(app, order, method):
+    stale = app.request("GET", f"/order/{order['id']}").headers["ETag"]
+    current = app.request("PATCH", f"/order/{order['id']}", body={"price": 11}).headers["ETag"]
+
+    response = app.request(method, f"/order/{order['id']}", headers={"If-Match": stale}, body={"price": 12})
+    assert response.status == 412
+    assert response.headers["ETag"] == current
+    assert app.request("GET", f"/order/{order['id']}").json()["data"]["item"]["price"] == 11
+
+
+def test_if_match_for_another_order_never_matches(app, order):
+    other = app.request("POST", "/order", body={"title": "B"}).json()["data"]["created"]
+    etag = app.request("GET", f"/order/{other['id']}").headers["ETag"]
+    assert app.request("PATCH", f"/order/{order['id']}", headers={"If-Match": etag}, body={"price": 1}).status == 412
+    assert app.request("PATCH", f"/order/{order['id']}", headers={"If-Match": "*"}, body={"price": 1}).status == 200
+
+
+def test_batch_version_condition(app, order):
+    response = app.request("POST", "/order/batch", body={"operations": [
+        {"op": "patch", "id": order["id"], "fields": {"price": 1}, "version": order["version"] + 100},
+        {"op": "patch", "id": order["id"], "fields": {"price": 2}, "version": order["version"]},
+    ]})
+    results = response.json()["data"]["results"]
+    assert [r["status"] for r in results] == [412, 200]
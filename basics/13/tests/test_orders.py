@@ -0,0 +1,72 @@
+"""GET /order: cursor pagination, filters, sort and projection on every backend."""
+import pytest
+
+import config
+
+ORDERS = [("A", 10, "new"), ("B", 20, "paid"), ("C", 10, "paid"), ("D", 30, "new"), ("E", 20, "new"), ("F", "n/a", "new")]
+
+
+@pytest.fixture
+def shop(app, backend, monkeypatch):
+    monkeypatch.setattr(config, "ORDER_STORE", backend)
+    for title, price, status in ORDERS:
+        app.request("POST", "/order", body={"title": title, "price": price, "status": status})
+    return app
+
+
+def page(app, query: str) -> dict:
+    response = app.request("GET", "/order", query)
+    assert response.status == 200, response.body
+    return response.json()
+
+
+def titles(body: dict) -> list:
+    return [x["title"] for x in body["data"]["items"]]
+
+
+def walk(app, query: str) -> list:
+    """Every page of a query, following meta.links.next -> titles per page."""
+    pages = []
+    while True:
+        body = page(app, query)
+        pages.append(titles(body))
+        link = body["meta"]["links"].get("next")
+        if not link:
+            return pages
+        query = link.split("?", 1)[1]
+
+
+def test_limit_and_after_walk_every_page(shop):
+    assert walk(shop, "limit=4") == [["A", "B", "C", "D"], ["E", "F"]]
+    assert walk(shop, "limit=2&status=new") == [["A", "D"], ["E", "F"]]
+
+
+def test_sort_breaks_ties_by_id(shop):
+    # descending reverses the whole key, ties included: id descending
+    assert walk(shop, "sort=-price&limit=2&status=new,paid&min_price=0") == [["D", "E"], ["B", "C"], ["A"]]
+    assert walk(shop, "sort=price&limit=3&min_price=0") == [["A", "C", "B"], ["E", "D"]]
+
+
+def test_sort_by_title_descending(shop):
+    assert walk(shop, "sort=-title&limit=4") == [["F", "E", "D", "C"], ["B", "A"]]
+
+
+def test_filters(shop):
+    assert titles(page(shop, "status=paid")) == ["B", "C"]
+    assert titles(page(shop, "min_price=15&max_price=25")) == ["B", "E"]
+    assert titles(page(shop, "max_price=10.5&status=paid")) == ["C"]
+    assert titles(page(shop, "status=gone")) == []
+
+
+def test_fields_projection(shop):
+    body = page(shop, "fields=id,title&limit=2")
+    assert body["data"]["items"] == [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}]
+    assert body["data"]["count"] == 2
+
+
+@pytest.mark.parametrize("query", ["sort=weight", "sort=-", "fields=id,secret", "min_price=abc", "max_price=1e",
+                                   "limit=0", "limit=x", "limit=100000", "after=abc", "sort=price&after=%%%"])
+def test_bad_list_queries(shop, query):
+    response = shop.request("GET", "/order", query)
+    assert response.status == 400
+    assert response.json()["status"]["message"].startswith("Bad Request")
@@ -0,0 +1,56 @@
+"""prefork.PreforkSupervisor: server.py --workers 2 restarts, reloads and stops its workers."""
+import os
+import time
+import signal
+
+import pytest
+
+from test_server import start_server, exchange, http
+
+pytestmark = pytest.mark.skipif(not os.path.exists(f"/proc/self/task/{os.getpid()}/children"),
+                                reason="worker pids are read from /proc (Linux)")
+
+
+def workers(master: int) -> set:
+    pids = set()
+    for task in os.listdir(f"/proc/{master}/task"):
+        with open(f"/proc/{master}/task/{task}/children") as f:
+            pids.update(int(pid) for pid in f.read().split())
+    return pids
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.05)
+
+
+def test_supervisor(tmp_path):
+    proc, port = start_server(tmp_path, "--workers", "2")
+    try:
+        wait_for(lambda: len(workers(proc.pid)) == 2)
+        first = workers(proc.pid)
+
+        # a killed worker is replaced
+        victim = min(first)
+        os.kill(victim, signal.SIGKILL)
+        wait_for(lambda: len(workers(proc.pid)) == 2 and victim not in workers(proc.pid))
+        assert exchange(port, http("GET", "/order/stats")) == [200]
+
+        # SIGHUP: a whole new generation, the old workers retire
+        before = workers(proc.pid)
+        proc.send_signal(signal.SIGHUP)
+        wait_for(lambda: len(workers(proc.pid)) == 2 and not workers(proc.pid) & before)
+        assert exchange(port, http("GET", "/order/stats")) == [200]
+
+        # SIGTERM: workers stop and the master exits cleanly
+        last = workers(proc.pid)
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(15) == 0
+        assert not any(os.path.exists(f"/proc/{pid}") for pid in last)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
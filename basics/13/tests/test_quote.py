@@ -0,0 +1,30 @@
+"""POST /discount/quote: one token check, many orders."""
+import pytest
+
+
+def quote(app, body, token=None):
+    token = token or app.token()
+    return app.request("POST", "/discount/quote", headers={"Authorization": f"Bearer {token}"}, body=body)
+
+
+def test_quote_follows_the_order_of_ids(app):
+    app.write_db([{"id": 1, "title": "A", "price": 100, "status": "new"},
+                  {"id": 2, "title": "B", "price": "n/a", "status": "new"}])
+    data = quote(app, {"ids": [3, "1", 2, 1]}).json()["data"]
+    assert [(q["id"], q["status"]) for q in data["quotes"]] == [(3, 404), (1, 200), (2, 422), (1, 200)]
+    assert data["quotes"][1]["discountedPrice"] == 93.0
+    assert (data["total"], data["discountedTotal"]) == (200, 186.0)
+
+
+@pytest.mark.parametrize("ids", [[], [0], ["0"], ["00"], [-1], ["-1"], [True], [1.5], ["1.5"], ["²"], [None], "1"])
+def test_ids_must_be_positive_integers(app, ids):
+    assert quote(app, {"ids": ids}).status == 400
+
+
+def test_too_many_ids(app):
+    assert quote(app, {"ids": list(range(1, 1002))}).status == 413
+
+
+def test_quote_needs_a_valid_token(app):
+    assert app.request("POST", "/discount/quote", body={"ids": [1]}).status == 403
+    assert quote(app, {"ids": [1]}, token=app.token("expired")).status == 403
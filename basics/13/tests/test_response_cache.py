@@ -0,0 +1,58 @@
+"""response_cache.ResponseCache: memory + shared directory, invalidated by the data token."""
+import os
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_hit_and_token_mismatch(tmp_path):
+    cache = ResponseCache(4, str(tmp_path / "cache"))
+    cache.put("k", "t1", "gzip", {"ETag": "x"}, b"body")
+    assert cache.get("k", "t1") == ("gzip", {"ETag": "x"}, b"body")
+    assert cache.get("k", "t2") is None
+    assert ResponseCache(4, str(tmp_path / "cache")).get("k", "t1") == ("gzip", {"ETag": "x"}, b"body")
+
+
+def test_stale_memory_entry_falls_back_to_the_directory(tmp_path):
+    mine, other = ResponseCache(4, str(tmp_path)), ResponseCache(4, str(tmp_path))
+    mine.put("k", "t1", None, {}, b"old")
+    other.put("k", "t2", None, {}, b"new")  # another worker, after a write
+    assert mine.get("k", "t2") == (None, {}, b"new")
+
+
+def test_memory_is_lru_bounded():
+    cache = ResponseCache(2)
+    for key in "abc":
+        cache.put(key, "t", None, {}, key.encode())
+    assert cache.get("a", "t") is None
+    assert cache.get("c", "t") == (None, {}, b"c")
+
+
+def test_directory_is_created_private(tmp_path):
+    directory = tmp_path / "cache"
+    ResponseCache(4, str(directory))
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_writable_by_others_directory_is_not_used(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    directory.chmod(0o777)
+    cache = ResponseCache(4, str(directory))
+    cache.put("k", "t", None, {}, b"body")
+    assert cache.directory is None
+    assert os.listdir(directory) == []
+    assert cache.get("k", "t") == (None, {}, b"body")
+
+
+def test_order_responses_are_cached(app):
+    app.request("POST", "/order", body={"title": "A"})
+    assert app.request("GET", "/order/1").headers["X-Cache"] == "MISS"
+    hit = app.request("GET", "/order/1")
+    assert hit.headers["X-Cache"] == "HIT" and hit.json()["data"]["item"]["title"] == "A"
+
+    app.request("PATCH", "/order/1", body={"title": "B"})
+    fresh = app.request("GET", "/order/1")
+    assert fresh.headers["X-Cache"] == "MISS" and fresh.json()["data"]["item"]["title"] == "B"
@@ -0,0 +1,130 @@
+"""responses.py: compact/pretty JSON, streamed lists, content negotiation and compression."""
+import gzip
+import json
+
+import pytest
+
+import config
+import responses
+from responses import Fragment, encode, iter_json, items_placeholder, accepts
+
+ITEMS = [{"id": i, "title": f"Заказ \"{i}\"\n", "price": i * 1.5, "tags": [i, None, True]} for i in range(5)]
+
+
+def envelope(marker):
+    return {"status": {"is_ok": True}, "meta": {"links": Fragment({"a": "GET /a"})},
+            "data": {"items": marker, "count": 5}}
+
+
+# =========================
+# streamed lists (user-009)
+# =========================
+@pytest.mark.parametrize("pretty", [False, True])
+@pytest.mark.parametrize("items", [ITEMS, []])
+def test_iter_json_matches_encode(pretty, items):
+    streamed = "".join(iter_json(envelope(items_placeholder()), iter(items), pretty))
+    assert streamed == encode(envelope(items), pretty)
+    assert json.loads(streamed)["data"]["items"] == items
+
+
+@pytest.fixture
+def many(app):
+    app.request("POST", "/order/batch", body={"operations": [
+        {"op": "create", "fields": {"title": f"Order «{i}»", "price": i}} for i in range(300)]})
+    return app
+
+
+def test_big_list_is_streamed_gzipped(many):
+    plain = many.request("GET", "/order", "limit=300")
+    gzipped = many.request("GET", "/order", "limit=300", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    assert "X-Cache" not in gzipped.headers  # above RESPONSE_CACHE_MAX_ITEMS: streamed, not cached
+    assert json.loads(gzip.decompress(gzipped.body))["data"] == plain.json()["data"]
+    assert len(plain.json()["data"]["items"]) == 300
+
+
+def test_streamed_list_over_http_is_chunked(tmp_path):
+    import http.client
+    from test_server import start_server
+
+    proc, port = start_server(tmp_path)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        ops = [{"op": "create", "fields": {"title": "x" * 100, "price": i}} for i in range(400)]
+        conn.request("POST", "/python-api/basics/13/order/batch", json.dumps({"operations": ops}))
+        created = conn.getresponse()
+        assert created.status == 200 and json.loads(created.read())["data"]["applied"] == 400
+
+        conn.request("GET", "/python-api/basics/13/order?limit=400", headers={"Accept-Encoding": "gzip"})
+        response = conn.getresponse()
+        body = response.read()
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        assert response.getheader("Content-Encoding") == "gzip"
+        items = json.loads(gzip.decompress(body))["data"]["items"]
+
+        conn.request("GET", "/python-api/basics/13/order?limit=400")
+        assert json.loads(conn.getresponse().read())["data"]["items"] == items
+        assert len(items) == 400
+        conn.close()
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+# =========================
+# serializer and negotiation (user-010)
+# =========================
+@pytest.mark.parametrize("header, coding, expected", [
+    ("gzip", "gzip", True),
+    ("GZIP;q=0.5", "gzip", True),
+    ("br, gzip;q=0", "gzip", False),
+    ("gzip; q=0.000", "gzip", False),
+    ("deflate", "gzip", False),
+    ("", "gzip", False),
+])
+def test_accepts(header, coding, expected):
+    assert accepts(header, coding) is expected
+
+
+def test_br_without_brotli_falls_back(app, monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    body = {"operations": [{"op": "create", "fields": {"title": "x" * 50}} for _ in range(40)]}
+    gz = app.request("POST", "/order/batch", headers={"Accept-Encoding": "br, gzip"}, body=body)
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(gz.body))["data"]["applied"] == 40
+    identity = app.request("GET", "/order", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in identity.headers and identity.json()["data"]["count"] == 40
+
+
+def test_gzip_refused_with_q0(app):
+    app.request("POST", "/order/batch", body={"operations": [{"op": "create", "fields": {"title": "x" * 50}}] * 40})
+    response = app.request("GET", "/order", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in response.headers and response.json()["data"]["count"] == 40
+
+
+def test_small_bodies_are_not_compressed(app):
+    response = app.request("GET", "/order/stats", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compact_without_dev_mode(app, monkeypatch):
+    monkeypatch.setattr(config, "DEV_MODE", False)
+    compact = app.request("GET", "/order/stats").body
+    assert b"\n " not in compact and b'"status":{' in compact
+    pretty = app.request("GET", "/order/stats", "pretty=1").body
+    assert b'\n  "status": {' in pretty
+    assert json.loads(compact)["data"] == json.loads(pretty)["data"]
+
+
+def test_dev_mode_is_pretty(app, monkeypatch):
+    monkeypatch.setattr(config, "DEV_MODE", True)
+    assert b'\n  "status": {' in app.request("GET", "/order/stats").body
+
+
+def test_fragment_is_encoded_once_and_spliced():
+    links = Fragment({"next": "GET /order?after=5", "ü": 1})
+    obj = {"meta": {"links": links}, "data": [1]}
+    assert json.loads(encode(obj)) == json.loads(encode(obj, pretty=True)) == {"meta": {"links": links.value},
+                                                                               "data": [1]}
+    assert links.text in encode(obj)
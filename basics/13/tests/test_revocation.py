@@ -0,0 +1,83 @@
+"""Token revocation: POST /user/revoke, the SQLite list and its Bloom filter fast path."""
+import sqlite3
+
+import pytest
+
+from revocation import RevocationList, BloomFilter
+
+FUTURE = 2000000000
+
+
+def tables(path) -> list:
+    with sqlite3.connect(path) as conn:
+        return [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "revoked.sqlite3")
+
+
+@pytest.mark.parametrize("bloom", [False, True])
+def test_revoked_in_one_process_is_seen_by_another(path, bloom):
+    reader = RevocationList(path, bloom=bloom, check_interval=0)
+    assert not reader.is_revoked("a")  # no file yet
+
+    assert RevocationList(path).revoke([("a", FUTURE), ("b", FUTURE), ("a", FUTURE)]) == 2
+    assert reader.is_revoked("a") and reader.is_revoked("b")
+    assert not reader.is_revoked("c")
+
+
+def test_expired_rows_are_pruned(path):
+    revocations = RevocationList(path)
+    revocations.revoke([("old", 1)])
+    revocations.revoke([("new", FUTURE)])
+    assert not revocations.is_revoked("old")
+    assert revocations.is_revoked("new")
+
+
+def test_lookups_never_write(path):
+    open(path, "wb").close()  # the first revoke() created the file, not the table yet
+    for bloom in (False, True):
+        assert not RevocationList(path, bloom=bloom).is_revoked("a")
+    assert tables(path) == []
+    with pytest.raises(sqlite3.OperationalError):
+        RevocationList(path).reader.execute("CREATE TABLE t (x)")
+
+
+def test_bloom_filter_grows_past_its_capacity(path):
+    reader = RevocationList(path, bloom=True, capacity=4, check_interval=0)
+    reader.is_revoked("x")
+    jtis = [f"jti-{i}" for i in range(20)]
+    RevocationList(path).revoke([(j, FUTURE) for j in jtis])
+    assert all(reader.is_revoked(j) for j in jtis)
+    assert reader.capacity >= 40
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [f"key-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert sum(f"other-{i}" in bloom for i in range(1000)) < 50
+
+
+def test_revoke_endpoint(app):
+    revoked, other, nested, expired = app.token(), app.token(), app.token("nested"), app.token("expired")
+    # already verified and cached as valid: revocation is checked on every request anyway
+    assert app.request("GET", "/discount", headers={"Authorization": f"Bearer {revoked}"}).status == 200
+    response = app.request("POST", "/user/revoke", body={"tokens": [revoked, nested, expired, "junk"]})
+    assert response.status == 200
+    statuses = [r["status"] for r in response.json()["data"]["results"]]
+    assert statuses == ["revoked", "revoked", "expired", "invalid"]
+
+    denied = app.request("GET", "/discount", headers={"Authorization": f"Bearer {revoked}"})
+    assert denied.status == 403 and "token revoked" in denied.json()["status"]["message"]
+    assert app.request("GET", "/discount", headers={"Authorization": f"Bearer {nested}"}).status == 403
+    assert app.request("GET", "/discount", headers={"Authorization": f"Bearer {other}"}).status == 200
+
+
+@pytest.mark.parametrize("body", [{}, {"tokens": []}, {"tokens": [1]}, {"token": None}])
+def test_revoke_endpoint_bad_requests(app, body):
+    assert app.request("POST", "/user/revoke", body=body).status == 400
@@ -0,0 +1,95 @@
+"""router.Router: path params, literal vs {param}, 404/405 and the "*" fallback."""
+import pytest
+
+from router import Router, RouteError
+from routes import ROUTES
+
+
+@pytest.fixture
+def router():
+    return Router([
+        ("GET", "/order", "order", "handle_get"),
+        ("GET", "/order/{id}", "order", "handle_get"),
+        ("GET", "/order/stats", "order", "handle_stats"),
+        ("POST", "/order", "order", "handle_post"),
+        ("*", "/order/{id}", "order", "serve"),
+        ("GET", "/usertest", "usertest", "index"),
+    ])
+
+
+def test_literal_path(router):
+    route, params, allowed = router.match("GET", "/order")
+    assert (route.action, params, allowed) == ("handle_get", {}, None)
+
+
+def test_path_parameter(router):
+    route, params, _ = router.match("GET", "/order/42")
+    assert route.pattern == "/order/{id}"
+    assert params == {"id": "42"}
+
+
+def test_literal_segment_wins_over_parameter(router):
+    route, params, _ = router.match("GET", "/order/stats")
+    assert route.action == "handle_stats"
+    assert params == {}
+
+
+def test_any_method_fallback(router):
+    route, params, _ = router.match("DELETE", "/order/7")
+    assert (route.method, route.action, params) == ("*", "serve", {"id": "7"})
+
+
+def test_known_path_other_method_is_405(router):
+    route, params, allowed = router.match("DELETE", "/order")
+    assert route is None and params is None
+    assert allowed == ["GET", "POST"]
+
+
+@pytest.mark.parametrize("path", ["/nothing", "/order/1/extra", "/", "/usertest/index"])
+def test_unknown_path_is_404(router, path):
+    assert router.match("GET", path) == (None, None, None)
+
+
+def test_case_insensitive_literals_and_slashes(router):
+    route, params, _ = router.match("get", "//ORDER/5/")
+    assert route.pattern == "/order/{id}" and params == {"id": "5"}
+
+
+@pytest.mark.parametrize("pattern", ["order", "/order/{id", "/order/{1x}", "/order/id}"])
+def test_bad_patterns(pattern):
+    with pytest.raises(RouteError):
+        Router([("GET", pattern, "order", "handle_get")])
+
+
+def test_duplicate_route():
+    with pytest.raises(RouteError):
+        Router([("GET", "/order", "order", "handle_get"), ("get", "/order", "order", "handle_post")])
+
+
+def test_conflicting_parameter_names():
+    with pytest.raises(RouteError):
+        Router([("GET", "/order/{id}", "order", "handle_get"), ("PUT", "/order/{oid}", "order", "handle_put")])
+
+
+def test_missing_action_fails_on_resolve():
+    route = Router([("GET", "/order", "order", "no_such_action")]).routes[0]
+    with pytest.raises(RouteError):
+        route.resolve()
+
+
+def test_route_table_preloads():
+    Router(ROUTES).preload()
+
+
+def test_app_404_and_405(app):
+    assert app.request("GET", "/nothing").status == 404
+    response = app.request("POST", "/usertest")
+    assert response.status == 405
+    assert response.headers["Allow"] == "GET"
+
+
+def test_app_route_param_reaches_controller(app):
+    app.write_db([{"id": 5, "title": "Five", "price": 5, "status": "new"}])
+    response = app.request("GET", "/order/5")
+    assert response.status == 200
+    assert response.json()["data"]["item"]["title"] == "Five"
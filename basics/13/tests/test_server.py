@@ -0,0 +1,214 @@
+"""server.py: request framing on keep-alive connections (a real server process)."""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from conftest import BASE_DIR, PREFIX
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data, *args):
+    """server.py on a free port with its data files in `data` -> (process, port), once it accepts."""
+    with open(data / "db.json", "w", encoding="utf-8") as f:
+        json.dump({"orders": []}, f)
+    env = {
+        **os.environ,
+        "ORDER_STORE": "json",
+        "ORDER_DB_PATH": str(data / "db.json"),
+        "ORDER_RESPONSE_CACHE_DIR": str(data / "cache"),
+        "JWT_KEYS_PATH": str(data / "jwt_keys.json"),
+        "JWT_REVOKED_PATH": str(data / "revoked.sqlite3"),
+    }
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "server.py", "--port", str(port), "--quiet", *args],
+                            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                proc.kill()
+                pytest.fail("server.py did not start")
+            time.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    proc, port = start_server(tmp_path_factory.mktemp("server"))
+    yield port
+    proc.terminate()
+    proc.wait(10)
+
+
+def exchange(port: int, raw: bytes, wait: float = 1.0) -> list:
+    """Sends raw bytes on one connection -> status codes of every response that came back."""
+    with socket.create_connection(("127.0.0.1", port)) as s:
+        s.settimeout(wait)
+        s.sendall(raw)
+        data = b""
+        try:
+            while True:
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+    return [int(code) for code in re.findall(rb"HTTP/1\.1 (\d{3}) ", data)]
+
+
+def http(method: str, path: str, body: bytes = b"", extra: str = "") -> bytes:
+    length = f"Content-Length: {len(body)}\r\n" if body or method == "POST" else ""
+    return f"{method} {PREFIX}{path} HTTP/1.1\r\nHost: test\r\n{length}{extra}\r\n".encode("latin-1") + body
+
+
+def test_unread_body_is_not_run_as_a_request(server):
+    inner = http("GET", "/user?mode=expired")
+    assert exchange(server, http("POST", "/nothing", inner)) == [404]
+
+
+def test_pipelined_requests_after_a_body(server):
+    body = json.dumps({"title": "x", "price": 1}).encode("utf-8")
+    raw = http("POST", "/nothing", b"abc") + http("POST", "/order", body) + http("GET", "/order/stats")
+    assert exchange(server, raw) == [404, 201, 200]
+
+
+def test_chunked_body_is_refused(server):
+    raw = http("POST", "/order", extra="Transfer-Encoding: chunked\r\n") + b"0\r\n\r\n" + http("GET", "/user")
+    assert exchange(server, raw) == [411]
+
+
+@pytest.mark.parametrize("lengths", [("-1",), ("abc",), ("1", "2")])
+def test_invalid_content_length(server, lengths):
+    extra = "".join(f"Content-Length: {n}\r\n" for n in lengths)
+    raw = f"POST {PREFIX}/order HTTP/1.1\r\nHost: test\r\n{extra}\r\nab".encode("latin-1")
+    assert exchange(server, raw) == [400]
+
+
+def test_controller_failing_to_construct_is_a_500(app, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "ORDER_STORE", "bogus")
+    response = app.request("GET", "/order")
+    assert response.status == 500
+    assert b"Unknown ORDER_STORE" in response.body
+
+
+# =========================
+# static files (in-process, like Apache runs them)
+# =========================
+CSS = b"body { color: #333; }\n" * 20
+
+
+@pytest.fixture
+def site(app, tmp_path, monkeypatch):
+    """The app served from a directory with its own static/ (and a file outside of it)."""
+    root = tmp_path / "site"
+    (root / "static" / "css").mkdir(parents=True)
+    (root / "static" / "css" / "site.css").write_bytes(CSS)
+    (tmp_path / "secret.css").write_bytes(b"secret")
+    monkeypatch.chdir(root)
+    return app
+
+
+def compress(path, suffix: str, data: bytes):
+    # a sibling made at deploy time: never older than the source
+    path.with_name(path.name + suffix).write_bytes(data)
+    st = path.stat()
+    os.utime(path.with_name(path.name + suffix), ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+
+
+def test_static_file(site):
+    response = site.request("GET", "/static/css/site.css")
+    assert response.status == 200
+    assert response.body == CSS
+    assert response.headers["Content-Type"] == "text/css"
+    assert response.headers["Content-Length"] == str(len(CSS))
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in response.headers
+
+
+def test_static_head_has_no_body(site):
+    response = site.request("HEAD", "/static/css/site.css")
+    assert response.status == 200
+    assert response.headers["Content-Length"] == str(len(CSS)) and response.body == b""
+
+
+def test_static_etag_and_last_modified_give_304(site):
+    first = site.request("GET", "/static/css/site.css")
+    for headers in ({"If-None-Match": first.headers["ETag"]}, {"If-None-Match": "W/" + first.headers["ETag"]},
+                    {"If-Modified-Since": first.headers["Last-Modified"]}):
+        response = site.request("GET", "/static/css/site.css", headers=headers)
+        assert response.status == 304 and response.body == b""
+    assert site.request("GET", "/static/css/site.css", headers={"If-None-Match": '"other"'}).status == 200
+
+
+@pytest.mark.parametrize("spec, start, end", [("bytes=0-9", 0, 9), ("bytes=10-", 10, 439), ("bytes=-5", 435, 439),
+                                              ("bytes=400-100000", 400, 439)])
+def test_static_range(site, spec, start, end):
+    response = site.request("GET", "/static/css/site.css", headers={"Range": spec})
+    assert response.status == 206
+    assert response.body == CSS[start:end + 1]
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(CSS)}"
+
+
+@pytest.mark.parametrize("spec", ["bytes=1000-", "bytes=20-10", "bytes=-0"])
+def test_static_unsatisfiable_range(site, spec):
+    response = site.request("GET", "/static/css/site.css", headers={"Range": spec})
+    assert response.status == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(CSS)}"
+
+
+def test_static_range_ignored_when_if_range_is_stale(site):
+    response = site.request("GET", "/static/css/site.css", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status == 200 and response.body == CSS
+
+
+def test_static_precompressed_variants(site):
+    css = Path.cwd() / "static" / "css" / "site.css"
+    compress(css, ".gz", b"gzip bytes")
+    compress(css, ".br", b"brotli bytes")
+    plain_etag = site.request("GET", "/static/css/site.css").headers["ETag"]
+
+    br = site.request("GET", "/static/css/site.css", headers={"Accept-Encoding": "gzip, br"})
+    assert (br.headers["Content-Encoding"], br.body) == ("br", b"brotli bytes")
+    gz = site.request("GET", "/static/css/site.css", headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert (gz.headers["Content-Encoding"], gz.body) == ("gzip", b"gzip bytes")
+    assert gz.headers["Vary"] == "Accept-Encoding"
+    assert len({plain_etag, br.headers["ETag"], gz.headers["ETag"]}) == 3
+
+
+def test_static_stale_precompressed_variant_is_not_used(site):
+    css = Path.cwd() / "static" / "css" / "site.css"
+    stale = css.with_name("site.css.gz")
+    stale.write_bytes(b"old gzip")
+    os.utime(stale, ns=(0, 0))
+    response = site.request("GET", "/static/css/site.css", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers and response.body == CSS
+
+
+@pytest.mark.parametrize("path", ["/static/../../secret.css", "/../secret.css", "/static/css/../../../secret.css",
+                                  "/static/css/missing.css", "/static/css"])
+def test_static_outside_the_root_or_missing_is_404(site, path):
+    response = site.request("GET", path)
+    assert response.status == 404
+    assert b"secret" not in response.body.replace(b"secret.css", b"")
+
+
+def test_static_post_is_405(site):
+    response = site.request("POST", "/static/css/site.css")
+    assert response.status == 405 and response.headers["Allow"] == "GET, HEAD"
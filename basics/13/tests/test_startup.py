@@ -0,0 +1,41 @@
+"""bench/startup.py as a gate: every route's cold start stays within the budget."""
+import os
+import sys
+import subprocess
+
+import pytest
+
+from conftest import BASE_DIR
+
+# own time of a route (total - interpreter) in bare interpreter start-ups: the heaviest routes
+# measure ~1.5 with byte-code and ~3 compiled from source, so a heavy import on the CGI path
+# fails the gate on a fast machine and on a slow one alike
+BUDGET_RATIO = {"bytecode": os.environ.get("STARTUP_BUDGET_RATIO", "2"),
+                "source": os.environ.get("STARTUP_BUDGET_RATIO_SOURCE", "4")}
+
+
+def written_into_the_tree() -> set:
+    found = set()
+    for root, dirs, _ in os.walk(BASE_DIR):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        found.update(os.path.join(root, d) for d in dirs if d in ("__pycache__", ".response_cache"))
+    return found
+
+
+@pytest.mark.parametrize("mode", ["bytecode", "source"])
+def test_cold_start_within_budget(tmp_path, mode):
+    before = written_into_the_tree()
+    env = {k: v for k, v in os.environ.items() if k not in ("PYTHONDONTWRITEBYTECODE", "PYTHONPYCACHEPREFIX")}
+    env["TMPDIR"] = str(tmp_path)
+    command = [sys.executable, os.path.join("bench", "startup.py"), "--runs", "5", "--budget-ratio", BUDGET_RATIO[mode]]
+    if mode == "bytecode":
+        # a deployed start: the app (and the stdlib) byte-compiled, kept out of the source tree
+        env["PYTHONPYCACHEPREFIX"] = str(tmp_path / "pycache")
+    else:
+        # every module compiled from source on every start, nothing written anywhere
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        command.append("--no-compile")
+    done = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=300)
+    assert done.returncode == 0, done.stdout + done.stderr
+    assert "200" in done.stdout
+    assert written_into_the_tree() == before
@@ -0,0 +1,383 @@
+"""OrderStore contract, the same for every backend, plus backend-specific durability."""
+import os
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import config
+from stores import VersionConflict
+from stores.json_store import JsonOrderStore
+from stores.json_stream import JsonStreamReader
+from conftest import open_store
+
+
+def test_create_assigns_ids_and_defaults(backend):
+    store = open_store(backend)
+    a = store.create({"title": "A", "price": 10})
+    b = store.create({})
+    assert b["id"] == a["id"] + 1
+    assert (a["title"], a["price"], a["status"]) == ("A", 10, "new")
+    assert (b["title"], b["price"]) == (f"Order {b['id']}", 0)
+
+
+def test_get_list_get_many(backend):
+    store = open_store(backend)
+    ids = [store.create({"title": str(i)})["id"] for i in range(3)]
+    assert store.get(ids[1])["title"] == "1"
+    assert store.get(999) is None
+    assert [x["id"] for x in store.list()] == ids
+    assert set(store.get_many([ids[0], ids[2], 999])) == {ids[0], ids[2]}
+    assert store.get_many([]) == {}
+
+
+def test_replace_patch_delete(backend):
+    store = open_store(backend)
+    oid = store.create({"title": "A", "price": 10, "status": "paid"})["id"]
+
+    patched = store.patch(oid, {"price": 20})
+    assert (patched["title"], patched["price"], patched["status"]) == ("A", 20, "paid")
+    replaced = store.replace(oid, {"title": "B"})
+    assert (replaced["title"], replaced["price"], replaced["status"]) == ("B", 0, "new")
+    assert store.patch(999, {"price": 1}) is None
+    assert store.replace(999, {"title": "x"}) is None
+
+    assert store.delete(oid) is True
+    assert store.delete(oid) is False
+    assert store.get(oid) is None
+
+
+def test_version_and_data_token_change_with_every_write(backend):
+    store = open_store(backend)
+    v0, t0 = store.version(), store.data_token()
+    oid = store.create({})["id"]
+    v1, t1 = store.version(), store.data_token()
+    store.patch(oid, {"price": 1})
+    assert v0 < v1 < store.version()
+    assert len({t0, t1, store.data_token()}) == 3
+
+
+def test_writes_are_seen_by_other_instances(backend):
+    writer, reader = open_store(backend), open_store(backend)
+    assert reader.list() == []
+    oid = writer.create({"title": "shared"})["id"]
+    assert reader.get(oid)["title"] == "shared"
+    writer.delete(oid)
+    assert reader.get(oid) is None
+    assert open_store(backend).list() == []
+
+
+def test_existing_db_json_is_read(backend):
+    with open(config.DB_PATH, "w", encoding="utf-8") as f:
+        json.dump({"orders": [{"id": 7, "title": "Seven", "price": 7, "status": "new"}]}, f)
+    if backend == "sqlite":
+        from stores.sqlite_store import main
+        assert main(["import"]) == 0  # one-time import: python -m stores.sqlite_store import
+    store = open_store(backend)
+    assert store.get(7)["title"] == "Seven"
+    assert store.create({})["id"] == 8
+
+
+def test_store_rejects_a_stale_expected_version(backend):
+    store = open_store(backend)
+    item = store.create({"title": "A"})
+    patched = store.patch(item["id"], {"price": 1}, {item["version"]})
+    assert patched["version"] > item["version"]
+
+    for write in (lambda: store.patch(item["id"], {"price": 2}, {item["version"]}),
+                  lambda: store.replace(item["id"], {"title": "B"}, {item["version"]}),
+                  lambda: store.delete(item["id"], {item["version"]})):
+        with pytest.raises(VersionConflict) as ex:
+            write()
+        assert ex.value.item["version"] == patched["version"]
+    assert store.get(item["id"])["price"] == 1
+
+
+def test_json_write_is_fsynced_before_the_rename(app, monkeypatch):
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: (calls.append("fsync"), real_fsync(fd)))
+    monkeypatch.setattr(os, "replace", lambda *a: (calls.append("replace"), real_replace(*a)))
+    open_store("json").create({"title": "A"})
+    assert calls == ["fsync", "replace", "fsync"]  # tmp file, rename, directory
+
+
+# =========================
+# db.json streaming (lazy JSON store)
+# =========================
+TRICKY_DB = r"""{"version": 9, "deleted": [[5, 8]], "orders": [
+  {"id": 1, "title": "quote \" backslash \\ slash \/ tab\t newline\n bell \u0007", "price": 1.5e3, "status": "new"},
+  {"id": 2, "title": "кириллица ü 😀 \u00e9\u20ac", "price": -0.000125, "status": "paid", "tags": []},
+  {"id": 3, "title": "surrogates \ud83d\ude00 \uD834\uDD1E", "price": 12345678901234567890, "status": "new",
+   "meta": {"a": [1, [2, {"b": null}]], "c": true, "d": false, "e": {}}},
+  {"id":4,"title":"","price":1E-7,"status":"x"},
+  {"id": 6, "title": "big", "price": 2.5E+300, "status": "new", "note": "\u0000\u001f"}
+  ],
+ "after": {"k": "v"}}"""
+
+
+def stream_all(path, chunk_size):
+    """(header, orders) from JsonStreamReader; a reader that hangs fails the test instead of the run."""
+    reader, result = JsonStreamReader(path, chunk_size), []
+
+    def read():
+        try:
+            result.append((reader.read_header(), list(reader.iter_orders())))
+        except Exception as ex:
+            result.append(ex)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert result, "JsonStreamReader hangs"
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return result[0]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("layout", ["as is", "compact", "ascii", "indented"])
+def test_json_stream_reader_matches_json_loads(app, chunk_size, layout):
+    text = TRICKY_DB
+    if layout != "as is":
+        data = json.loads(TRICKY_DB)
+        text = json.dumps(data, ensure_ascii=layout == "ascii", indent=2 if layout == "indented" else None,
+                          separators=(",", ":") if layout == "compact" else None)
+    with open(config.DB_PATH, "w", encoding="utf-8") as f:
+        f.write(text)
+    expected = json.loads(text)
+
+    header, orders = stream_all(config.DB_PATH, chunk_size)
+    assert header == {"version": 9, "deleted": [[5, 8]]}
+    assert orders == expected["orders"]
+    assert JsonStreamReader(config.DB_PATH, chunk_size).find(3) == expected["orders"][2]
+    assert JsonStreamReader(config.DB_PATH, chunk_size).find(99) is None
+
+
+@pytest.mark.parametrize("text", ['{"orders": []}', '{"version": 1, "orders": [ ]}', ' {\n "orders" : [\n] } ',
+                                  '{}', ''])
+def test_json_stream_reader_empty_list(app, text):
+    with open(config.DB_PATH, "w", encoding="utf-8") as f:
+        f.write(text)
+    assert stream_all(config.DB_PATH, 3)[1] == []
+
+
+def test_json_stream_reader_missing_file(app):
+    os.remove(config.DB_PATH)
+    assert stream_all(config.DB_PATH, 3) == ({}, [])
+
+
+@pytest.mark.parametrize("data", [
+    b'{"orders": [{"id": 1}, {"id": 2',
+    b'{"orders": [{"id": 1}, ',
+    b'{"orders": [{"id": 1}',
+    b'{"orders": [',
+    b'{"orders"',
+    b'{"version": 1',
+    b'{"version": 1 "orders": []}',
+    b'{"orders": [{"id": 1} {"id": 2}]}',
+    b'{"orders": [{"id": 1},, {"id": 2}]}',
+    b'{"orders": [{"id": 1}, {"id": 2, "title": "\\ud83',
+    b'{"orders": [{"id": 1}, {"id": 2, "title": "caf\xc3',
+    b'{"orders": [{"id": 1}, {"id": 2, "price": 1e}]}',
+    b'{orders: []}',
+])
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_json_stream_reader_rejects_broken_files(app, data, chunk_size):
+    with open(config.DB_PATH, "wb") as f:
+        f.write(data)
+    with pytest.raises(ValueError):
+        json.loads(data)
+    with pytest.raises(ValueError):  # JSONDecodeError and UnicodeDecodeError included
+        stream_all(config.DB_PATH, chunk_size)
+
+
+def test_lazy_json_store_matches_the_indexed_one(app):
+    with open(config.DB_PATH, "w", encoding="utf-8") as f:
+        f.write(TRICKY_DB)
+    lazy, indexed = open_store("json"), JsonOrderStore(config.DB_PATH, lazy=False)
+    assert lazy.lazy and not indexed.lazy
+
+    for oid in (1, 2, 3, 4, 6, 5, 99):
+        assert lazy.get(oid) == indexed.get(oid)
+    for ids in ([], [3], [6, 1, 99], [1, 2, 3, 4, 6]):
+        assert lazy.get_many(ids) == indexed.get_many(ids)
+    for params in ({}, {"limit": 2}, {"statuses": {"new"}}, {"min_price": 0, "max_price": 2000},
+                   {"sort": "price", "descending": True}, {"sort": "title", "after": ("", 4), "limit": 3}):
+        assert lazy.query(**params) == indexed.query(**params)
+    assert lazy.version() == indexed.version() == 9
+    assert lazy._signature is None  # all of the above streamed the file
+
+    with open(config.DB_PATH, "w", encoding="utf-8") as f:
+        f.write(TRICKY_DB[:TRICKY_DB.index('{"id":4')])
+    for store in (lazy, open_store("json")):
+        with pytest.raises(ValueError):
+            store.query()
+
+
+# =========================
+# WAL
+# =========================
+TORN = b'{"seq":999,"op":"put","ite'
+
+
+def append_raw(data: bytes):
+    with open(config.WAL_PATH, "ab") as f:
+        f.write(data)
+
+
+def test_wal_reader_does_not_truncate_a_torn_tail(app):
+    reader = open_store("wal")
+    writer = open_store("wal")
+    writer.create({"title": "A"})
+    append_raw(TORN)
+    size = os.path.getsize(config.WAL_PATH)
+
+    assert [x["title"] for x in reader.list()] == ["A"]
+    assert os.path.getsize(config.WAL_PATH) == size
+
+
+def test_wal_reader_reloading_after_compaction_does_not_truncate(app):
+    reader = open_store("wal")
+    writer = open_store("wal")
+    writer.create({"title": "A"})
+    reader.list()
+    writer.compact()  # new log inode: the reader reloads everything (_recover) under the shared lock
+    writer.create({"title": "B"})
+    append_raw(TORN)
+    size = os.path.getsize(config.WAL_PATH)
+
+    assert [x["title"] for x in reader.list()] == ["A", "B"]
+    assert os.path.getsize(config.WAL_PATH) == size
+
+
+def test_wal_writer_repairs_the_torn_tail_before_appending(app):
+    first = open_store("wal")
+    first.create({"title": "A"})
+    append_raw(TORN)
+    first.create({"title": "B"})
+
+    with open(config.WAL_PATH, "rb") as f:
+        lines = f.read().splitlines()
+    assert all(json.loads(line) for line in lines)
+    assert [x["title"] for x in open_store("wal").list()] == ["A", "B"]
+
+
+def test_wal_short_writes_are_completed(app, monkeypatch):
+    real_write = os.write
+    store = open_store("wal")
+    with monkeypatch.context() as m:
+        m.setattr(os, "write", lambda fd, data: real_write(fd, bytes(data[:7])))
+        store.apply_batch([{"op": "create", "fields": {"title": t}} for t in "AB"])
+    assert [x["title"] for x in open_store("wal").list()] == ["A", "B"]
+
+
+def test_wal_failed_append_leaves_nothing_behind(app, monkeypatch):
+    store = open_store("wal")
+    store.create({"title": "A"})
+    size = os.path.getsize(config.WAL_PATH)
+    real_write = os.write
+    written = []
+
+    def failing(fd, data):
+        if written:
+            raise OSError(28, "No space left on device")
+        written.append(fd)
+        return real_write(fd, bytes(data[:len(data) // 2 + 40]))  # the first record and a bit
+
+    with monkeypatch.context() as m:
+        m.setattr(os, "write", failing)
+        with pytest.raises(OSError):
+            store.apply_batch([{"op": "create", "fields": {"title": t}} for t in "BC"])
+    assert os.path.getsize(config.WAL_PATH) == size
+    assert [x["title"] for x in store.list()] == ["A"]
+    assert [x["title"] for x in open_store("wal").list()] == ["A"]
+
+
+def test_wal_fsync_modes(app):
+    from stores.wal_store import WalOrderStore
+
+    def wal(fsync):
+        return WalOrderStore(config.DB_PATH, config.WAL_PATH, fsync=fsync)
+
+    assert wal("batch").fsync == "interval"
+    with pytest.raises(ValueError):
+        wal("sometimes")
+
+
+def test_wal_compaction_fsyncs_each_rename(app, monkeypatch):
+    store = open_store("wal")
+    store.create({"title": "A"})
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: (calls.append("fsync"), real_fsync(fd)))
+    monkeypatch.setattr(os, "replace", lambda *a: (calls.append("replace"), real_replace(*a)))
+    store.compact()
+    assert calls == ["fsync", "replace", "fsync"] * 2  # snapshot, then the emptied log
+
+
+# =========================
+# SQLite
+# =========================
+def traced_opens(monkeypatch) -> list:
+    """Statements run by every connection the SQLite store opens from now on."""
+    from stores import sqlite_store
+
+    statements = []
+    real_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite_store.sqlite3, "connect", connect)
+    return statements
+
+
+def test_sqlite_schema_is_created_once(app, monkeypatch):
+    from stores.sqlite_store import SCHEMA_VERSION
+
+    statements = traced_opens(monkeypatch)
+    open_store("sqlite").create({"title": "A"})
+    assert any(s.lstrip().startswith("CREATE TABLE") for s in statements)
+
+    statements.clear()
+    store = open_store("sqlite")
+    assert store.get(1)["title"] == "A"
+    assert not [s for s in statements if s.split()[0].upper() in ("CREATE", "INSERT", "BEGIN", "ALTER")]
+    assert store.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+
+def test_sqlite_reimport_keeps_stats(app):
+    orders = [{"id": 1, "title": "A", "price": 10, "status": "new"},
+              {"id": 2, "title": "B", "price": 2.5, "status": "paid"},
+              {"id": 3, "title": "C", "price": 700, "status": "new"}]
+    store = open_store("sqlite")
+    store.import_orders(orders)
+    expected = store.stats()
+    assert expected["count"] == 3 and expected["total"] == 712.5
+
+    store.import_orders(orders)
+    assert store.stats() == expected
+    prices = [x["price"] for x in store.list()]
+    assert (len(prices), sum(prices), min(prices), max(prices)) == (3, 712.5, 2.5, 700)
+
+    # a re-import that changes an order moves it between the groups
+    store.import_orders([{"id": 3, "title": "C", "price": 1, "status": "paid"}])
+    stats = store.stats()
+    assert (stats["count"], stats["total"]) == (3, 13.5)
+    assert {x["status"]: (x["count"], x["total"]) for x in stats["by_status"]} == {"new": (1, 10), "paid": (2, 3.5)}
+    assert sum(x["count"] for x in stats["by_price"]) == 3
+
+
+def test_sqlite_database_from_before_versions_and_stats(app):
+    with sqlite3.connect(config.SQLITE_PATH) as conn:
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, title, price, status)")
+        conn.execute("INSERT INTO orders VALUES (1, 'A', 10, 'new'), (2, 'B', 5, 'paid')")
+    conn.close()
+    store = open_store("sqlite")
+    assert store.get(1)["version"] == 0
+    assert store.stats()["count"] == 2
+    assert store.create({"title": "C"})["id"] == 3
@@ -0,0 +1,63 @@
+"""GET /user and POST /user/batch: minted tokens and what they claim."""
+import multiprocessing
+
+import pytest
+
+import jwt_codec
+from jwt_codec import get_keyring
+
+
+def claims(token: str) -> dict:
+    return get_keyring().claims(token)
+
+
+def batch(app, body):
+    return app.request("POST", "/user/batch", body=body)
+
+
+def test_get_user_token(app):
+    data = app.request("GET", "/user").json()["data"]
+    assert claims(data["token"]) == data["payload"]
+    assert data["header"] == get_keyring().signing_key().header
+
+
+def test_batch_shares_claims_and_expiry(app):
+    data = batch(app, {"count": 3, "claims": {"aud": "loadtest"}}).json()["data"]
+    decoded = [claims(t) for t in data["tokens"]]
+    assert data["count"] == 3 and "exps" not in data
+    assert all(c["aud"] == "loadtest" and c["exp"] == data["exp"] for c in decoded)
+    assert len({c["jti"] for c in decoded}) == 3
+
+
+def test_batch_reports_every_expiry_when_overrides_differ(app):
+    data = batch(app, {"overrides": [{"exp": 2000000000}, "0b0e1a52-0000-4000-8000-000000000001"]}).json()["data"]
+    decoded = [claims(t) for t in data["tokens"]]
+    assert "exp" not in data
+    assert data["exps"] == [c["exp"] for c in decoded]
+    assert data["exps"][0] == 2000000000 != data["exps"][1]
+    assert decoded[1]["sub"] == "0b0e1a52-0000-4000-8000-000000000001"
+
+
+def test_batch_nested_tokens(app):
+    data = batch(app, {"count": 2, "mode": "nested_expired"}).json()["data"]
+    assert data["header"]["cty"] == "JWT"
+    assert all(claims(t)["exp"] == data["exp"] < data["iat"] for t in data["tokens"])
+
+
+@pytest.mark.parametrize("body", [[], {"mode": "x", "count": 1}, {"count": 0}, {"count": True},
+                                  {"count": 1, "claims": "aud"}, {"overrides": [1]}, {"count": 1, "overrides": ["a", "b"]}])
+def test_batch_bad_requests(app, body):
+    assert batch(app, body).status == 400
+
+
+def test_parallel_signing_without_forkserver(app, monkeypatch):
+    # Windows: no forkserver start method, the pool is spawned instead
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    monkeypatch.setattr(jwt_codec, "_pool", None)
+    payloads = [{"sub": str(i)} for i in range(40)]
+    try:
+        tokens = jwt_codec.encode_many(payloads, workers=2, parallel_min=10)
+        assert jwt_codec._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        jwt_codec._pool.shutdown()
+    assert tokens == jwt_codec.encode_many(payloads)